@@ -1,5 +1,8 @@
 import sys
+import time
+import traceback
 import board
+import microcontroller
 from storage import VfsFat, mount, remount
 from digitalio import DigitalInOut
 from adafruit_sdcard import SDCard
@@ -12,3 +15,13 @@ sys.path.append("/sd/lib")
 
 import main
 
+try:
+    main.run()
+except main.SettingsError:
+    # Shown on the console and kept at the REPL, restarting would hit it again
+    raise
+except Exception as e:
+    # Logged by main, restart from its checkpoint rather than stopping on the error
+    traceback.print_exception(e)
+    time.sleep(10)
+    microcontroller.reset()
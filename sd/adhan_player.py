@@ -0,0 +1,101 @@
+"""
+Non-blocking adhan playback.
+
+``audioio.AudioOut`` plays in the background, so the player only starts the
+WAV file and is then polled from the main loop, which keeps updating the
+display meanwhile. The player also reports the elapsed and remaining time and
+can be stopped at any point.
+
+``WaveFile`` streams the file from the SD card through ``buffer``, halves of
+which are refilled in turn while the other plays: a larger buffer rides out
+longer pauses of the card. ``prime`` opens the file, reads its header and turns
+the amplifier on a few seconds ahead, so that ``play`` only starts the DMA.
+The adhan files are prepared with ``tools/prepare_adhans.py``.
+"""
+import os
+import time
+
+import audiocore
+
+WAV_HEADER_SIZE = 44
+
+
+class AdhanPlayer:
+    def __init__(self, audio, speaker_enable, buffer_size=4096):
+        self.audio = audio
+        self.speaker_enable = speaker_enable
+        # Allocated once, a new buffer for every adhan would fragment the heap
+        self._buffer = bytearray(buffer_size) if buffer_size else None
+        self.name = None
+        self.duration = 0
+        self._filename = None
+        self._file = None
+        self._wave = None
+        self._started = None  # time.monotonic() when playback started, None until then
+
+    @property
+    def playing(self):
+        return self._started is not None
+
+    @property
+    def primed(self):
+        """True when a file is opened and ready to play."""
+        return self._file is not None and self._started is None
+
+    @property
+    def elapsed(self):
+        """Seconds played since the start of the adhan."""
+        if not self.playing:
+            return 0
+        return min(self.duration, time.monotonic() - self._started)
+
+    @property
+    def remaining(self):
+        return max(0, self.duration - self.elapsed)
+
+    def prime(self, filename, name=None):
+        """Opens ``filename`` and turns the amplifier on, ready for ``play``."""
+        if self._file is not None:
+            if self.primed and self._filename == filename:
+                return
+            self.stop()
+        self._file = open(filename, "rb")
+        if self._buffer is None:
+            self._wave = audiocore.WaveFile(self._file)
+        else:
+            self._wave = audiocore.WaveFile(self._file, self._buffer)
+        bytes_per_second = self._wave.sample_rate * self._wave.channel_count * self._wave.bits_per_sample // 8
+        self.duration = (os.stat(filename)[6] - WAV_HEADER_SIZE) / bytes_per_second
+        self._filename = filename
+        self.name = name
+        self.speaker_enable.value = True
+
+    def play(self, filename, name=None):
+        """Starts playing ``filename``, primed or not, and returns immediately."""
+        if not self.primed or self._filename != filename:
+            self.prime(filename, name)
+        self.name = name
+        self.audio.play(self._wave)
+        self._started = time.monotonic()
+
+    def update(self):
+        """Releases the file and the speaker once playback is over, returns True while playing."""
+        if self.playing and not self.audio.playing:
+            self._close()
+        return self.playing
+
+    def stop(self):
+        """Stops the adhan before its end, or releases the primed file."""
+        if self.playing:
+            self.audio.stop()
+        if self._file is not None:
+            self._close()
+
+    def _close(self):
+        self.speaker_enable.value = False
+        self._wave.deinit()
+        self._wave = None
+        self._file.close()
+        self._file = None
+        self._filename = None
+        self._started = None
@@ -0,0 +1,76 @@
+"""
+Runtime state kept across resets, for a warm restart.
+
+A crash or a watchdog reset would otherwise redo the whole boot: Wi-Fi, time
+sync and the network jobs, while an adhan may be due. The few values the
+caches on the SD card do not hold are checkpointed in ``microcontroller.nvm``
+(or in a small file without it): the UTC offset of the RTC, the clock sync
+state, when each network job is next due and the last adhan played. A
+restart finding a checkpoint the RTC agrees with skips the network entirely.
+
+Layout (little endian):
+    <4sIhIIiIIII  magic, RTC seconds when saved, RTC UTC offset in minutes,
+                  UTC seconds of the last sync, sync interval, drift in ppm,
+                  RTC seconds when the time, location and prayers jobs are due,
+                  prayer time of the last adhan played (minutes since 2000-01-01)
+
+Zero stands for None, and ``NO_DRIFT`` for an unknown drift.
+"""
+import struct
+from collections import namedtuple
+
+MAGIC = b"PPR1"
+FORMAT = "<4sIhIIiIIII"
+SIZE = struct.calcsize(FORMAT)
+NO_DRIFT = -0x80000000
+CHECKPOINT_FILE = "/sd/checkpoint.bin"
+
+State = namedtuple("State", ("saved", "rtc_offset", "last_sync", "sync_interval", "drift_ppm", "time_due",
+                             "location_due", "prayers_due", "adhan_at"))
+
+
+def _encode(value):
+    return 0 if value is None else int(value)
+
+
+def _decode(value):
+    return None if value == 0 else value
+
+
+class Checkpoint:
+    def __init__(self, nvm=None, path=CHECKPOINT_FILE):
+        self.nvm = nvm  # microcontroller.nvm, the file at ``path`` is used when None
+        self.path = path
+        self.saves = 0
+
+    def load(self):
+        """Returns the saved State, or None if there is none."""
+        if self.nvm is not None:
+            data = bytes(self.nvm[0:SIZE])
+        else:
+            try:
+                with open(self.path, "rb") as file:
+                    data = file.read(SIZE)
+            except OSError:
+                return None
+        if len(data) != SIZE or data[:4] != MAGIC:
+            return None
+        values = struct.unpack(FORMAT, data)
+        return State(values[1], values[2], _decode(values[3]), values[4],
+                     None if values[5] == NO_DRIFT else values[5], *(_decode(value) for value in values[6:]))
+
+    def save(self, state):
+        """Saves ``state``, the memory is only written when it changed, to spare the flash."""
+        data = struct.pack(FORMAT, MAGIC, state.saved, state.rtc_offset, _encode(state.last_sync),
+                           state.sync_interval, NO_DRIFT if state.drift_ppm is None else state.drift_ppm,
+                           _encode(state.time_due), _encode(state.location_due), _encode(state.prayers_due),
+                           _encode(state.adhan_at))
+        if self.nvm is not None:
+            # The save time alone changing is not worth a flash write
+            if self.nvm[8:SIZE] == data[8:]:
+                return
+            self.nvm[0:SIZE] = data
+        else:
+            with open(self.path, "wb") as file:
+                file.write(data)
+        self.saves += 1
@@ -0,0 +1,130 @@
+"""
+Precompiled binary fonts, read glyph by glyph from the SD card.
+
+Parsing a BDF file means scanning thousands of text lines on every boot. A
+glyph atlas is built once on a computer (``tools/build_fonts.py``) from a BDF
+file and the characters the labels use, and only its small header and index
+are read when the font is opened. A glyph bitmap is read from its offset the
+first time the glyph is drawn, straight into a ``displayio.Bitmap`` with
+``bitmaptools.readinto``, so glyphs never drawn never take memory.
+
+File layout (little endian):
+    header  <4sBBH4hhh  magic, version, bits per pixel, glyph count,
+                        bounding box (width, height, x offset, y offset),
+                        ascent, descent
+    index   <HBBbbBbI   code point, width, height, dx, dy, shift x, shift y,
+                        bitmap offset; one entry per glyph by code point
+    bitmaps             rows of ``ceil(width / 8)`` bytes, first pixel in the
+                        most significant bit, as in BDF
+
+A ``GlyphAtlas`` provides what ``adafruit_display_text`` uses of the fonts of
+``adafruit_bitmap_font``: ``get_bounding_box``, ``get_glyph``,
+``load_glyphs``, ``ascent`` and ``descent``.
+"""
+import struct
+
+try:
+    import bitmaptools
+except ImportError:
+    bitmaptools = None
+
+MAGIC = b"GLYA"
+VERSION = 1
+HEADER_FORMAT = "<4sBBH4hhh"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ENTRY_FORMAT = "<HBBbbBbI"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+
+def write_atlas(file, bounding_box, ascent, descent, glyphs):
+    """Writes an atlas to the binary ``file``.
+
+    ``glyphs`` are ``(code point, width, height, dx, dy, shift x, shift y,
+    rows)`` tuples, ``rows`` being the packed bitmap bytes.
+    """
+    glyphs = sorted(glyphs)
+    file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 1, len(glyphs), *bounding_box, ascent, descent))
+    offset = HEADER_SIZE + len(glyphs) * ENTRY_SIZE
+    for code, width, height, dx, dy, shift_x, shift_y, rows in glyphs:
+        if len(rows) != (width + 7) // 8 * height:
+            raise ValueError(f"Glyph {code} has {len(rows)} bitmap bytes for {width}x{height} pixels")
+        file.write(struct.pack(ENTRY_FORMAT, code, width, height, dx, dy, shift_x, shift_y, offset))
+        offset += len(rows)
+    for glyph in glyphs:
+        file.write(glyph[7])
+
+
+class GlyphAtlas:
+    def __init__(self, path, bitmap_class=None, glyph_class=None):
+        if bitmap_class is None:
+            from displayio import Bitmap as bitmap_class
+        if glyph_class is None:
+            from fontio import Glyph as glyph_class
+        self._bitmap_class = bitmap_class
+        self._glyph_class = glyph_class
+        self._glyphs = {}  # Glyphs read so far, None for the code points missing from the atlas
+        self.file = open(path, "rb")
+        header = self.file.read(HEADER_SIZE)
+        magic, version, _, self._count, width, height, x, y, self.ascent, self.descent = struct.unpack(
+            HEADER_FORMAT, header)
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError(f"{path} is not a glyph atlas")
+        self._bounding_box = (width, height, x, y)
+        self._index = self.file.read(self._count * ENTRY_SIZE)
+
+    def get_bounding_box(self):
+        """Returns the maximum glyph size as ``(width, height, x offset, y offset)``."""
+        return self._bounding_box
+
+    def _find(self, code):
+        """Returns the position of ``code`` in the index, or -1."""
+        low, high = 0, self._count - 1
+        index = self._index
+        while low <= high:
+            middle = (low + high) // 2
+            found = index[middle * ENTRY_SIZE] | index[middle * ENTRY_SIZE + 1] << 8
+            if found == code:
+                return middle
+            if found < code:
+                low = middle + 1
+            else:
+                high = middle - 1
+        return -1
+
+    def _read_glyph(self, code):
+        position = self._find(code)
+        if position < 0:
+            return None
+        _, width, height, dx, dy, shift_x, shift_y, offset = struct.unpack_from(
+            ENTRY_FORMAT, self._index, position * ENTRY_SIZE)
+        bitmap = self._bitmap_class(width, height, 2)
+        self.file.seek(offset)
+        if bitmaptools is not None:
+            bitmaptools.readinto(bitmap, self.file, 1, 1, True)
+        else:
+            row_size = (width + 7) // 8
+            rows = self.file.read(row_size * height)
+            for y in range(height):
+                for x in range(width):
+                    if rows[y * row_size + x // 8] & (0x80 >> (x % 8)):
+                        bitmap[x, y] = 1
+        return self._glyph_class(bitmap, 0, width, height, dx, dy, shift_x, shift_y)
+
+    def load_glyphs(self, code_points):
+        """Reads the glyphs of ``code_points`` (an int, a str, or an iterable of ints) not read yet."""
+        if isinstance(code_points, int):
+            code_points = (code_points,)
+        elif isinstance(code_points, str):
+            code_points = [ord(character) for character in code_points]
+        glyphs = self._glyphs
+        for code in code_points:
+            if code not in glyphs:
+                glyphs[code] = self._read_glyph(code)
+
+    def get_glyph(self, code_point):
+        """Returns the glyph of ``code_point``, read on first use, or None if it is not in the atlas."""
+        glyphs = self._glyphs
+        if code_point not in glyphs:
+            glyphs[code_point] = self._read_glyph(code_point)
+        return glyphs[code_point]
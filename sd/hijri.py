@@ -0,0 +1,47 @@
+"""
+Gregorian and Hijri dates from day numbers, with no network data.
+
+Day numbers count days since 2000-01-01, see ``prayer_cache.day_number``.
+The Hijri date follows the arithmetic (tabular) Islamic calendar: 30 year
+cycles of 10631 days, months alternating between 30 and 29 days, and leap
+years, whose Dhu al-Hijjah has 30 days, in years 2, 5, 7, 10, 13, 16, 18,
+21, 24, 26 and 29 of each cycle. It stays within a day or two of the lunar
+sighting calendars, and ``adjustment`` shifts it by whole days to match the
+local one, as Aladhan's ``adjustment`` parameter does.
+"""
+from prayer_cache import date_from_day_number
+
+# Day number of 1 Muharram 1 AH (Friday 16 July 622 in the Julian calendar)
+HIJRI_EPOCH = -503105
+CYCLE_DAYS = 10631  # Days in 30 Hijri years
+
+GREGORIAN_MONTHS = ("January", "February", "March", "April", "May", "June",
+                    "July", "August", "September", "October", "November", "December")
+HIJRI_MONTHS = ("Muharram", "Safar", "Rabi' al-awwal", "Rabi' al-thani", "Jumada al-awwal", "Jumada al-thani",
+                "Rajab", "Sha'ban", "Ramadan", "Shawwal", "Dhu al-Qi'dah", "Dhu al-Hijjah")
+
+
+def hijri_day_number(year, month, day):
+    """Returns the day number of a Hijri date, the inverse of :func:`hijri_from_day_number`."""
+    return (HIJRI_EPOCH + (year - 1) * 354 + (3 + 11 * year) // 30 + (59 * (month - 1) + 1) // 2
+            + day - 1)
+
+
+def hijri_from_day_number(number, adjustment=0):
+    """Returns the Hijri ``(year, month, day)`` of the day ``number``, shifted by ``adjustment`` days."""
+    number += adjustment
+    year = (30 * (number - HIJRI_EPOCH) + 10646) // CYCLE_DAYS
+    month = min(12, 2 * (number - hijri_day_number(year, 1, 1)) // 59 + 1)
+    return year, month, number - hijri_day_number(year, month, 1) + 1
+
+
+def format_gregorian(number):
+    """Formats the day ``number`` as ``16 October 2026``."""
+    year, month, day = date_from_day_number(number)
+    return f"{day:02} {GREGORIAN_MONTHS[month - 1]} {year}"
+
+
+def format_hijri(number, adjustment=0):
+    """Formats the Hijri date of the day ``number`` as ``04 Jumada al-awwal 1448``."""
+    year, month, day = hijri_from_day_number(number, adjustment)
+    return f"{day:02} {HIJRI_MONTHS[month - 1]} {year}"
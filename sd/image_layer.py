@@ -0,0 +1,121 @@
+"""
+Screen images held in RAM when memory allows, read from the SD card otherwise.
+
+An ``OnDiskBitmap`` reads back from the SD card, on the SPI bus shared with
+the ESP32, every region the display redraws, which is the whole screen behind
+each label that changes. ``tools/convert_images.py`` converts the images to
+4 bit palette BMP files in ``images/indexed``, 77 KB for the whole screen: an
+``ImageLayer`` loads one into a ``displayio.Bitmap`` with
+``bitmaptools.readinto`` when that leaves ``reserve`` bytes free, and shows it
+from the SD card otherwise, or when the image has no indexed version::
+
+    background = ImageLayer(bg_group, reserve=32768)
+    background.show("bg1")  # /sd/images/indexed/bg1.bmp, or /sd/images/bg1.bmp
+    background.show("bg1")  # Already shown, returns right away
+
+Showing another image releases the previous one first, so switching themes
+never holds two images in memory. Pure black pixels are transparent.
+"""
+import os
+import struct
+
+import displayio
+
+from memory import memory
+from telemetry import mem_free
+
+try:
+    import bitmaptools
+except ImportError:
+    bitmaptools = None
+
+IMAGES_DIR = "/sd/images"
+INDEXED_DIR = IMAGES_DIR + "/indexed"
+
+
+def read_header(file):
+    """Returns the width, height, bits per pixel, colors, palette offset and pixel offset of a palette BMP file."""
+    header = file.read(54)
+    if len(header) < 54 or header[:2] != b"BM":
+        raise ValueError("Not a BMP file")
+    data_offset, header_size, width, height, _, bits, compression, _, _, _, colors = struct.unpack_from(
+        "<IIiiHHIIiiI", header, 10)
+    if bits not in (1, 2, 4, 8) or compression != 0:
+        raise ValueError(f"{bits} bit BMP files have no palette")
+    return width, height, bits, colors or 1 << bits, 14 + header_size, data_offset
+
+
+def exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+class ImageLayer:
+    def __init__(self, group, ram=True, reserve=32768):
+        self.group = group  # displayio.Group the image is shown in, emptied by each show()
+        self.ram = ram  # Load the indexed images into RAM when memory allows
+        self.reserve = reserve  # Bytes left free after loading an image into RAM
+        self.name = None  # Image shown, or None
+        self.in_ram = False
+        self._file = None  # File read by the OnDiskBitmap shown
+
+    def show(self, name):
+        """Shows the image ``name``, e.g. "bg1", unless it is already shown."""
+        if name == self.name:
+            return
+        self.clear()
+        if not name:
+            return
+        # The previous image is released before the next one is allocated
+        memory.collect()
+        path = f"{INDEXED_DIR}/{name}.bmp"
+        if not exists(path):
+            path = f"{IMAGES_DIR}/{name}.bmp"
+        bitmap = self._load(path) if self.ram and bitmaptools is not None else None
+        if bitmap is None:
+            self._file = open(path, "rb")
+            bitmap = displayio.OnDiskBitmap(self._file)
+            pixel_shader = bitmap.pixel_shader
+        else:
+            bitmap, pixel_shader = bitmap
+        pixel_shader.make_transparent(0)
+        self.group.append(displayio.TileGrid(bitmap, pixel_shader=pixel_shader))
+        self.name = name
+        self.in_ram = self._file is None
+
+    def _load(self, path):
+        """Returns the bitmap and palette of the palette BMP ``path`` read into RAM, or None."""
+        with open(path, "rb") as file:
+            try:
+                width, height, bits, colors, palette_offset, data_offset = read_header(file)
+            except ValueError:
+                return None  # Not converted, shown from the SD card
+            if width * bits % 32 or mem_free() - width * height * bits // 8 < self.reserve:
+                return None  # Padded rows are not read by readinto, or not enough memory
+            try:
+                palette = displayio.Palette(colors)
+                file.seek(palette_offset)
+                entries = file.read(colors * 4)
+                for index in range(colors):
+                    # Blue, green, red, unused
+                    palette[index] = entries[index * 4 + 2] << 16 | entries[index * 4 + 1] << 8 | entries[index * 4]
+                bitmap = displayio.Bitmap(width, abs(height), 1 << bits)
+                file.seek(data_offset)
+                bitmaptools.readinto(bitmap, file, bits, reverse_pixels_in_element=True, reverse_rows=height > 0)
+            except MemoryError as e:
+                memory.error(e)
+                return None
+        return bitmap, palette
+
+    def clear(self):
+        """Removes the image shown and releases its bitmap or file."""
+        while len(self.group):
+            self.group.pop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.name = None
+        self.in_ram = False
@@ -0,0 +1,261 @@
+"""
+Streaming JSON field extractor.
+
+Parses a JSON document chunk by chunk and only keeps the values at whitelisted
+paths, so a large API response never has to be held in memory as a whole.
+Paths use dots between object keys and ``[]`` for array items, for example
+``data.timings.Fajr`` or ``data[].date.hijri.month.number``.
+
+Only scalar values are extracted. Containers that cannot lead to a wanted
+path are skipped without decoding their strings or building their paths.
+
+When ``item_path`` is given (e.g. ``data[]``), the values collected inside each
+item are handed to ``convert`` as the item closes and the result is appended
+to ``items``, which keeps month-calendar responses to one compact entry per day
+in memory.
+
+The extractor raises nothing while it is fed: ``finish`` checks that the
+document is complete once the input ends, so a response cut short fails
+instead of yielding the fields read so far. The root must be an object or an
+array, a byte outside of it, such as an HTML error page or data after the
+document, stops the parsing and fails ``finish`` too.
+"""
+_WHITESPACE = b" \t\r\n"
+_QUOTE = 0x22
+_BACKSLASH = 0x5C
+_COMMA = 0x2C
+_COLON = 0x3A
+_OPEN_OBJECT = 0x7B
+_CLOSE_OBJECT = 0x7D
+_OPEN_ARRAY = 0x5B
+_CLOSE_ARRAY = 0x5D
+_LITERAL_END = b" \t\r\n,]}"
+
+_VALUE = 0
+_STRING = 1
+_LITERAL = 2
+
+_ESCAPES = {0x62: "\b", 0x66: "\f", 0x6E: "\n", 0x72: "\r", 0x74: "\t"}
+
+# Longest key or wanted value kept, longer ones are truncated
+STRING_MAX = 64
+
+
+def _container_paths(paths):
+    """Returns the paths of every container leading to one of ``paths``, including the root."""
+    containers = {""}
+    for path in paths:
+        for i in range(len(path)):
+            if path[i] == "." or path[i] == "[":
+                containers.add(path[:i])
+    return containers
+
+
+def _unescape(raw):
+    if _BACKSLASH not in raw:
+        return str(raw, "utf-8")
+    parts = []
+    start = i = 0
+    while i < len(raw):
+        if raw[i] != _BACKSLASH:
+            i += 1
+            continue
+        parts.append(str(raw[start:i], "utf-8"))
+        code = raw[i + 1]
+        if code == 0x75:  # \uXXXX
+            parts.append(chr(int(str(raw[i + 2:i + 6], "ascii"), 16)))
+            i += 6
+        else:
+            parts.append(_ESCAPES.get(code, chr(code)))
+            i += 2
+        start = i
+    parts.append(str(raw[start:], "utf-8"))
+    return "".join(parts)
+
+
+def _literal(raw):
+    text = str(raw, "ascii")
+    if text == "true":
+        return True
+    if text == "false":
+        return False
+    if text == "null":
+        return None
+    if "." in text or "e" in text or "E" in text:
+        return float(text)
+    return int(text)
+
+
+class FieldExtractor:
+    def __init__(self, paths, item_path=None, convert=None, buffer=None):
+        self.wanted = set(paths)
+        self.containers = _container_paths(paths)
+        self.item_path = item_path
+        self.convert = convert
+        self.values = {}
+        self.items = []
+        self.size = 0  # Bytes fed so far
+
+        self._stack = []  # (is_array, path) of every open container not skipped
+        self._skip_depth = 0  # Depth inside a skipped container
+        self._key = None
+        self._expect_key = False
+        self._state = _VALUE
+        self._capture = False
+        self._escape = False
+        self._buffer = bytearray(STRING_MAX) if buffer is None else buffer  # Reused across documents when given
+        self._length = 0
+        self._complete = False  # The root container has been closed
+        self._error_at = None  # Offset of the first byte outside of the root container
+
+    def feed(self, chunk, length=None):
+        """Parses the next chunk of the document, its first ``length`` bytes if given, e.g. of a reused buffer."""
+        n = len(chunk) if length is None else length
+        self.size += n
+        if self._error_at is not None:
+            return
+        view = memoryview(chunk)
+        i = 0
+        while i < n:
+            if self._state == _STRING:
+                i = self._scan_string(chunk, view, i, n)
+                continue
+            if self._state == _LITERAL:
+                i = self._scan_literal(chunk, view, i, n)
+                continue
+
+            c = chunk[i]
+            i += 1
+            if c in _WHITESPACE:
+                continue
+            if not self._stack and not self._skip_depth and (
+                    self._complete or (c != _OPEN_OBJECT and c != _OPEN_ARRAY)):
+                self._error_at = self.size - n + i - 1
+                return
+            if c == _COLON:
+                continue
+            if c == _QUOTE:
+                self._start_string()
+            elif c == _OPEN_OBJECT or c == _OPEN_ARRAY:
+                self._open(c == _OPEN_ARRAY)
+            elif c == _CLOSE_OBJECT or c == _CLOSE_ARRAY:
+                self._close()
+            elif c == _COMMA:
+                if not self._skip_depth and not self._stack[-1][0]:
+                    self._expect_key = True
+            else:
+                self._state = _LITERAL
+                self._capture = not self._skip_depth and self._value_path() in self.wanted
+                self._length = 0
+                i -= 1  # The first character belongs to the literal
+
+    def finish(self):
+        """Raises ValueError unless a whole document has been fed, e.g. when the input was truncated."""
+        if self._error_at is not None:
+            raise ValueError(f"Unexpected byte outside of the JSON document at offset {self._error_at}")
+        if (self._stack or self._skip_depth or self._state != _VALUE or self._escape or self._expect_key
+                or not self._complete):
+            raise ValueError(f"Incomplete JSON document after {self.size} bytes")
+
+    def _value_path(self):
+        is_array, path = self._stack[-1]
+        if is_array:
+            return path + "[]"
+        return path + "." + self._key if path else self._key
+
+    def _append(self, part):
+        end = min(self._length + len(part), STRING_MAX)
+        self._buffer[self._length:end] = part[:end - self._length]
+        self._length = end
+
+    def _start_string(self):
+        self._state = _STRING
+        self._length = 0
+        if self._skip_depth:
+            self._capture = False
+        elif self._expect_key:
+            self._capture = True
+        else:
+            self._capture = self._value_path() in self.wanted
+
+    def _scan_string(self, chunk, view, i, n):
+        while i < n:
+            if self._escape:
+                self._escape = False
+                if self._capture:
+                    self._append(b"\\")
+                    self._append(view[i:i + 1])
+                i += 1
+                continue
+            quote = chunk.find(b'"', i, n)
+            backslash = chunk.find(b"\\", i, n if quote < 0 else quote)
+            if backslash >= 0:
+                if self._capture:
+                    self._append(view[i:backslash])
+                self._escape = True
+                i = backslash + 1
+                continue
+            if quote < 0:
+                if self._capture:
+                    self._append(view[i:n])
+                return n
+            if self._capture:
+                self._append(view[i:quote])
+            self._state = _VALUE
+            self._end_string()
+            return quote + 1
+        return i
+
+    def _end_string(self):
+        if self._skip_depth:
+            return
+        text = _unescape(self._buffer[:self._length]) if self._capture else None
+        if self._expect_key:
+            self._key = text
+            self._expect_key = False
+        elif self._capture:
+            self.values[self._value_path()] = text
+
+    def _scan_literal(self, chunk, view, i, n):
+        start = i
+        while i < n and chunk[i] not in _LITERAL_END:
+            i += 1
+        if self._capture:
+            self._append(view[start:i])
+        if i < n:
+            self._state = _VALUE
+            if self._capture:
+                self.values[self._value_path()] = _literal(self._buffer[:self._length])
+        return i
+
+    def _open(self, is_array):
+        if self._skip_depth:
+            self._skip_depth += 1
+            return
+        path = self._value_path() if self._stack else ""
+        if path not in self.containers:
+            self._skip_depth = 1
+            return
+        self._stack.append((is_array, path))
+        self._expect_key = not is_array
+
+    def _close(self):
+        if self._skip_depth:
+            self._skip_depth -= 1
+            return
+        path = self._stack.pop()[1]
+        self._expect_key = False
+        if not self._stack:
+            self._complete = True
+        if path == self.item_path:
+            self.items.append(self.values if self.convert is None else self.convert(self.values))
+            self.values = {}
+
+
+def extract(chunks, paths, item_path=None, convert=None):
+    """Feeds every chunk of ``chunks`` to a :class:`FieldExtractor` and returns it, see ``finish``."""
+    extractor = FieldExtractor(paths, item_path=item_path, convert=convert)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    extractor.finish()
+    return extractor
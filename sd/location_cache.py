@@ -0,0 +1,69 @@
+"""
+Location of the public IP address, cached on the SD card.
+
+The location looked up on ip-api.com (coordinates, UTC offset, time zone,
+city and country) is kept with the public IP address it was looked up for
+and the UTC time of the lookup, so a boot uses it without a request until it
+expires or the public IP address changes.
+
+File layout (little endian):
+    header  <4sIffh  magic, UTC seconds of the lookup, latitude, longitude,
+                     UTC offset in minutes at the time of the lookup
+    text    UTF-8    IP address, time zone, city and country, one per line
+"""
+import os
+import struct
+from collections import namedtuple
+
+from prayer_cache import CACHE_DIR
+
+LOCATION_FILE = CACHE_DIR + "/location.bin"
+
+MAGIC = b"LOC1"
+HEADER_FORMAT = "<4sIffh"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# ``fetched`` is the UTC seconds of the lookup, ``offset`` the UTC offset in minutes then, DST included
+Location = namedtuple("Location", ("fetched", "ip", "latitude", "longitude", "offset", "timezone", "city",
+                                   "country"))
+
+
+def read(path=LOCATION_FILE):
+    """Returns the cached Location, or None if there is no valid cache."""
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, fetched, latitude, longitude, offset = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        return None
+    text = str(data[HEADER_SIZE:], "utf-8").split("\n")
+    if len(text) != 4:
+        return None
+    return Location(fetched, text[0], latitude, longitude, offset, text[1], text[2], text[3])
+
+
+def write(location, path=LOCATION_FILE):
+    """Replaces the cached location, through a temporary file like ``prayer_cache.write_records``."""
+    try:
+        os.mkdir(path.rsplit("/", 1)[0])
+    except OSError:
+        pass  # Directory already exists
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(struct.pack(HEADER_FORMAT, MAGIC, location.fetched, location.latitude, location.longitude,
+                               location.offset))
+        file.write("\n".join((location.ip, location.timezone, location.city, location.country)).encode("utf-8"))
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # No previous cache
+    os.rename(tmp_path, path)
+
+
+def expires(location, ttl):
+    """Returns the UTC seconds when ``location`` has to be looked up again."""
+    return location.fetched + ttl
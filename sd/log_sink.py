@@ -0,0 +1,122 @@
+"""
+Buffered, rotating log files on the SD card.
+
+Writing each record as it is logged costs a file system write per
+``logger.info``, which stalls the main loop. ``BufferedRotatingHandler``
+keeps the formatted records in a fixed ring in RAM and appends them in one
+batch once the ring is full, or right away for warnings and errors. The file
+is opened for each batch and closed after it, so nothing is lost to an open
+file on a reset, and ``flush()`` writes the tail of the ring, e.g. from the
+``finally`` of the main loop when an exception escapes it.
+
+Files are named after the day of their first record, ``YYYYMMDD.log``, and a
+day going over ``max_bytes`` continues in ``YYYYMMDD-1.log``,
+``YYYYMMDD-2.log`` ... Once there are more than ``keep`` files, the oldest
+ones are removed.
+"""
+import os
+import time
+
+from adafruit_logging import Handler, NOTSET, WARNING
+
+
+def _file_order(name):
+    """Sorts YYYYMMDD.log before YYYYMMDD-1.log, and YYYYMMDD-2.log before YYYYMMDD-10.log."""
+    day, _, part = name[:-4].partition("-")
+    return day, int(part) if part.isdigit() else 0
+
+
+class BufferedRotatingHandler(Handler):
+    terminator = "\r\n"
+
+    def __init__(self, directory="/sd/logs", capacity=32, max_bytes=65536, keep=14, flush_level=WARNING,
+                 level=NOTSET):
+        super().__init__(level)
+        self.directory = directory
+        self.capacity = capacity  # Records buffered before a batch is written
+        self.max_bytes = max_bytes  # Size of a file before the next part of the day is started
+        self.keep = keep  # Files kept, the oldest ones are removed
+        self.flush_level = flush_level  # Records at this level or above are written right away
+        self.path = None  # File of the last batch
+        self.flushes = 0
+        self._ring = [None] * capacity
+        self._count = 0
+        self._buffer_day = None  # Day of the buffered records, YYYYMMDD as an int
+        self._day = None  # Day of the current file
+        self._part = 0
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # Already there
+        os.stat(directory)  # Raises OSError when the SD card is missing
+
+    def emit(self, record):
+        now = time.localtime()
+        day = now.tm_year * 10000 + now.tm_mon * 100 + now.tm_mday
+        if day != self._buffer_day:
+            self.flush()  # Each record goes to the file of its day
+            self._buffer_day = day
+        self._ring[self._count] = self.format(record)
+        self._count += 1
+        if self._count >= self.capacity or record.levelno >= self.flush_level:
+            self.flush()
+
+    def flush(self):
+        """Appends the buffered records to the log file of the day."""
+        if not self._count:
+            return
+        self._select_file(self._buffer_day)
+        with open(self.path, "a") as file:
+            for i in range(self._count):
+                file.write(self._ring[i])
+                file.write(self.terminator)
+                self._ring[i] = None
+        self._count = 0
+        self.flushes += 1
+
+    def close(self):
+        self.flush()
+
+    def _file_name(self, day, part):
+        return f"{self.directory}/{day}{'-' + str(part) if part else ''}.log"
+
+    def _select_file(self, day):
+        if day != self._day:
+            self._day = day
+            self._part = 0
+            # Continue with the last part of the day after a restart
+            while self._exists(self._file_name(day, self._part + 1)):
+                self._part += 1
+            self.path = self._file_name(day, self._part)
+            self._prune()
+        elif self._size(self.path) >= self.max_bytes:
+            self._part += 1
+            self.path = self._file_name(day, self._part)
+            self._prune()
+
+    @staticmethod
+    def _exists(path):
+        try:
+            os.stat(path)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.stat(path)[6]
+        except OSError:
+            return 0
+
+    def _prune(self):
+        """Removes the oldest files, keeping ``keep - 1`` of them besides the one about to be written."""
+        names = sorted((name for name in os.listdir(self.directory) if name.endswith(".log")), key=_file_order)
+        current = self.path[len(self.directory) + 1:]
+        if current in names:
+            names.remove(current)
+        for name in names[:max(0, len(names) - self.keep + 1)]:
+            try:
+                os.remove(f"{self.directory}/{name}")
+            except OSError:
+                pass
@@ -1,83 +1,193 @@
 import time
-from gc import collect as clean_memory, mem_free
-from os import getenv
+from os import getenv, uname
 
 import displayio
 import rtc
 import board
-from storage import remount
+import microcontroller
 from digitalio import DigitalInOut
 from adafruit_bitmap_font import bitmap_font
 from adafruit_display_text.label import Label
 from micropython import const
-from adafruit_pyportal.graphics import Graphics
+from watchdog import WatchDogMode
 from adafruit_esp32spi.adafruit_esp32spi import ESP_SPIcontrol
-from adafruit_connection_manager import get_radio_socketpool, get_radio_ssl_context
-from adafruit_datetime import date as adafruit_date, datetime as adafruit_datetime, time as adafruit_time
-from adafruit_logging import FileHandler, INFO, StreamHandler, getLogger
-from adafruit_requests import Session
-import audiocore
+from adafruit_datetime import date as adafruit_date, datetime as adafruit_datetime
+from adafruit_logging import INFO, StreamHandler, getLogger
+import location_cache
+import hijri
+import prayer_cache
+import prayer_calc
+from scheduler import Scheduler
+from schedule import DaySchedule, PRAYERS
+from adhan_player import AdhanPlayer
+from reminders import FIXED_TIME, ReminderEngine, load_rules, weekday
+from net_client import NetClient, RetryPolicy
+from net_window import NetworkWindow
+import time_sync
+import timezone
+from render import CENTER, RIGHT, Renderer
+from glyph_atlas import GlyphAtlas
+from telemetry import Telemetry
+from memory import clean_memory, memory
+from log_sink import BufferedRotatingHandler
+from checkpoint import Checkpoint, State as CheckpointState
 import audioio
-# import adafruit_touchscreen
-
-clean_memory()
-print("\n*******************************")
-print(f"** Free memory: {mem_free()} **")
-print("*******************************\n")
-
-esp: ESP_SPIcontrol = ESP_SPIcontrol(
-        board.SPI(),
-        DigitalInOut(board.ESP_CS),
-        DigitalInOut(board.ESP_BUSY),
-        DigitalInOut(board.ESP_RESET)
-)
+import adafruit_touchscreen
+from touch import TouchInput
+from image_layer import ImageLayer
 
-graphics = Graphics(
-        # default_bg="/sd/images/loading.bmp", # FIXME
-        debug=True,
-)
+# Durations and free memory of the boot and loop phases, see telemetry.py
+telemetry = Telemetry(size=getenv("TELEMETRY_SIZE", 64))
+TELEMETRY_FILE = getenv("TELEMETRY_FILE", "/sd/telemetry.csv")  # Appended after boot, empty to disable
 
-try:
-    remount(mount_path="/", readonly=False)
-    mounted = True
-except RuntimeError:
-    mounted = False
+# Garbage collected when free memory falls below the threshold, and before large allocations, see memory.py
+GC_THRESHOLD = getenv("GC_THRESHOLD", 32768)  # Bytes
+memory.threshold = GC_THRESHOLD
 
-# Set up logging
 logger = getLogger("PrayerPortal")
-try:
-    log_file = "/PrayerPortal.log"  # Log file path
-    handler = FileHandler(log_file)
-except OSError:
-    handler = StreamHandler()
-logger.setLevel(INFO)
-logger.addHandler(handler)
-
-if mounted:
-    logger.info("Root filesystem mounted ")
-else:
-    logger.warning("Failed to mount the root filesystem ")
+
+# Logs, buffered in RAM and written in batches to the SD card, see log_sink.py
+LOG_DIR = getenv("LOG_DIR", "/sd/logs")
+LOG_BUFFER_RECORDS = getenv("LOG_BUFFER_RECORDS", 32)  # Records written per batch, warnings and errors right away
+LOG_MAX_BYTES = getenv("LOG_MAX_BYTES", 65536)  # Size of a log file before the next one is started
+LOG_KEEP_FILES = getenv("LOG_KEEP_FILES", 14)
+log_handler = None
+
+# Watchdog and warm restart from the state checkpointed in the NVM, see checkpoint.py
+WATCHDOG_TIMEOUT = getenv("WATCHDOG_TIMEOUT", 16)  # Seconds without feeding before a reset, 16 at most, 0 disables
+CHECKPOINT_MAX_AGE = getenv("CHECKPOINT_MAX_AGE", 172800)  # Seconds after which the checkpoint is not trusted
+checkpoint = Checkpoint(microcontroller.nvm)
 
 # Wi-Fi configuration
 SECRETS = {
     "ssid": getenv("CIRCUITPY_WIFI_SSID"),
     "password": getenv("CIRCUITPY_WIFI_PASSWORD"),
 }
-if SECRETS["ssid"] is None or SECRETS["password"] is None:
-    # TODO Show error on screen
-    raise ValueError("Wi-Fi secrets are missing. Please add them in settings.py!")
 
-RETRIES_DELAY = const(10)
-MAX_RETRIES = const(3)
+# Network
+RETRY_POLICY = RetryPolicy(
+        retries=getenv("NET_RETRIES", 3),
+        delay=getenv("NET_RETRY_DELAY", 10),  # Seconds before the first retry
+        backoff=getenv("NET_BACKOFF", 2),  # Delay multiplier for each following retry
+        timeout=getenv("NET_TIMEOUT", 30),  # Socket timeout in seconds
+)
+if WATCHDOG_TIMEOUT and RETRY_POLICY.timeout >= WATCHDOG_TIMEOUT:
+    # The watchdog cannot be fed while a socket blocks
+    RETRY_POLICY.timeout = WATCHDOG_TIMEOUT - 2
+NET_WINDOW_RETRY = getenv("NET_WINDOW_RETRY", 900)  # Seconds before a failed network job is retried
+# Schedule hub on the LAN, e.g. "http://192.168.1.10:8080", tried before the public APIs, see tools/schedule_hub.py
+HUB_URL = getenv("HUB_URL", "").rstrip("/")
+
+# Location of the public IP address, cached on the SD card, see location_cache.py
+LOCATION_TTL = getenv("LOCATION_TTL", 604800)  # Seconds before the location is looked up again
+LOCATION_IP_CHECK_INTERVAL = getenv("LOCATION_IP_CHECK_INTERVAL", 86400)  # Seconds between public IP checks
+
+# Time
+NTP_SERVER = getenv("NTP_SERVER", "pool.ntp.org")
+NTP_PORT = getenv("NTP_PORT", time_sync.NTP_PORT)
+TIME_HTTP_URL = getenv("TIME_HTTP_URL", "http://ip-api.com/json/?fields=status")  # Date header used without NTP
+TIME_SYNC_MIN_INTERVAL = getenv("TIME_SYNC_MIN_INTERVAL", 3600)  # Seconds between syncs while the drift is unknown
+TIME_SYNC_MAX_INTERVAL = getenv("TIME_SYNC_MAX_INTERVAL", 86400)
+DST_RULE = getenv("DST_RULE", "")  # "US", "EU" or a POSIX rule such as "M3.2.0/2,M11.1.0/2"
+DST_MINUTES = getenv("DST_MINUTES", 60)
+
+# Prayer times
+PRAYER_SOURCE = getenv("PRAYER_SOURCE", "local")  # "local" computes the times on the device, "api" fetches them
+PRAYER_CROSS_CHECK = getenv("PRAYER_CROSS_CHECK", 1)  # Compare computed times with Aladhan when online
+CROSS_CHECK_TOLERANCE = const(2)  # Minutes
+CALCULATION_METHOD = getenv("CALCULATION_METHOD", 2)
+ASR_SCHOOL = getenv("ASR_SCHOOL", 0)  # 0 Shafi, 1 Hanafi
+PREFETCH_MONTHS = getenv("PREFETCH_MONTHS", 2)  # Months fetched per cache refresh
+CACHE_REFRESH_DAYS = getenv("CACHE_REFRESH_DAYS", 7)  # Refresh the cache when fewer days are left
+HIJRI_ADJUSTMENT = getenv("HIJRI_ADJUSTMENT", 0)  # Days added to the arithmetic Hijri date, see hijri.py
+
+# Adhan playback, see adhan_player.py
+ADHAN_BUFFER_SIZE = getenv("ADHAN_BUFFER_SIZE", 4096)  # Bytes read from the SD card ahead of the DAC
+ADHAN_PRIME_SECONDS = getenv("ADHAN_PRIME_SECONDS", 5)  # Seconds before the adhan its file is opened
+ADHAN_MINUTES_BEFORE_PRAYER = getenv("ADHAN_MINUTES_BEFORE_PRAYER", 5)
+
+# Pre-adhan alerts, iqama and Jumu'ah reminders, see reminders.py
+REMINDERS_FILE = getenv("REMINDERS_FILE", "/sd/reminders.json")  # Empty to disable
+REMINDER_GRACE = getenv("REMINDER_GRACE", 60)  # Seconds late a reminder still runs, e.g. after the clock was set
+
+# Touchscreen: a tap stops the adhan or the reminder sound, otherwise it pages the view, see touch.py
+TOUCH_POLL_MS = getenv("TOUCH_POLL_MS", 50)  # Milliseconds between two reads of the touchscreen, 0 disables it
+VIEW_SECONDS = getenv("VIEW_SECONDS", 15)  # Seconds before a paged view goes back to the main one
+
+# Backgrounds of sd/images, from sd/images/indexed when converted by tools/convert_images.py, see image_layer.py
+BACKGROUNDS = [name.strip() for name in getenv("BACKGROUNDS", "bg1").split(",")]  # One, or one per prayer Fajr..Isha
+BACKGROUND_IN_RAM = getenv("BACKGROUND_IN_RAM", 1)  # Hold the background in RAM rather than reading the SD card
+BACKGROUND_RESERVE = getenv("BACKGROUND_RESERVE", 32768)  # Bytes left free after loading the background into RAM
+
+esp: ESP_SPIcontrol = None
+esp_reset = None  # Reset pin of the ESP32, held low to power it down between network windows
+
+class SettingsError(ValueError):
+    """A missing or invalid setting, which a reset does not fix: code.py stops on it instead of restarting."""
+
+def check_settings():
+    """Raises SettingsError for the settings the device cannot run with."""
+    if SECRETS["ssid"] is None or SECRETS["password"] is None:
+        raise SettingsError("Wi-Fi secrets are missing. Please add CIRCUITPY_WIFI_SSID and CIRCUITPY_WIFI_PASSWORD "
+                            "to settings.toml!")
+    if PRAYER_SOURCE not in ("local", "api"):
+        raise SettingsError(f"Unsupported PRAYER_SOURCE {PRAYER_SOURCE}, use \"local\" or \"api\"")
+    if int(CALCULATION_METHOD) not in prayer_calc.METHODS:
+        raise SettingsError(f"Unsupported CALCULATION_METHOD {CALCULATION_METHOD}")
+    try:
+        timezone.TimeZone(0, DST_RULE, DST_MINUTES)
+    except ValueError as e:
+        raise SettingsError(f"Unsupported DST_RULE {DST_RULE}: {e}")
+
+def setup_hardware():
+    """Sets up the ESP32 co-processor and the log files."""
+    global esp, esp_reset, log_handler
+    check_settings()
+
+    esp_reset = DigitalInOut(board.ESP_RESET)
+    esp = ESP_SPIcontrol(
+            board.SPI(),
+            DigitalInOut(board.ESP_CS),
+            DigitalInOut(board.ESP_BUSY),
+            esp_reset
+    )
 
+    # Set up logging
+    try:
+        log_handler = BufferedRotatingHandler(LOG_DIR, capacity=LOG_BUFFER_RECORDS, max_bytes=LOG_MAX_BYTES,
+                                              keep=LOG_KEEP_FILES)
+    except OSError:
+        log_handler = StreamHandler()
+    logger.setLevel(INFO)
+    logger.addHandler(log_handler)
+    logger.info(f"Reset reason: {microcontroller.cpu.reset_reason} ")
+
+    if WATCHDOG_TIMEOUT:
+        microcontroller.watchdog.timeout = WATCHDOG_TIMEOUT
+        microcontroller.watchdog.mode = WatchDogMode.RESET
+
+def feed_watchdog():
+    """Postpones the watchdog reset, once setup_hardware started it."""
+    if microcontroller.watchdog.mode is not None:
+        microcontroller.watchdog.feed()
+
+def feed_and_poll():
+    """Feeds the watchdog and answers the taps during blocking work, such as a network exchange."""
+    feed_watchdog()
+    if poll_touch() and renderer.dirty:
+        renderer.refresh()
+
+@telemetry.timed("wifi_connect")
 def connect_to_wifi():
     global esp
     if not esp.connected:
         logger.info(f"Connecting to Wi-Fi {SECRETS['ssid']} ... ")
+        feed_watchdog()
         try:
             esp.connect_AP(SECRETS["ssid"], SECRETS["password"])
         except OSError:
             logger.warning(f"Retrying connection to {SECRETS['ssid']} ... ")
+            feed_watchdog()
             try:
                 esp.connect_AP(SECRETS["ssid"], SECRETS["password"])
             except OSError as e2:
@@ -99,156 +209,525 @@ def disconnect_from_wifi():
             logger.error(f"Failed to disconnect from Wi-Fi: {e} ")
             raise
 
+def wake_radio():
+    """Brings the ESP32 out of reset, if it was powered down."""
+    if not esp_reset.value:
+        logger.info("Waking up the ESP32 ... ")
+        esp.reset()
+
+def power_down_radio():
+    """Holds the ESP32 in reset, its lowest power state, until the next network window."""
+    # The sockets do not survive the reset, the next window opens new ones
+    net.close()
+    esp_reset.value = False
+    logger.info("ESP32 powered down ")
+
+def hub_get(get, path, name, **kwargs):
+    """Runs the NetClient method ``get`` on ``path`` of the schedule hub, in a single attempt.
+
+    Returns None without a hub or when the request failed, the caller falling
+    back to the public APIs.
+    """
+    if not HUB_URL:
+        return None
+    try:
+        return get(HUB_URL + path, name=name, retries=1, raise_for_status=True, **kwargs)
+    except Exception as e:
+        logger.warning(f"Failed to fetch {name} from {HUB_URL}: {e}, falling back to the public APIs ")
+        return None
+
+def read_content(response):
+    content = response.content
+    return content, len(content)
+
+def read_hub_time(response):
+    content = response.content
+    return int(str(content, "ascii")), len(content)
+
+@telemetry.timed("rtc_sync")
+def fetch_utc_time():
+    """Returns the UTC time in milliseconds from the hub, NTP, or the Date header of an HTTP response."""
+    utc_ms = hub_get(net.get, "/time", "hub time", parse=read_hub_time)
+    if utc_ms is not None:
+        logger.info(f"Fetched time from {HUB_URL} ")
+        return utc_ms
+    try:
+        utc_ms = time_sync.ntp_time(net.pool, NTP_SERVER, port=NTP_PORT, timeout=RETRY_POLICY.timeout)
+        logger.info(f"Fetched time from {NTP_SERVER} ")
+    except Exception as e:
+        logger.warning(f"Failed to query {NTP_SERVER}: {e}, falling back to {TIME_HTTP_URL} ... ")
+        utc_ms = net.get(TIME_HTTP_URL, name="time", parse=lambda response: (
+            time_sync.parse_http_date(response.headers["date"]), 0))
+    clean_memory()
+    return utc_ms
+
+def set_rtc(utc_ms):
+    """Sets the RTC to the local time of ``utc_ms``, returns the UTC seconds and how many seconds the RTC was behind."""
+    global rtc_offset
+    # The RTC counts whole seconds, wait for the next one to start
+    wait_ms = 1000 - utc_ms % 1000
+    time.sleep(wait_ms / 1000)
+    utc = (utc_ms + wait_ms) // 1000
+    rtc_offset = zone.utc_offset(utc)
+    local = utc + rtc_offset * 60
+    error = local - time.time()
+    rtc.RTC().datetime = time.localtime(local)
+    logger.info(f"RTC has been set to {adafruit_datetime.now()} (UTC offset {rtc_offset} min) ")
+    return utc, error
+
 def fetch_and_set_rtc():
-    requests = Session(socket_pool=get_radio_socketpool(esp), ssl_context=get_radio_ssl_context(esp))
-    api_url = "https://api.coindesk.com/v1/bpi/currentprice/USD.json"
-    logger.info(f"Fetching time from {api_url} ...")
-    response = None
-    retry_count = 0
-    while retry_count < MAX_RETRIES:
-        try:
-            response = requests.get(url=api_url, stream=True)
-            respond_json = response.json()
-            response.close()
-            del response
-            del requests
-            # Parse the ISO time string from the CoinDesk API
-            iso_time_str = respond_json["time"]["updatedISO"]
-            # Parse the datetime
-            parsed_time = adafruit_datetime.fromisoformat(iso_time_str)
-            # Set the RTC
-            rtc.RTC().datetime = parsed_time.timetuple()
-            logger.info(f"RTC has been set to {parsed_time} ")
+    """Syncs the RTC and returns the seconds until the next sync."""
+    try:
+        utc_ms = fetch_utc_time()
+    except Exception as e:
+        logger.error(f"Failed to sync the RTC: {e} ")
+        return clock_sync.failed()
+    utc, error = set_rtc(utc_ms)
+    interval = clock_sync.record(utc, error)
+    logger.info(f"RTC was {error} s behind, drift {clock_sync.drift_ppm} ppm, next sync in {interval} s ")
+    return interval
+
+@telemetry.timed("location_fetch")
+def fetch_location(utc):
+    """Looks up the location of the public IP address at the UTC seconds ``utc``, returns a location_cache.Location."""
+    paths = ("query", "country", "city", "lat", "lon", "offset", "timezone")
+    extractor = hub_get(net.get_fields, "/location", "hub location", paths=paths)
+    if extractor is None:
+        api_url = "http://ip-api.com/json/?fields=status,message,query,country,city,lat,lon,offset,timezone"
+        logger.info(f"Fetching location from {api_url} ...")
+        extractor = net.get_fields(api_url, name="location", paths=paths, raise_for_status=True)
+    fields = extractor.values
+    del extractor
+    location = location_cache.Location(utc, fields["query"], fields["lat"], fields["lon"], fields["offset"] // 60,
+                                       fields["timezone"], fields["city"], fields["country"])
+    del fields
+    logger.info(f"Location is fetched successfully")
 
-            clean_memory()
-            return parsed_time
-        except Exception as e:
-            retry_count += 1
-            if retry_count == MAX_RETRIES:
-                logger.error(f"Failed to fetch and set RTC: {e} ")
-                raise
-            else:
-                logger.warning("Failed to fetch and set RTC, retrying ... ")
-                if response:
-                    response.close()
-                    del response
-                del requests
-                time.sleep(RETRIES_DELAY * retry_count)
-                requests = Session(socket_pool=get_radio_socketpool(esp), ssl_context=get_radio_ssl_context(esp))
-                clean_memory()
-
-def fetch_location():
-    requests = Session(socket_pool=get_radio_socketpool(esp), ssl_context=get_radio_ssl_context(esp))
-    api_url = "http://ip-api.com/json/"
-    logger.info(f"Fetching location from {api_url} ...")
-    response = None
-    retry_count = 0
-    while retry_count < MAX_RETRIES:
-        try:
-            response = requests.get(url=api_url, stream=True)
-            respond_json = response.json()
-            response.close()
-            del response
-            del requests
-            logger.info(f"Location is fetched successfully")
+    clean_memory()
+    return location
 
-            clean_memory()
-            return respond_json["country"], respond_json["city"]
-        except Exception as e:
-            retry_count += 1
-            if retry_count == MAX_RETRIES:
-                logger.error(f"Failed to fetch location: {e} ")
-                raise
-            else:
-                logger.warning("Failed to fetch location, retrying ... ")
-                if response:
-                    response.close()
-                    del response
-                del requests
-                time.sleep(RETRIES_DELAY * retry_count)
-                requests = Session(socket_pool=get_radio_socketpool(esp), ssl_context=get_radio_ssl_context(esp))
-                clean_memory()
-
-
-def construct_prayer_times_url(date, city, country, state):
+def fetch_public_ip():
+    """Returns the public IP address and its UTC offset in minutes now, a much smaller response than the location."""
+    paths = ("query", "offset")
+    extractor = hub_get(net.get_fields, "/location", "hub public IP", paths=paths)
+    if extractor is None:
+        extractor = net.get_fields("http://ip-api.com/json/?fields=query,offset", name="public IP", paths=paths,
+                                   raise_for_status=True)
+    return extractor.values["query"], extractor.values["offset"] // 60
+
+
+def construct_prayer_calendar_url(year, month):
     adhans_api_base_url = "https://api.aladhan.com/v1/"
-    methode = getenv("CALCULATION_METHOD", 2)
 
-    url = f"{adhans_api_base_url}timingsByCity/{date.day}-{date.month}-{date.year}?country={country}&city={city}&method={methode}"
-    if state:
-        url += f"&state={state}"
+    # By coordinates, Aladhan has no place name to geocode
+    url = f"{adhans_api_base_url}calendar/{year}/{month}?latitude={latitude}&longitude={longitude}&method={CALCULATION_METHOD}&school={ASR_SCHOOL}"
+    if location.timezone:
+        url += f"&timezonestring={location.timezone}"
 
     logger.info(
-            f"Fetching prayer times for {city},{(' ' + state + ',') if state else ''} {country} for {date} using method {methode} "
+            f"Fetching prayer times for {latitude}, {longitude} for {year}-{month:02} using method {CALCULATION_METHOD} "
     )
     logger.info(f"URL: {url}")
     clean_memory()
     return url
 
-def try_fetch_prayer_times(url):
-    requests = Session(socket_pool=get_radio_socketpool(esp), ssl_context=get_radio_ssl_context(esp))
-    retry_count = 0
-    response = None
-    while retry_count < MAX_RETRIES:
+@telemetry.timed("prayer_fetch")
+def fetch_prayer_calendar(year, month, retries=None):
+    """Fetches a whole month of prayer times and returns it as cache records, see NetClient.get for ``retries``."""
+    url = construct_prayer_calendar_url(year=year, month=month)
+    logger.info(f"Attempting to fetch prayer times ...")
+    records = net.get_fields(url, name="prayer times", paths=prayer_cache.CALENDAR_PATHS,
+                             item_path=prayer_cache.CALENDAR_ITEM,
+                             convert=prayer_cache.record_from_calendar_fields, retries=retries,
+                             raise_for_status=True).items
+    clean_memory()
+    return records
+
+@telemetry.timed("prayer_hub")
+def fetch_hub_prayer_calendar(year, month):
+    """Fetches a whole month of prayer times from the schedule hub, returns its cache records or None.
+
+    The hub computes them as the device would, or fetches them from Aladhan
+    with PRAYER_SOURCE = "api", and sends them as a prayer_cache file.
+    """
+    url = (f"/prayers/{year}/{month}?latitude={latitude}&longitude={longitude}&method={CALCULATION_METHOD}"
+           f"&school={ASR_SCHOOL}&offset={zone.offset}&dst={zone.rule}&dst_minutes={zone.dst_minutes}"
+           f"&source={PRAYER_SOURCE}&timezone={location.timezone}")
+    content = hub_get(net.get, url, "hub prayer times", parse=read_content)
+    if content is None:
+        return None
+    cache = prayer_cache.unpack_records(content)
+    del content
+    if (cache is None or cache[0] != prayer_cache.day_number(year, month, 1) or cache[1] != CALCULATION_METHOD
+            or len(cache[3]) != prayer_cache.days_in_month(year, month)):
+        logger.warning(f"Invalid prayer times for {year}-{month:02} from {HUB_URL} ")
+        return None
+    return cache[3]
+
+def compute_prayer_day(number):
+    """Computes the prayer times record of the day ``number`` on the device."""
+    return prayer_calc.compute_times(number, latitude, longitude, zone.day_offset(number),
+                                     method=CALCULATION_METHOD, school=ASR_SCHOOL)
+
+@telemetry.timed("prayer_compute")
+def compute_prayer_calendar(year, month):
+    """Computes a whole month of prayer times on the device."""
+    first_day = prayer_cache.day_number(year, month, 1)
+    records = []
+    for number in range(first_day, first_day + prayer_cache.days_in_month(year, month)):
+        feed_and_poll()
+        records.append(compute_prayer_day(number))
+    return records
+
+def cross_check_prayer_calendar(records, api_records):
+    """Logs how far computed times are from Aladhan's."""
+    if len(api_records) != len(records):
+        logger.warning(f"Got {len(api_records)} days of prayer times from Aladhan for {len(records)} computed, "
+                       f"not cross-checked ")
+        return
+    worst = 0
+    for i in range(min(len(records), len(api_records))):
+        for j in range(len(prayer_cache.FIELDS)):
+            diff = abs(records[i][j] - api_records[i][j])
+            worst = max(worst, min(diff, 1440 - diff))
+    if worst > CROSS_CHECK_TOLERANCE:
+        logger.warning(f"Computed prayer times differ from Aladhan by up to {worst} min ")
+    else:
+        logger.info(f"Computed prayer times are within {worst} min of Aladhan ")
+
+def prayer_times_online():
+    """Returns True when the prayer times use the network: from the hub, from Aladhan or cross-checked with it."""
+    return bool(HUB_URL) or PRAYER_SOURCE == "api" or bool(PRAYER_CROSS_CHECK)
+
+def get_prayer_calendar(year, month):
+    """Returns a month of cache records from the hub, else computed locally or fetched depending on PRAYER_SOURCE.
+
+    The hub and the cross-check are skipped while the network is down, see prefetch_prayer_times.
+    """
+    if net_window.open:
+        records = fetch_hub_prayer_calendar(year, month)
+        if records is not None:
+            return records
+    if PRAYER_SOURCE == "api":
+        if not net_window.open:
+            raise OSError(f"No network to fetch the prayer times for {year}-{month:02}")
+        return fetch_prayer_calendar(year=year, month=month)
+
+    records = compute_prayer_calendar(year, month)
+    if PRAYER_CROSS_CHECK and net_window.open:
         try:
-            logger.info(f"Attempting to fetch prayer times ...")
+            # Only logged, a single attempt keeps the radio from waiting out the retries
+            api_records = fetch_prayer_calendar(year=year, month=month, retries=1)
+        except Exception as e:
+            logger.warning(f"Prayer times cross-check failed: {e} ")
+        else:
+            cross_check_prayer_calendar(records, api_records)
+            del api_records
             clean_memory()
-            response = requests.get(url=url, stream=True)
-            response_json = response.json()
-            response.close()
-            del response
-            del requests
+    return records
 
-            logger.info("Prayer times fetched successfully!")
-            clean_memory()
-            return response_json
+def get_prayer_cache_key():
+    # Shortest parts first, the key is truncated to 23 bytes
+    return f"{ASR_SCHOOL},{zone.key},{latitude:.3f},{longitude:.3f}"
+
+def prefetch_prayer_times(date: adafruit_date):
+    """Computes or fetches PREFETCH_MONTHS months of prayer times into the SD cache, see cache_prayer_months.
+
+    Outside of a network window, the radio is only woken up when the prayer
+    times use the network. Without Wi-Fi, computed months are still cached,
+    without the hub or the cross-check.
+    """
+    if not net_window.open and prayer_times_online():
+        with net_window.session(required=False):
+            cache_prayer_months(date)
+    else:
+        cache_prayer_months(date)
+
+def cache_prayer_months(date: adafruit_date):
+    """Caches PREFETCH_MONTHS months of prayer times from ``date`` on.
+
+    Days already cached from ``date`` on are kept, the fetch starts with the
+    month holding the first missing day. The records are cached by position,
+    so the prefetch stops at the first month that is not complete, keeping the
+    months before it, and raises for the job to be retried.
+    """
+    key = get_prayer_cache_key()
+    first_day = prayer_cache.day_number(date.year, date.month, date.day)
+    cached = prayer_cache.read_records(first_day, CALCULATION_METHOD, key)
+    year, month, _ = prayer_cache.date_from_day_number(first_day + len(cached))
+    records = cached[:max(0, prayer_cache.day_number(year, month, 1) - first_day)]
+    del cached
+
+    error = None
+    for _ in range(PREFETCH_MONTHS):
+        feed_and_poll()
+        month_records = get_prayer_calendar(year=year, month=month)
+        if len(month_records) != prayer_cache.days_in_month(year, month):
+            error = f"Got {len(month_records)} days of prayer times for {year}-{month:02}"
+            break
+        skip = max(0, first_day - prayer_cache.day_number(year, month, 1))
+        records.extend(month_records[skip:])
+        del month_records
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+
+    if records:
+        prayer_cache.write_records(first_day, records, CALCULATION_METHOD, key)
+        logger.info(f"Prayer times cached from {date} for {len(records)} days ")
+    del records
+    clean_memory()
+    if error is not None:
+        raise ValueError(error)
+
+def load_prayer_day(date: adafruit_date):
+    """Returns the cached prayer times record for ``date``.
+
+    The cache is prefetched on a miss, and refreshed once fewer than
+    CACHE_REFRESH_DAYS days are left in it. When the prefetch fails, e.g.
+    offline with PRAYER_SOURCE = "api", the day is computed on the device and
+    the prayers job retries the prefetch later.
+    """
+    key = get_prayer_cache_key()
+    number = prayer_cache.day_number(date.year, date.month, date.day)
+    record = prayer_cache.read_day(number, CALCULATION_METHOD, key)
+    if record is None:
+        logger.info(f"No cached prayer times for {date}, prefetching ... ")
+        try:
+            prefetch_prayer_times(date=date)
         except Exception as e:
-            retry_count += 1
+            logger.error(f"Failed to prefetch the prayer times: {e}, retrying in {net_window.retry_delay} s ")
+            memory.error(e)
+            net_window.due("prayers", time.time() + net_window.retry_delay)
+            schedule_network()
+        record = prayer_cache.read_day(number, CALCULATION_METHOD, key)
+        if record is None:
+            # Shown until the prayers job caches the times, e.g. from Aladhan once back online
+            logger.warning(f"Prayer times for {date} are missing from the cache, computed on the device ")
+            record = compute_prayer_day(number)
+    elif prayer_cache.days_remaining(number, CALCULATION_METHOD, key) <= CACHE_REFRESH_DAYS:
+        if net_window.open or not prayer_times_online():
+            logger.info("Prayer times cache is running out, refreshing ... ")
+            try:
+                prefetch_prayer_times(date=date)
+            except Exception as e:
+                logger.warning(f"Failed to refresh the prayer times cache: {e} ")
+        else:
+            # Refreshed in the next network window
+            net_window.due("prayers", time.time())
+            schedule_network()
+    return record
+
+def prayer_refresh_due():
+    """Returns the RTC time when the prayer times cache gets down to CACHE_REFRESH_DAYS days."""
+    now = time.localtime()
+    number = prayer_cache.day_number(now.tm_year, now.tm_mon, now.tm_mday)
+    key = get_prayer_cache_key()
+    remaining = prayer_cache.days_remaining(number, CALCULATION_METHOD, key)
+    return time.time() + max(0, remaining - CACHE_REFRESH_DAYS) * 86400
+
+def refresh_prayer_times():
+    """Network job prefetching the prayer times, returns when it is next due."""
+    prefetch_prayer_times(date=adafruit_datetime.now().date())
+    return prayer_refresh_due()
+
+def set_location(new_location):
+    """Uses ``new_location`` for the coordinates and time zone, the settings taking precedence."""
+    global location, latitude, longitude, zone
+    location = new_location
+    latitude = float(getenv("LATITUDE", location.latitude))
+    longitude = float(getenv("LONGITUDE", location.longitude))
+    if getenv("UTC_OFFSET_MINUTES") is not None:
+        zone = timezone.TimeZone(getenv("UTC_OFFSET_MINUTES"), DST_RULE, DST_MINUTES)
+    else:
+        # The offset of the IP address includes daylight saving time when it was in effect
+        zone = timezone.from_current_offset(location.offset, location.fetched, DST_RULE, DST_MINUTES)
 
-            if retry_count == MAX_RETRIES:
-                logger.error(f"Failed to fetch prayer times: {e}")
-                raise
-            else:
-                logger.warning("Failed to fetch prayer times, retrying...")
-                if response:
-                    response.close()
-                    del response
-                del requests
-                time.sleep(RETRIES_DELAY*retry_count)
-                requests = Session(socket_pool=get_radio_socketpool(esp), ssl_context=get_radio_ssl_context(esp))
-                clean_memory()
-
-def fetch_prayer_times(date: adafruit_date = None,
-                       city: str = getenv("CITY", "Montreal"),
-                       country: str = getenv("COUNTRY", "Canada"),
-                       state: str = getenv("STATE", ""),
-                       ):
-    if date is None:
-        date = adafruit_datetime.now().date()
-    url = construct_prayer_times_url(date=date, city=city, country=country, state=state)
-    data = try_fetch_prayer_times(url)
-    return data
-
-clean_memory()
-
-connect_to_wifi()
-fetch_and_set_rtc()
-current_ip_country, current_ip_city = fetch_location()
-prayers_date = today_date = adafruit_datetime.now().date()
-today_data = fetch_prayer_times(date=prayers_date, country=current_ip_country, city=current_ip_city)
-
-speaker_enable = DigitalInOut(board.SPEAKER_ENABLE)
-speaker_enable.switch_to_output(False)
-if hasattr(board, "AUDIO_OUT"):
-    audio = audioio.AudioOut(board.AUDIO_OUT)
-# elif hasattr(board, "SPEAKER"):
-else:
-    audio = audioio.AudioOut(board.SPEAKER)
-
-clean_memory()
-print("\n************************")
-print(f"** Free memory: {mem_free()} **")
-print("************************\n")
+def location_due():
+    """Returns the RTC time of the next lookup when the location expires, or the latest one of the next public IP check.
+
+    The location job runs up to LOCATION_IP_CHECK_INTERVAL seconds early, so
+    the IP is checked in the first network window opening at least
+    LOCATION_IP_CHECK_INTERVAL seconds from now.
+    """
+    expires = location_cache.expires(location, LOCATION_TTL) + rtc_offset * 60
+    return min(expires, time.time() + 2 * LOCATION_IP_CHECK_INTERVAL)
+
+def refresh_location():
+    """Network job looking the location up again once it expired or the public IP or its UTC offset changed.
+
+    Returns when the job is next due. With an empty DST_RULE, the offset only
+    changes with the IP address or daylight saving time, which the RTC follows
+    within LOCATION_IP_CHECK_INTERVAL instead of LOCATION_TTL.
+    """
+    utc = time.time() - rtc_offset * 60
+    if utc < location_cache.expires(location, LOCATION_TTL):
+        ip, offset = fetch_public_ip()
+        if ip == location.ip and offset == location.offset:
+            return location_due()
+        if ip != location.ip:
+            logger.info(f"Public IP changed from {location.ip} to {ip} ")
+        else:
+            # A daylight saving time change, the only one seen with an empty DST_RULE
+            logger.info(f"UTC offset changed from {location.offset} to {offset} min ")
+    new_location = fetch_location(utc)
+    location_cache.write(new_location)
+    key = get_prayer_cache_key()
+    set_location(new_location)
+    if get_prayer_cache_key() != key:
+        logger.info(f"Location changed to {location.city}, {location.country} ")
+        # The cache key depends on the location, and the RTC on its UTC offset
+        set_rtc((time.time() - rtc_offset * 60) * 1000)
+        schedule_dst_change()
+        unload_schedule()
+        scheduler.at("tick", time.time())
+        net_window.due("prayers", time.time())
+    return location_due()
+
+def sync_time():
+    """Network job syncing the RTC, returns when it is next due."""
+    interval = fetch_and_set_rtc()
+    net.log_stats()
+    telemetry.summary(logger)
+    memory.log_stats(logger)
+    schedule_dst_change()
+    # The clock may have been stepped, recompute every deadline
+    scheduler.at("tick", time.time())
+    return time.time() + interval
+
+location = None  # location_cache.Location of the public IP address, see boot
+net = None  # NetClient, see boot
+net_window = None  # NetworkWindow running the network jobs, see boot
+clock_sync = None
+zone = None  # timezone.TimeZone of the location
+rtc_offset = None  # UTC offset in minutes of the RTC time
+last_known_day = None  # Day of the checkpoint, whose prayer times are shown until the clock is set
+
+def save_checkpoint():
+    """Saves what a warm restart needs besides the caches, see checkpoint.py."""
+    checkpoint.save(CheckpointState(time.time(), rtc_offset, clock_sync.last_sync, clock_sync.interval,
+                                    clock_sync.drift_ppm, net_window.job_due("time"), net_window.job_due("location"),
+                                    net_window.job_due("prayers"), adhan_played_at))
+
+def warm_boot(state):
+    """Restores the clock sync and the network jobs from the checkpoint ``state``, without going online.
+
+    Returns False when the RTC does not agree with the checkpoint, e.g. after
+    a power loss, or when the location or the prayer times are not cached.
+    """
+    global rtc_offset, today_data
+    now = time.time()
+    if not state.saved <= now < state.saved + CHECKPOINT_MAX_AGE:
+        return False
+    cached = location_cache.read()
+    if cached is None:
+        return False
+    set_location(cached)
+    today = adafruit_datetime.now().date()
+    number = prayer_cache.day_number(today.year, today.month, today.day)
+    if prayer_cache.days_remaining(number, CALCULATION_METHOD, get_prayer_cache_key()) < 2:
+        return False
+
+    rtc_offset = state.rtc_offset
+    utc = now - rtc_offset * 60
+    if zone.utc_offset(utc) != rtc_offset:
+        logger.info("Daylight saving time changed while the device was down ")
+        set_rtc(utc * 1000)
+    clock_sync.last_sync = state.last_sync
+    clock_sync.interval = state.sync_interval
+    clock_sync.drift_ppm = state.drift_ppm
+    today_data = load_prayer_day(date=today)
+
+    net_window.job("time", sync_time, state.time_due or now)
+    net_window.job("location", refresh_location, state.location_due or now, ahead=LOCATION_IP_CHECK_INTERVAL)
+    net_window.job("prayers", refresh_prayer_times, state.prayers_due or prayer_refresh_due())
+    return True
+
+def boot():
+    """Restores what is known without the network, returns True when the RTC can be trusted.
+
+    After a reset that left the RTC running, the checkpoint replaces the
+    network entirely. Otherwise the cached location and the day of the
+    checkpoint still give the prayer times shown until boot_network() has set
+    the clock.
+    """
+    global net, net_window, clock_sync, adhan_played_at, last_known_day
+    net = NetClient(esp, policy=RETRY_POLICY, feed=feed_and_poll, sleep=scheduler.sleep)
+    net_window = NetworkWindow(connect_to_wifi, disconnect_from_wifi, wake=wake_radio, power_down=power_down_radio,
+                               retry_delay=NET_WINDOW_RETRY)
+    clock_sync = time_sync.ClockSync(min_interval=TIME_SYNC_MIN_INTERVAL, max_interval=TIME_SYNC_MAX_INTERVAL)
+    load_reminders()
+
+    state = checkpoint.load()
+    if state is not None:
+        # Not played again if the reset happened during its adhan
+        adhan_played_at = state.adhan_at
+        if warm_boot(state):
+            power_down_radio()
+            logger.info(f"Warm restart from the checkpoint saved {time.time() - state.saved} s ago, "
+                        f"the network jobs keep their schedule ")
+            return True
+        logger.info("The checkpoint does not match the RTC or the caches, booting from the network ")
+        saved = time.localtime(state.saved)
+        last_known_day = prayer_cache.day_number(saved.tm_year, saved.tm_mon, saved.tm_mday)
+    cached = location_cache.read()
+    if cached is not None:
+        set_location(cached)
+    return False
+
+def boot_network():
+    """Sets the clock and loads today's prayer times from the network, then registers the network jobs.
+
+    The location cached on the SD card is used until it expires, it is only
+    looked up on the first boot and then by the location job. The screen is
+    already up, the footer tells what the network is doing.
+    """
+    global today_data
+    with net_window.session():
+        show_status("Setting the clock")
+        boot_utc_ms = fetch_utc_time()
+        synced_ns = time.monotonic_ns()
+        if location is None or location_cache.expires(location, LOCATION_TTL) <= boot_utc_ms // 1000:
+            show_status("Looking up the location")
+            fetched = fetch_location(boot_utc_ms // 1000)
+            location_cache.write(fetched)
+            set_location(fetched)
+        else:
+            logger.info(f"Using the cached location {location.city}, {location.country} ")
+        # The location lookup delayed setting the RTC
+        clock_sync.record(*set_rtc(boot_utc_ms + (time.monotonic_ns() - synced_ns) // 1000000))
+        show_status("Loading the prayer times")
+        today_data = load_prayer_day(date=adafruit_datetime.now().date())
+
+    net_window.job("time", sync_time, time.time() + clock_sync.interval)
+    # The public IP is first checked with the first time sync, in the same window
+    net_window.job("location", refresh_location, min(location_due(), time.time() + clock_sync.interval),
+                   ahead=LOCATION_IP_CHECK_INTERVAL)
+    net_window.job("prayers", refresh_prayer_times, prayer_refresh_due())
+
+def setup_touch():
+    """Polls the touchscreen every TOUCH_POLL_MS from the scheduler sleeps and the blocking work."""
+    global touch
+    if not TOUCH_POLL_MS:
+        return
+    touchscreen = adafruit_touchscreen.Touchscreen(board.TOUCH_XL, board.TOUCH_XR, board.TOUCH_YD, board.TOUCH_YU,
+                                                   calibration=((5200, 59000), (5800, 57000)),
+                                                   size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+    touch = TouchInput(touchscreen, interval=TOUCH_POLL_MS / 1000)
+    scheduler.poll = poll_touch
+    scheduler.poll_interval = TOUCH_POLL_MS / 1000
+
+def setup_audio():
+    global speaker_enable, audio, adhan_player
+    speaker_enable = DigitalInOut(board.SPEAKER_ENABLE)
+    speaker_enable.switch_to_output(False)
+    if hasattr(board, "AUDIO_OUT"):
+        audio = audioio.AudioOut(board.AUDIO_OUT)
+    # elif hasattr(board, "SPEAKER"):
+    else:
+        audio = audioio.AudioOut(board.SPEAKER)
+    adhan_player = AdhanPlayer(audio, speaker_enable, ADHAN_BUFFER_SIZE)
 
 # ------------- Constantes ------------- #
 SCREEN_WIDTH = const(480)
@@ -256,18 +735,32 @@ SCREEN_HEIGHT = const(320)
 WHITE = const(0xFFFFFF)
 BLACK = const(0x000000)
 
-# Fonts
-FONT_16 = bitmap_font.load_font("/sd/fonts/Helvetica-Bold-16.bdf")
-FONT_16.load_glyphs(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 :")
+# Fonts, without extension, with the glyphs the labels use
+FONT_FILES = {
+    16: ("/sd/fonts/Helvetica-Bold-16", b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 :/'-"),
+    24: ("/sd/fonts/Helvetica-Bold-24-AlphaNum", b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 :"),
+    48: ("/sd/fonts/Helvetica-Bold-48-CurrentTime", b"0123456789:"),
+}
 
-FONT_24 = bitmap_font.load_font("/sd/fonts/Helvetica-Bold-24-AlphaNum.bdf")
-FONT_24.load_glyphs(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 :")
+def load_font(size):
+    """Opens the glyph atlas of a font, built by tools/build_fonts.py, or else parses its BDF file."""
+    path, glyphs = FONT_FILES[size]
+    with telemetry.phase("font_load", collect=True):
+        try:
+            font = GlyphAtlas(path + ".atlas")  # Glyphs are read from the SD card when first drawn
+        except OSError:
+            logger.warning(f"No glyph atlas for {path}, loading the BDF font ")
+            font = bitmap_font.load_font(path + ".bdf")
+            font.load_glyphs(glyphs)
+    return font
 
-FONT_48 = bitmap_font.load_font("/sd/fonts/Helvetica-Bold-48-CurrentTime.bdf")
-FONT_48.load_glyphs(b"0123456789:")
+def load_fonts():
+    global FONT_16, FONT_24, FONT_48
+    FONT_16 = load_font(16)
+    FONT_24 = load_font(24)
+    FONT_48 = load_font(48)
 
 # Adhans
-ADHAN_MINUTES_BEFORE_PRAYER = const(5)
 ADHANS = {
     "Fajr": {
         "file": "/sd/adhans/AhmadAlNafees.wav",
@@ -293,329 +786,514 @@ ADHANS = {
 
 # ------------- Functions ------------- #
 
-def set_image(group, filename):
-    """Set the image file for a given goup for display.
-    This is most useful for Icons or image slideshows.
-        :param group: The chosen group
-        :param filename: The filename of the chosen image
-    """
-    print("Set image ", filename)
-    if group:
-        group.pop()
-
-    if not filename:
-        return  # we're done, no icon desired
-
-    image_file = open(filename, "rb")
-    image = displayio.OnDiskBitmap(image_file)
-    image.pixel_shader.make_transparent(0)
-    image_sprite = displayio.TileGrid(image, pixel_shader=image.pixel_shader)
-
-    group.append(image_sprite)
-
-def get_str_time(the_time):
-    return f"{the_time.hour:02}:{the_time.minute:02}"
-
-
-def get_hijri_str_month(month_number):
-    months = {
-        1: "Muharram",
-        2: "Safar",
-        3: "Rabi' al-awwal",
-        4: "Rabi' al-thani",
-        5: "Jumada al-awwal",
-        6: "Jumada al-thani",
-        7: "Rajab",
-        8: "Sha'ban",
-        9: "Ramadan",
-        10: "Shawwal",
-        11: "Dhu al-Qi'dah",
-        12: "Dhu al-Hijjah"
-    }
-    return months[month_number]
-
-def get_str_date(data):
-    today_gregorian_dict = data['data']['date']['gregorian']
-    today_gregorian = today_gregorian_dict['day'] + ' ' + today_gregorian_dict['month']['en'] + ' ' + \
-                      today_gregorian_dict['year']
-    today_hijiri_dict = data['data']['date']['hijri']
-    today_hijiri = today_hijiri_dict['day'] + ' ' + get_hijri_str_month(today_hijiri_dict['month']['number']) + ' ' + \
-                   today_hijiri_dict['year']
-    return today_gregorian, today_hijiri
-
-def get_day_timings(data, date):
-    if data is not None:
-        day_date = data['date']['gregorian']
-        api_date = adafruit_date(
-                year=int(day_date['year']),
-                month=int(day_date['month']['number']),
-                day=int(day_date['day'])
-        )
-        if api_date == date:
-            return data['timings']
+@telemetry.timed("image_load")
+def show_background(index=None):
+    """Shows the background of the prayer before the next one, ``index`` of the schedule, or the first background."""
+    name = BACKGROUNDS[0]
+    if index is not None and len(BACKGROUNDS) == len(PRAYERS):
+        name = BACKGROUNDS[(index - 1) % len(PRAYERS)]
+    if name == background.name:
+        return
+    background.show(name)
+    renderer.invalidate()
+    logger.info(f"Background {background.name} {'in RAM' if background.in_ram else 'read from the SD card'} ")
+
+def get_str_minutes(minutes):
+    """Formats minutes from the start of a day, which may go past midnight."""
+    return f"{minutes // 60 % 24:02}:{minutes % 60:02}"
+
+
+def get_day_timings(record):
+    if record is not None:
+        timings = {}
+        for prayer in ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]:
+            minutes = record[prayer_cache.FIELDS.index(prayer)]
+            timings[prayer] = f"{minutes // 60:02}:{minutes % 60:02}"
+        return timings
     return None
 
-def get_next_prayer(timings, current_t: adafruit_time = None):
-    if timings is not None:
-        if current_t is None:
-            current_t = adafruit_datetime.now().time()
-
-        for next_p in ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]:
-            t = timings[next_p].split(' ')[0].split(':')
-            next_p_time = adafruit_time(hour=int(t[0]), minute=int(t[1]))
-
-            if next_p_time > current_t:
-                return next_p, next_p_time
-
-    return None, None
-
-def get_next_day(date_obj: adafruit_date):
-    """
-    Returns the next day, taking into account month and year changes.
-    """
-    if date_obj.month == 2:  # Handle February and leap years
-        if (date_obj.year % 4 == 0 and date_obj.year % 100 != 0) or (date_obj.year % 400 == 0):
-            days_in_month = 29
-        else:
-            days_in_month = 28
-    elif date_obj.month in [4, 6, 9, 11]:  # Handle months with 30 days
-        days_in_month = 30
-    else:  # Handle months with 31 days
-        days_in_month = 31
-
-    # Check if it's the last day of the month
-    if date_obj.day < days_in_month:
-        return adafruit_date(year=date_obj.year, month=date_obj.month, day=date_obj.day + 1)
-    else:
-        if date_obj.month == 12:  # December, transition to next year
-            return adafruit_date(year=date_obj.year + 1, month=1, day=1)
-        else:
-            return adafruit_date(year=date_obj.year, month=date_obj.month + 1, day=1)
-
 # ------------- Inits ------------- #
 
-clean_memory()
-print("\n************************")
-print(f"** Free memory: {mem_free()} **")
-print("************************\n")
-
-display = board.DISPLAY
-display.rotation = 0
-
-# Initializes the display touch screen area
-# ts = adafruit_touchscreen.Touchscreen(board.TOUCH_XL, board.TOUCH_XR,
-#                                       board.TOUCH_YD, board.TOUCH_YU,
-#                                       calibration=((5200, 59000), (5800, 57000)),
-#                                       size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+def build_display():
+    """Builds the screen groups and labels, empty until on_tick() fills them."""
+    global display, renderer, splash, background, template, prayer_time_labels, ct_widget
+    global cd_gregorian_widget, cd_hijri_widget, np_name_widget, np_adhan_widget, np_countdown_widget
+    global footer_adhan_widget, adhan_progress_widget
 
-splash = displayio.Group(scale=1, x=0, y=0)
+    display = board.DISPLAY
+    display.rotation = 0
+    # The display is only refreshed by the render layer, once per loop pass
+    renderer = Renderer(display)
 
-clean_memory()
+    splash = displayio.Group(scale=1, x=0, y=0)
 
-# Set general back ground
-bg_group = displayio.Group(scale=1, x=0, y=0)
-set_image(bg_group, "/sd/images/bg1.bmp")
-splash.append(bg_group)
+    clean_memory()
 
-# Set template
-template_group = displayio.Group(scale=1, x=0, y=0)
-set_image(template_group, "/sd/images/template.bmp")
-splash.append(template_group)
+    # Set general back ground, shown by show_background()
+    bg_group = displayio.Group(scale=1, x=0, y=0)
+    background = ImageLayer(bg_group, ram=BACKGROUND_IN_RAM, reserve=BACKGROUND_RESERVE)
+    splash.append(bg_group)
 
-clean_memory()
+    # Set template, read from the SD card to leave the RAM to the background
+    template_group = displayio.Group(scale=1, x=0, y=0)
+    template = ImageLayer(template_group, ram=False)
+    template.show("template")
+    splash.append(template_group)
 
-# Initialize the prayer time labels
-prayer_time_labels = {}
-for i, prayer in enumerate(["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]):
-    # Create the time label
-    pt_label = Label(y=71, font=FONT_16, color=WHITE)
-    splash.append(pt_label)
-    prayer_time_labels[prayer] = pt_label  # Store the time label for later updates
+    clean_memory()
 
-clean_memory()
+    # Initialize the prayer time labels
+    prayer_time_labels = {}
+    for i, prayer in enumerate(["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]):
+        # Create the time label, centered in its 96 pixels wide column
+        pt_label = Label(y=71, font=FONT_16, color=WHITE)
+        splash.append(pt_label)
+        prayer_time_labels[prayer] = renderer.widget(pt_label, x=i * 96, width=96, align=CENTER)
+        prayer_time_labels[prayer].set("--:--")
 
-# Initialize current time label
-ct_label = Label(y=151, font=FONT_48, text=get_str_time(adafruit_datetime.now().time()), color=WHITE)
-ct_label.x = (240 - ct_label.bounding_box[2]) // 2
-splash.append(ct_label)
+    clean_memory()
 
-clean_memory()
+    # Initialize current time label
+    ct_label = Label(y=151, font=FONT_48, color=WHITE)
+    splash.append(ct_label)
+    ct_widget = renderer.widget(ct_label, width=240, align=CENTER)
 
-# Initialize current date labels
-today_str_gregorian, today_str_hijiri = get_str_date(today_data)
-cd_gregorian_label = Label(y=242, font=FONT_16, text=today_str_gregorian, color=WHITE)
-cd_hijri_label = Label(y=274, font=FONT_16, text=today_str_hijiri, color=WHITE)
-cd_gregorian_label.x = (240 - cd_gregorian_label.bounding_box[2]) // 2
-cd_hijri_label.x = (240 - cd_hijri_label.bounding_box[2]) // 2
-splash.append(cd_gregorian_label)
-splash.append(cd_hijri_label)
+    clean_memory()
 
-clean_memory()
+    # Initialize current date labels
+    cd_gregorian_label = Label(y=242, font=FONT_16, color=WHITE)
+    cd_hijri_label = Label(y=274, font=FONT_16, color=WHITE)
+    splash.append(cd_gregorian_label)
+    splash.append(cd_hijri_label)
+    cd_gregorian_widget = renderer.widget(cd_gregorian_label, width=240, align=CENTER)
+    cd_hijri_widget = renderer.widget(cd_hijri_label, width=240, align=CENTER)
 
-# Initialize next prayer labels
-np_name_label = Label(y=127, font=FONT_24, color=WHITE)
-np_adhan_label = Label(y=198, font=FONT_24, color=WHITE)
-np_countdown_label = Label(y=269, font=FONT_24, color=WHITE)
-splash.append(np_name_label)
-splash.append(np_adhan_label)
-splash.append(np_countdown_label)
+    clean_memory()
 
-clean_memory()
+    # Initialize next prayer labels
+    np_name_label = Label(y=127, font=FONT_24, color=WHITE)
+    np_adhan_label = Label(y=198, font=FONT_24, color=WHITE)
+    np_countdown_label = Label(y=269, font=FONT_24, color=WHITE)
+    splash.append(np_name_label)
+    splash.append(np_adhan_label)
+    splash.append(np_countdown_label)
+    np_name_widget = renderer.widget(np_name_label, x=240, width=240, align=CENTER)
+    np_adhan_widget = renderer.widget(np_adhan_label, x=240, width=240, align=CENTER)
+    np_countdown_widget = renderer.widget(np_countdown_label, x=240, width=240, align=CENTER)
 
-# Initialize footer adhan label
-footer_adhan_label = Label(y=307, font=FONT_16, color=WHITE)
-splash.append(footer_adhan_label)
+    clean_memory()
 
-clean_memory()
+    # Initialize footer adhan label
+    footer_adhan_label = Label(y=307, font=FONT_16, color=WHITE)
+    splash.append(footer_adhan_label)
+    footer_adhan_widget = renderer.widget(footer_adhan_label, x=28)
 
-print("\n************************")
-print(f"** Free memory: {mem_free()} **")
-print("************************\n")
+    # Initialize adhan playback progress label
+    adhan_progress_label = Label(y=307, font=FONT_16, color=WHITE)
+    splash.append(adhan_progress_label)
+    adhan_progress_widget = renderer.widget(adhan_progress_label, width=SCREEN_WIDTH - 28, align=RIGHT)
 
 # ------------- Run ------------- #
 
-today_timings = None
+schedule = None  # DaySchedule of schedule_day
+schedule_day = None  # Day number of the schedule, see prayer_cache.day_number
+tomorrow_data = None
+date_day = None  # Day of the date labels
+shown_day = None  # Day of the prayer times labels
 next_prayer = None
-next_prayer_time = None
-next_adhan_time = None
-start = True
-all_prayers_passed = False
-localtile_refresh = time.monotonic()
-time_sec_until_next_prayer = ADHAN_MINUTES_BEFORE_PRAYER * 60 + 10
-
-# Set the splash screen as the root group for display
-board.DISPLAY.root_group = splash
-
-clean_memory()
-while True:
-    # only query the online time once per hour (and on first run)
-    if (time.monotonic() - localtile_refresh) > 3600:
-        fetch_and_set_rtc()
-        localtile_refresh = time.monotonic()
+next_prayer_at = None  # Minutes between 2000-01-01 and the next prayer
+adhan_pending = False
+adhan_played_at = None  # next_prayer_at of the last adhan played, kept in the checkpoint
+reminders = ReminderEngine([])  # Events of reminders_day, see load_reminders
+reminders_day = None
+touch = None  # TouchInput, see setup_touch
+view = 0  # 0 for the main view, 1 while the prayer times of the other day are paged in
+
+scheduler = Scheduler(light_sleep=getenv("LIGHT_SLEEP", 0), feed=feed_watchdog,
+                      max_sleep=WATCHDOG_TIMEOUT / 2 if WATCHDOG_TIMEOUT else None)
+
+def show_prayer_times(record, tomorrow):
+    timings = get_day_timings(record)
+    logger.info("Tomorrow's Prayer Times: " if tomorrow else "Today's Prayer Times: ")
+
+    for i, prayer in enumerate(["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]):
+        logger.info(f"{prayer}: {timings[prayer]}{', ' if prayer != 'Isha' else ''} ")
+        if not view:
+            prayer_time_labels[prayer].set(timings[prayer])  # Update and recenter the time label
+
+@telemetry.timed("schedule_load", collect=True)
+def load_schedule(number):
+    """Loads the prayer times of the day ``number`` and of the day after, and compiles them."""
+    global today_data, tomorrow_data, schedule, schedule_day
+    clean_memory()
+    today_data = load_prayer_day(date=adafruit_date(*prayer_cache.date_from_day_number(number)))
+    tomorrow_data = load_prayer_day(date=adafruit_date(*prayer_cache.date_from_day_number(number + 1)))
+    schedule = DaySchedule(today_data, tomorrow_data, ADHAN_MINUTES_BEFORE_PRAYER)
+    schedule_day = number
+
+def unload_schedule():
+    """Drops the schedule loaded, which the next tick loads again from the prayer times cache, e.g. for a new offset."""
+    global schedule, schedule_day, shown_day, next_prayer_at, reminders_day
+    schedule = None
+    schedule_day = None
+    shown_day = None
+    next_prayer_at = None
+    reminders_day = None
+
+def on_tick():
+    """Updates the labels, runs the day rollover and schedules the next tick, adhan and reminder."""
+    global date_day, shown_day, next_prayer, next_prayer_at, adhan_pending, reminders_day
+
+    now = time.localtime()
+    minute = now.tm_hour * 60 + now.tm_min
 
     # update time label
-    ct_label.text = get_str_time(adafruit_datetime.now().time())
-    ct_label.x = (240 - ct_label.bounding_box[2]) // 2
+    ct_widget.set(get_str_minutes(minute))
+
+    # Switch to the new day once Isha of the schedule has passed, which is after
+    # midnight at high latitudes in summer
+    number = prayer_cache.day_number(now.tm_year, now.tm_mon, now.tm_mday)
+    if schedule is None or (number != schedule_day and
+                            not 0 <= (number - schedule_day) * 1440 + minute < schedule.prayers[len(PRAYERS) - 1]):
+        if schedule is not None:
+            logger.info(f"RTC: {adafruit_datetime.now()} ")
+            logger.info(f"Today is {adafruit_date(now.tm_year, now.tm_mon, now.tm_mday)}. ")
+        load_schedule(number)
+    minute += (number - schedule_day) * 1440
+    seconds = minute * 60 + now.tm_sec
+    if reminders_day != schedule_day:
+        reminders_day = schedule_day
+        reminders.load_day(schedule, weekday(schedule_day), seconds)
 
     # update date label
-    if today_date != adafruit_datetime.now().date():
-        today_date = adafruit_datetime.now().date()
-        today_gregorian, today_hijiri = get_str_date(today_data)
-        cd_gregorian_label.text = today_gregorian
-        cd_gregorian_label.x = (240 - cd_gregorian_label.bounding_box[2]) // 2
-        cd_hijri_label.text = today_hijiri
-        cd_hijri_label.x = (240 - cd_hijri_label.bounding_box[2]) // 2
-
-    clean_memory()
-    if today_timings is None:
-        today_timings = get_day_timings(today_data['data'], prayers_date)
-        if today_timings is not None:
-            if start:
-                start = False
-                logger.info("Today's Prayer Times: ")
-            else:
-                logger.info("Tomorrow's Prayer Times: ")
-
-            for i, prayer in enumerate(["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]):
-                logger.info(f"{prayer}: {today_timings[prayer]}{', ' if prayer != 'Isha' else ''} ")
-                prayer_time_labels[prayer].text = today_timings[prayer]  # Update the time label text
-                prayer_time_labels[prayer].x = (i * 96) + (
-                        96 - prayer_time_labels[prayer].bounding_box[2]) // 2  # Recenter the text
-
-    if all_prayers_passed or (next_prayer == 'Fajr'):
-        all_prayers_passed = False
-        ct = adafruit_time(hour=00, minute=00, second=00)
+    if date_day != number:
+        date_day = number
+        # From the RTC alone, whichever day the loaded prayer times are for
+        cd_gregorian_widget.set(hijri.format_gregorian(number))
+        cd_hijri_widget.set(hijri.format_hijri(number, HIJRI_ADJUSTMENT))
+
+    index = schedule.next_index(minute)
+
+    # Once Isha has passed, the next prayer is tomorrow's Fajr and tomorrow's prayer times are shown
+    label_day = schedule_day + 1 if schedule.is_next_day(index) else schedule_day
+    if shown_day != label_day:
+        shown_day = label_day
+        show_prayer_times(tomorrow_data if label_day != schedule_day else today_data, label_day != schedule_day)
+
+    prayer_at = schedule_day * 1440 + schedule.prayers[index]
+    if next_prayer_at != prayer_at:
+        if next_prayer_at is not None:
+            logger.info(f"{next_prayer} has passed. Updating the next prayer time ... ")
+
+        next_prayer = schedule.name(index)
+        next_prayer_at = prayer_at
+        adhan_pending = prayer_at != adhan_played_at
+        if adhan_player.primed:
+            # Opened for a prayer that has passed without its adhan, e.g. after the RTC was set
+            adhan_player.stop()
+            scheduler.cancel("adhan_prime")
+        next_adhan_str = get_str_minutes(schedule.adhans[index])
+        logger.info(f"RTC: {adafruit_datetime.now()} ")
+        logger.info(f"Next prayer is {next_prayer} at time {get_str_minutes(schedule.prayers[index])} "
+                    f"and adhan {next_adhan_str} ")
+
+        # update next prayer label
+        np_name_widget.set(next_prayer)
+
+        # update next adhan label
+        np_adhan_widget.set(next_adhan_str)
+
+        show_background(index)
+
+        show_footer()
+
+    # update next prayer countdown label
+    time_sec_until_next_prayer = schedule.seconds_until(index, seconds)
+    hours = time_sec_until_next_prayer // 3600
+    minutes = (time_sec_until_next_prayer % 3600) // 60
+    np_countdown_widget.set(f"{hours:02d} h {minutes:02d} m")
+
+    # Rescheduled on every tick so that RTC adjustments are taken into account
+    if adhan_pending:
+        adhan_at = time.time() + max(0, schedule.seconds_until_adhan(index, seconds))
+        scheduler.at("adhan", adhan_at)
+        if not adhan_player.primed:
+            scheduler.at("adhan_prime", adhan_at - ADHAN_PRIME_SECONDS)
+    schedule_reminder(seconds)
+
+    scheduler.at("tick", time.time() + 60 - now.tm_sec)
+
+def load_reminders():
+    """Reads the reminder rules of REMINDERS_FILE, if any."""
+    global reminders, reminders_day
+    rules = []
+    if REMINDERS_FILE:
+        try:
+            rules = load_rules(REMINDERS_FILE)
+            logger.info(f"Loaded {len(rules)} reminders from {REMINDERS_FILE} ")
+        except OSError:
+            logger.info(f"No reminders, {REMINDERS_FILE} is missing ")
+        except Exception as e:
+            logger.warning(f"Failed to read the reminders of {REMINDERS_FILE}: {e} ")
+    reminders = ReminderEngine(rules)
+    reminders_day = None
+
+def schedule_reminder(seconds):
+    """Schedules the next reminder of the day, ``seconds`` being the time since the start of schedule_day."""
+    reminder_at = reminders.next_time()
+    if reminder_at is None:
+        scheduler.cancel("reminder")
     else:
-        ct = adafruit_datetime.now().time()
-
-    new_next_prayer, new_next_prayer_time = get_next_prayer(timings=today_timings, current_t=ct)
-
-    if ((next_adhan_time is not None)
-            and (ct >= next_adhan_time)
-            and (time_sec_until_next_prayer <= ADHAN_MINUTES_BEFORE_PRAYER * 60)):
-        logger.info(f"Playing adhan {ADHANS[next_prayer]['name']} for {next_prayer} ... ")
-        wavfile = open(file=ADHANS[next_prayer]['file'], mode="rb")
-        wavedata = audiocore.WaveFile(wavfile)
-        speaker_enable.value = True
-        audio.play(wavedata)
-        while audio.playing:
-            pass
-        wavfile.close()
-        speaker_enable.value = False
-        logger.info(f"Adhan for {next_prayer} has finished. ")
-        next_adhan_time = None
-
-    if (next_prayer_time is None) or (new_next_prayer_time != next_prayer_time):
-        if next_prayer_time is not None:
-            logger.info(f"{next_prayer} ({next_prayer_time}) has passed. Updating the next prayer time ... ")
-
-        next_prayer = new_next_prayer
-        next_prayer_time = new_next_prayer_time
-
-        if next_prayer_time is not None:
-            next_adhan_time = adafruit_time(
-                    hour=(next_prayer_time.hour if next_prayer_time.minute >= ADHAN_MINUTES_BEFORE_PRAYER
-                          else (next_prayer_time.hour - 1) % 24),
-                    minute=(next_prayer_time.minute - ADHAN_MINUTES_BEFORE_PRAYER) % 60
-            )
-            logger.info(f"RTC: {adafruit_datetime.now()} ")
-            logger.info(f"Next prayer is {next_prayer} at time {next_prayer_time} and adhan {next_adhan_time} ")
-
-            # update next prayer label
-            np_name_label.text = next_prayer
-            np_name_label.x = 240 + (240 - np_name_label.bounding_box[2]) // 2
+        scheduler.at("reminder", time.time() + max(0, reminder_at - seconds))
+
+def on_reminder():
+    """Runs the actions of the reminders due, those too late after a clock change are skipped."""
+    now = time.localtime()
+    number = prayer_cache.day_number(now.tm_year, now.tm_mon, now.tm_mday)
+    seconds = ((number - schedule_day) * 1440 + now.tm_hour * 60 + now.tm_min) * 60 + now.tm_sec
+    event = reminders.pop(seconds)
+    while event is not None:
+        at, rule, prayer = event
+        text = rule.name if prayer == FIXED_TIME else f"{rule.name} {PRAYERS[prayer]}"
+        if seconds - at > REMINDER_GRACE:
+            logger.info(f"Skipping the reminder {text}, {seconds - at} s late ")
+        else:
+            run_reminder(rule, text)
+        event = reminders.pop(seconds)
+    schedule_reminder(seconds)
+
+def run_reminder(rule, text):
+    """Runs the actions of the reminder ``rule``: log line, footer banner and sound."""
+    if rule.log:
+        logger.info(f"Reminder: {text} ")
+    if rule.banner:
+        footer_adhan_widget.set(text)
+        scheduler.at("banner_end", time.time() + rule.banner)
+    if rule.sound:
+        if adhan_player.playing:
+            logger.info(f"Not playing the sound of {text} over {adhan_player.name} ")
+        else:
+            adhan_player.play(rule.sound, name=text)
+            scheduler.at("sound_end", time.time() + int(adhan_player.duration) + 1)
 
-            # update next adhan label
-            np_adhan_label.text = get_str_time(next_adhan_time)
-            np_adhan_label.x = 240 + (240 - np_adhan_label.bounding_box[2]) // 2
+def on_banner_end():
+    show_footer()
 
-            footer_adhan_label.text = f"{ADHANS[next_prayer]['name']}"
-            footer_adhan_label.x = 28
+def show_footer():
+    """Shows the reciter of the next adhan in the footer, or the day of the paged prayer times."""
+    if view:
+        footer_adhan_widget.set("Tomorrow" if shown_day == schedule_day else "Today")
+    else:
+        footer_adhan_widget.set(ADHANS[next_prayer]['name'])
+
+def on_sound_end():
+    """Releases the file and the speaker of a reminder sound, unless an adhan has replaced it."""
+    adhan_player.update()
+
+@telemetry.timed("adhan_prime")
+def on_adhan_prime():
+    """Opens the file of the next adhan ahead of time, so that it starts on the second."""
+    scheduler.cancel("adhan_prime")
+    if adhan_pending and not adhan_player.playing:
+        adhan_player.prime(ADHANS[next_prayer]['file'], name=next_prayer)
+
+@telemetry.timed("adhan_play")
+def on_adhan():
+    global adhan_pending, adhan_played_at
+    adhan_pending = False
+    adhan_played_at = next_prayer_at
+    # The tick run just before in the same pass may have scheduled it again
+    scheduler.cancel("adhan")
+    scheduler.cancel("adhan_prime")
+    logger.info(f"Playing adhan {ADHANS[next_prayer]['name']} for {next_prayer} ... ")
+    adhan_player.play(ADHANS[next_prayer]['file'], name=next_prayer)
+    on_adhan_progress()
+    save_checkpoint()
+
+def on_adhan_progress():
+    """Polls the adhan playback and refreshes its progress label every second."""
+    if adhan_player.update():
+        elapsed = int(adhan_player.elapsed)
+        duration = int(adhan_player.duration)
+        adhan_progress_widget.set(f"{elapsed // 60:02}:{elapsed % 60:02} / {duration // 60:02}:{duration % 60:02}")
+        scheduler.at("adhan_progress", time.time() + 1)
+    else:
+        logger.info(f"Adhan for {adhan_player.name} has finished. ")
+        adhan_progress_widget.set("")
+
+def stop_adhan():
+    """Stops the adhan being played, if any."""
+    if adhan_player.playing:
+        logger.info(f"Stopping adhan for {adhan_player.name} ... ")
+        adhan_player.stop()
+        scheduler.at("adhan_progress", time.time())
+
+def poll_touch():
+    """Runs the action of a new tap, if any, and returns True if there was one."""
+    if touch is None:
+        return False
+    tap = touch.poll()
+    if tap is None:
+        return False
+    on_tap(*tap)
+    return True
+
+@telemetry.timed("touch")
+def on_tap(x, y):
+    """Stops the adhan or the reminder sound being played, otherwise pages the view."""
+    if adhan_player.playing:
+        stop_adhan()
+    elif schedule is not None:
+        page_view()
+
+def page_view():
+    """Shows the prayer times of the other day than the main view, until VIEW_SECONDS after the last tap."""
+    global view
+    view = (view + 1) % 2
+    if not view:
+        on_view_end()
+        return
+    # The main view shows tomorrow's prayer times once Isha has passed
+    set_prayer_labels(tomorrow_data if shown_day == schedule_day else today_data)
+    show_footer()
+    scheduler.at("view_end", time.time() + VIEW_SECONDS)
+
+def on_view_end():
+    """Goes back to the main view."""
+    global view
+    view = 0
+    scheduler.cancel("view_end")
+    set_prayer_labels(today_data if shown_day == schedule_day else tomorrow_data)
+    show_footer()
+
+def set_prayer_labels(record):
+    for prayer, timing in get_day_timings(record).items():
+        prayer_time_labels[prayer].set(timing)
+
+def schedule_dst_change():
+    """Schedules the next daylight saving time change of the RTC, if any."""
+    transition = zone.next_transition(time.time() - rtc_offset * 60)
+    if transition is not None:
+        scheduler.at("dst", transition + rtc_offset * 60)
+
+def schedule_network():
+    """Schedules the next network window, when the earliest network job is due."""
+    due = net_window.next_due()
+    if due is not None:
+        scheduler.at("network", due)
+
+def on_network():
+    if adhan_player.primed:
+        # A network window would hold the adhan back, it runs once the adhan has started
+        scheduler.at("network", scheduler.deadline("adhan") or time.time())
+        return
+    net_window.run(time.time())
+    schedule_network()
+    save_checkpoint()
+
+def on_dst_change():
+    """Moves the RTC to the new UTC offset, without going online."""
+    utc = time.time() - rtc_offset * 60
+    logger.info("Daylight saving time change ")
+    set_rtc(utc * 1000)
+    schedule_dst_change()
+    scheduler.at("tick", time.time())
+    save_checkpoint()
+
+def show_status(text):
+    """Shows ``text`` in the footer right away, while the network holds the main loop."""
+    footer_adhan_widget.set(text)
+    renderer.refresh()
+
+def show_first_frame(clock_set):
+    """Shows the screen from the local state, before any network work.
+
+    With the RTC set, the screen is complete. Otherwise the prayer times of
+    the last known day are shown, if cached, with no clock until boot_network().
+    """
+    # Set the splash screen as the root group for display
+    board.DISPLAY.root_group = splash
+    renderer.invalidate()
+    if clock_set:
+        on_tick()
+    else:
+        show_background()
+        if location is not None and last_known_day is not None:
+            record = prayer_cache.read_day(last_known_day, CALCULATION_METHOD, get_prayer_cache_key())
+            if record is not None:
+                set_prayer_labels(record)
+        footer_adhan_widget.set("Connecting")
+    with telemetry.phase("render"):
+        renderer.refresh()
+
+def start():
+    """Schedules the first events, once the clock is set."""
+    scheduler.at("tick", time.time())
+    schedule_network()
+    schedule_dst_change()
+    save_checkpoint()
+
+    # Boot phases, appended to the SD card to compare firmware updates
+    telemetry.dump(logger)
+    memory.log_stats(logger)
+    if TELEMETRY_FILE:
+        try:
+            telemetry.write(TELEMETRY_FILE, label=f"boot {adafruit_datetime.now()} {uname().version}")
+        except OSError as e:
+            logger.warning(f"Failed to write the telemetry to {TELEMETRY_FILE}: {e} ")
+
+def step():
+    """Sleeps until the next events are due, runs them and refreshes the display."""
+    due = scheduler.wait()
+    if "dst" in due:
+        on_dst_change()
+    if "tick" in due:
+        on_tick()
+    if "adhan_prime" in due:
+        on_adhan_prime()
+    if "adhan" in due:
+        on_adhan()
+    if "adhan_progress" in due:
+        on_adhan_progress()
+    if "reminder" in due:
+        on_reminder()
+    if "banner_end" in due:
+        on_banner_end()
+    if "sound_end" in due:
+        on_sound_end()
+    if "view_end" in due:
+        on_view_end()
+    # After the adhan, which a network window due at the same time would delay
+    if "network" in due:
+        on_network()
+    if renderer.dirty:
+        with telemetry.phase("render"):
+            renderer.refresh()
+    clean_memory()
 
-        else:
-            if not all_prayers_passed:
-                logger.info(f"RTC: {adafruit_datetime.now()} ")
-                logger.info(f"All prayers for today {adafruit_datetime.now().date()} have passed. ")
-                all_prayers_passed = True
-
-                prayers_date = get_next_day(prayers_date)
-                logger.info(f"Tomorrow is {prayers_date}. ")
-
-                clean_memory()
-                print("\n*******************************")
-                print(f"** Free memory: {mem_free()} **")
-                print("*******************************\n")
-                del today_data
-                today_data = fetch_prayer_times(date=prayers_date, country=current_ip_country, city=current_ip_city)
-                clean_memory()
-                print("\n*******************************")
-                print(f"** Free memory: {mem_free()} **")
-                print("*******************************\n")
-                today_timings = None
-
-    if next_prayer_time is not None:
-        current_time = adafruit_datetime.now().time()
-        one_day_in_seconds = 60 * 60 * 24
-
-        if (next_prayer == 'Fajr') and (current_time > next_prayer_time):
-            # Calculate the time until Fajr, considering it's the next day
-            section1 = one_day_in_seconds - (
-                    current_time.hour * 60 + current_time.minute) * 60 - current_time.second
-            section2 = (next_prayer_time.hour * 60 + next_prayer_time.minute) * 60
-            time_sec_until_next_prayer = section1 + section2
-        else:
-            # Calculate time until the next prayer within the same day
-            time_sec_until_next_prayer = (next_prayer_time.hour * 60 + next_prayer_time.minute) * 60 - \
-                                         (current_time.hour * 60 + current_time.minute) * 60 - current_time.second
-
-        time_sec_until_next_adhan = time_sec_until_next_prayer - (ADHAN_MINUTES_BEFORE_PRAYER * 60)  # FIXME : can be negative
-        # logger.info(f"RTC: {adafruit_datetime.now()} ")
-        # logger.info(f"Time until next adhan: {time_sec_until_next_adhan} seconds ")
-        # logger.info(f"Time until next prayer: {time_sec_until_next_prayer} seconds ")
-        # time.sleep(time_sec_until_next_adhan if time_sec_until_next_adhan > 0 else time_sec_until_next_prayer)
-
-        # update next prayer countdown label
-        hours = time_sec_until_next_prayer // 3600
-        minutes = (time_sec_until_next_prayer % 3600) // 60
-        np_countdown_label.text = f"{hours:02d} h {minutes:02d} m"
-        np_countdown_label.x = 240 + (240 - np_countdown_label.bounding_box[2]) // 2
+def run():
+    """Boots the device and runs the main loop forever."""
+    telemetry.collect()
+    setup_hardware()
+    try:
+        # Up to the first frame, only the flash, the SD card and the NVM are read
+        with telemetry.phase("first_frame"):
+            clock_set = boot()
+            setup_audio()
+            load_fonts()
+            build_display()
+            show_first_frame(clock_set)
+        telemetry.collect()
+        setup_touch()
+        if not clock_set:
+            boot_network()
+        start()
+        clean_memory()
+        while True:
+            step()
+    except Exception as e:
+        logger.critical(f"Stopped by an unhandled error: {e} ")
+        raise
+    finally:
+        # Write the buffered tail of the log before the error reaches code.py
+        log_handler.flush()
@@ -0,0 +1,66 @@
+"""
+Garbage collection when the heap needs it rather than after every phase.
+
+A full collection walks the whole heap, milliseconds on the SAMD51, and
+delays whatever runs next, such as the minute tick. ``clean_memory`` only
+collects once ``mem_free()`` falls below ``threshold``; ``collect`` always
+does, and is called before the large allocations (HTTP responses and their
+parsing, images), which fail on a fragmented heap even with enough memory
+free in total. Collections, their pauses and the MemoryErrors seen are
+counted, to check that collecting less does not run out of memory more::
+
+    memory.threshold = 32768
+    clean_memory()  # Usually returns right away
+    memory.collect()  # Before loading an image
+"""
+import gc
+
+from telemetry import TICKS_MAX, mem_free, ticks_ms
+
+
+class MemoryManager:
+    def __init__(self, threshold=32768):
+        self.threshold = threshold  # Free bytes below which clean() collects
+        self.collections = 0
+        self.skipped = 0  # clean() calls returning without collecting
+        self.errors = 0  # MemoryErrors reported with error()
+        self.pause_ms = 0  # Total time spent collecting
+        self.max_pause_ms = 0
+        self.lowest_free = None  # Lowest mem_free() seen before a collection
+
+    def clean(self):
+        """Collects the garbage if free memory is below the threshold, returns True if it did."""
+        free = mem_free()
+        if self.lowest_free is None or free < self.lowest_free:
+            self.lowest_free = free
+        if free >= self.threshold:
+            self.skipped += 1
+            return False
+        self.collect()
+        return True
+
+    def collect(self):
+        """Collects the garbage now, e.g. before a large allocation."""
+        start = ticks_ms()
+        gc.collect()
+        pause_ms = (ticks_ms() - start) & TICKS_MAX
+        self.collections += 1
+        self.pause_ms += pause_ms
+        if pause_ms > self.max_pause_ms:
+            self.max_pause_ms = pause_ms
+
+    def error(self, error):
+        """Counts ``error`` if it is a MemoryError, and collects the garbage left by what failed."""
+        if isinstance(error, MemoryError):
+            self.errors += 1
+        self.collect()
+
+    def log_stats(self, logger):
+        average_ms = self.pause_ms // self.collections if self.collections else 0
+        logger.info(f"Garbage collection: {self.collections} runs, {self.skipped} skipped, average {average_ms} ms, "
+                    f"max {self.max_pause_ms} ms, lowest free {self.lowest_free}, {self.errors} MemoryErrors ")
+
+
+# Shared by the firmware modules, main sets the threshold from the settings
+memory = MemoryManager()
+clean_memory = memory.clean
@@ -0,0 +1,158 @@
+"""
+Shared HTTP client for every online query.
+
+A single ``adafruit_requests.Session`` is kept for the lifetime of the program,
+so the radio socket pool and SSL context are only created once and sockets are
+kept alive between requests to the same host. Every request goes through the
+same retry / backoff / timeout policy, and its latency and size are recorded.
+
+Responses are either handed to a parser of the caller with ``get``, or
+streamed through ``json_stream`` with ``get_fields``, which only keeps the
+fields asked for. Streaming reads every chunk into the same buffer, allocated
+with the client, see ``read_chunks``.
+"""
+import time
+
+from adafruit_connection_manager import connection_manager_close_all, get_radio_socketpool, get_radio_ssl_context
+from adafruit_logging import getLogger
+from adafruit_requests import Session
+from json_stream import STRING_MAX, FieldExtractor
+from memory import memory
+
+logger = getLogger("PrayerPortal")
+
+
+class RetryPolicy:
+    def __init__(self, retries=3, delay=10, backoff=2, timeout=30):
+        self.retries = retries  # Attempts before giving up
+        self.delay = delay  # Seconds before the first retry
+        self.backoff = backoff  # Delay multiplier for each following retry
+        self.timeout = timeout  # Socket timeout in seconds
+
+    def retry_delay(self, attempt):
+        """Returns the delay after the failed attempt number ``attempt`` (starting at 1)."""
+        return self.delay * self.backoff ** (attempt - 1)
+
+
+# Bytes read from the socket at a time when streaming a response
+CHUNK_SIZE = 512
+
+
+def read_chunks(response, buffer):
+    """Reads the body of ``response`` into ``buffer`` chunk by chunk, yielding the size of each chunk.
+
+    The public ``iter_content`` of adafruit_requests returns each chunk as new
+    bytes, hundreds of short-lived allocations for a calendar that fragment the
+    heap. Reading into a buffer of the caller is only possible with the private
+    ``Response._readinto``, which ``json()`` also reads through. It is used when
+    the library has it, ``iter_content`` otherwise.
+    """
+    readinto = getattr(response, "_readinto", None)
+    if readinto is None:
+        for chunk in response.iter_content(len(buffer)):
+            buffer[:len(chunk)] = chunk
+            yield len(chunk)
+        return
+    while True:
+        size = readinto(buffer)
+        if not size:
+            return
+        yield size
+
+
+class NetClient:
+    def __init__(self, esp, policy=None, feed=None, sleep=time.sleep):
+        self.pool = get_radio_socketpool(esp)  # Also used for UDP, see time_sync
+        self.session = Session(socket_pool=self.pool, ssl_context=get_radio_ssl_context(esp))
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.feed = feed  # Called before each attempt and each streamed chunk, e.g. to feed the watchdog
+        self.sleep = sleep  # Waits between retries, such as Scheduler.sleep which also feeds the watchdog
+        # name: [requests, failures, last latency (ms), total latency (ms), total bytes]
+        self.stats = {}
+        # Allocated once while the heap is in one piece, reused by every streamed response
+        self._chunk = bytearray(CHUNK_SIZE)
+        self._string = bytearray(STRING_MAX)
+
+    def _record(self, name, failed, latency_ms=0, size=0):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = [0, 0, 0, 0, 0]
+        stats[0] += 1
+        if failed:
+            stats[1] += 1
+        else:
+            stats[2] = latency_ms
+            stats[3] += latency_ms
+            stats[4] += size
+
+    def get(self, url, name, parse, retries=None, raise_for_status=False):
+        """GETs ``url`` and returns the result of ``parse(response)``, retrying as the policy says.
+
+        ``parse`` returns a ``(result, size)`` tuple, size being the bytes read.
+        ``name`` identifies the request in the logs and the stats. The response is
+        always closed, which hands its socket back to the pool for reuse.
+        ``retries`` overrides the attempts of the policy, e.g. 1 when there is a
+        fallback for the request, and with ``raise_for_status`` an HTTP error
+        status fails the attempt instead of being parsed.
+        """
+        if retries is None:
+            retries = self.policy.retries
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            if self.feed is not None:
+                self.feed()
+            # The response and its parsing are the largest allocations of the firmware
+            memory.collect()
+            start = time.monotonic_ns()
+            try:
+                response = self.session.get(url=url, stream=True, timeout=self.policy.timeout)
+                if raise_for_status and response.status_code >= 400:
+                    raise OSError(f"HTTP status {response.status_code}")
+                result, size = parse(response)
+                response.close()
+                latency_ms = (time.monotonic_ns() - start) // 1000000
+                self._record(name, False, latency_ms, size)
+                logger.info(f"Fetched {name} in {latency_ms} ms ({size} bytes) ")
+                return result
+            except Exception as e:
+                self._record(name, True)
+                if response is not None:
+                    response.close()
+                del response
+                memory.error(e)
+                if attempt >= retries:
+                    logger.error(f"Failed to fetch {name}: {e} ")
+                    raise
+                delay = self.policy.retry_delay(attempt)
+                logger.warning(f"Failed to fetch {name}: {e}, retrying in {delay} s ... ")
+                self.sleep(delay)
+
+    def get_fields(self, url, name, paths, item_path=None, convert=None, retries=None, raise_for_status=False):
+        """GETs ``url`` and streams its JSON body through a ``json_stream.FieldExtractor``.
+
+        Returns the extractor, whose ``values`` and ``items`` hold the fields found.
+        A body that ends before the document does fails the attempt.
+        """
+        def parse(response):
+            extractor = FieldExtractor(paths, item_path=item_path, convert=convert, buffer=self._string)
+            for size in read_chunks(response, self._chunk):
+                extractor.feed(self._chunk, size)
+                if self.feed is not None:
+                    self.feed()
+            extractor.finish()
+            return extractor, extractor.size
+
+        return self.get(url, name, parse, retries, raise_for_status)
+
+    def close(self):
+        """Closes the sockets kept alive, e.g. before the radio is reset."""
+        connection_manager_close_all(self.pool)
+
+    def log_stats(self):
+        for name, (count, failures, last_ms, total_ms, size) in self.stats.items():
+            successes = count - failures
+            average_ms = total_ms // successes if successes else 0
+            logger.info(f"{name}: {count} requests, {failures} failed, last {last_ms} ms, "
+                        f"average {average_ms} ms, {size} bytes ")
@@ -0,0 +1,164 @@
+"""
+Network windows: the radio is only up while there is network work to do.
+
+Every online task (time sync, location refresh, prayer times prefetch ...) is
+a job that knows when it is next due. When the earliest job is due, a window
+opens: the ESP32 is woken up and joins the access point, every job due by
+then runs in the same session, then the radio disconnects and the ESP32 is
+held in reset until the next window. A job returns the RTC time it is next
+due at, computed from what its cache needs, or None when it has nothing left
+to do. A job raising an error is retried ``retry_delay`` seconds later. A job
+added with ``ahead`` also runs in a window opening up to ``ahead`` seconds
+before it is due, so a job that only needs to run now and then rides along
+with the others instead of waking the radio on its own.
+
+Code that needs the network outside of a window, such as a cache miss at
+boot, opens a session of its own with ``with window.session():``, sessions
+nest so the radio is only set up once. Work that can also be done offline
+opens an optional session, whose body still runs when the access point cannot
+be joined, with ``open`` telling whether the network is up::
+
+    with window.session(required=False):
+        if window.open:
+            ...
+"""
+import time
+
+from adafruit_logging import getLogger
+from memory import clean_memory, memory
+
+logger = getLogger("PrayerPortal")
+
+
+class NetworkWindow:
+    def __init__(self, connect, disconnect, wake=None, power_down=None, retry_delay=900):
+        self._connect = connect  # Joins the access point, raises on failure
+        self._disconnect = disconnect
+        self._wake = wake  # Brings the radio out of power down, before connecting
+        self._power_down = power_down
+        self.retry_delay = retry_delay  # Seconds before a failed job or window is retried
+        self.windows = 0  # Windows opened since the start
+        self._jobs = {}  # name: [function, due, ahead]
+        self._depth = 0  # Nested sessions
+
+    def job(self, name, function, due, ahead=0):
+        """Adds the job ``name``, running ``function()`` at the RTC time ``due``, or replaces it.
+
+        With ``ahead``, the job also runs in a window opening up to ``ahead`` seconds before ``due``.
+        """
+        self._jobs[name] = [function, due, ahead]
+
+    def due(self, name, when):
+        """Moves the job ``name`` to the RTC time ``when``, e.g. when its cache runs out earlier than planned."""
+        job = self._jobs.get(name)
+        if job is not None:
+            job[1] = when
+
+    def job_due(self, name):
+        """Returns the RTC time the job ``name`` is due at, or None."""
+        job = self._jobs.get(name)
+        return None if job is None else job[1]
+
+    def next_due(self):
+        """Returns the RTC time of the earliest job, or None if there is none."""
+        earliest = None
+        for _, due, _ in self._jobs.values():
+            if due is not None and (earliest is None or due < earliest):
+                earliest = due
+        return earliest
+
+    @property
+    def open(self):
+        return self._depth > 0
+
+    def session(self, required=True):
+        """Context manager keeping the radio connected, for network work outside of ``run``.
+
+        Unless ``required``, a failed connection is logged and the body runs offline.
+        """
+        return _Session(self, required)
+
+    def _open(self):
+        if self._depth == 0:
+            if self._wake is not None:
+                self._wake()
+            try:
+                self._connect()
+            except Exception:
+                self._shut_down()
+                raise
+            self.windows += 1
+        self._depth += 1
+
+    def _close(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                self._disconnect()
+            finally:
+                self._shut_down()
+
+    def _shut_down(self):
+        if self._power_down is not None:
+            self._power_down()
+        clean_memory()
+
+    def run(self, now):
+        """Runs every job due at the RTC time ``now`` in a single session, returns their names."""
+        if not any(when is not None and when <= now for _, when, _ in self._jobs.values()):
+            return []
+        due = [name for name, (_, when, ahead) in self._jobs.items() if when is not None and when <= now + ahead]
+        logger.info(f"Opening a network window for {', '.join(due)} ... ")
+        start = time.monotonic()
+        try:
+            self._open()
+        except Exception as e:
+            logger.error(f"Failed to open the network window: {e}, retrying in {self.retry_delay} s ")
+            for name in due:
+                self._jobs[name][1] = now + self.retry_delay
+            return []
+        try:
+            i = 0
+            while i < len(due):
+                job = self._jobs[due[i]]
+                try:
+                    job[1] = job[0]()
+                except Exception as e:
+                    logger.error(f"Network job {due[i]} failed: {e}, retrying in {self.retry_delay} s ")
+                    job[1] = now + self.retry_delay
+                    memory.error(e)
+                clean_memory()
+                i += 1
+                # A job may make another one due, e.g. a new location the prayer times
+                for name, (_, when, _) in self._jobs.items():
+                    if when is not None and when <= time.time() and name not in due:
+                        due.append(name)
+        finally:
+            self._close()
+        logger.info(f"Network window closed after {time.monotonic() - start:.1f} s ")
+        return due
+
+
+class _Session:
+    def __init__(self, window, required):
+        self._window = window
+        self._required = required
+        self._opened = False
+
+    def __enter__(self):
+        try:
+            self._window._open()
+        except Exception as e:
+            if self._required:
+                raise
+            logger.error(f"Failed to connect, going on offline: {e} ")
+            memory.error(e)
+        else:
+            self._opened = True
+        return self._window
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._opened:
+            self._opened = False
+            self._window._close()
+        return False
@@ -0,0 +1,195 @@
+"""
+Month-ahead prayer-time cache stored on the SD card.
+
+Prayer times are prefetched one month per request and written to a compact
+binary file with one fixed-size record per day, so the nightly rollover is a
+seek and a read instead of a Wi-Fi connection and a JSON parse.
+
+File layout (little endian):
+    header  <4sHHB23s   magic, first day number, record count, method, location key
+    record  <6H         Fajr, Sunrise, Dhuhr, Asr, Maghrib, Isha (minutes of day)
+
+Day numbers count days since 2000-01-01, so the record for a date lives at
+``HEADER_SIZE + (day_number(date) - first_day) * RECORD_SIZE``.
+"""
+import os
+import struct
+
+CACHE_DIR = "/sd/cache"
+CACHE_FILE = CACHE_DIR + "/prayers.bin"
+
+MAGIC = b"PPT2"  # PPT1 records also held the hijri date, see hijri.py
+HEADER_FORMAT = "<4sHHB23s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_FORMAT = "<6H"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Order of the minute fields inside a record
+FIELDS = ("Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha")
+
+# Paths of the fields of an Aladhan calendar response needed for records, see json_stream
+CALENDAR_ITEM = "data[]"
+CALENDAR_PATHS = tuple(CALENDAR_ITEM + ".timings." + name for name in FIELDS)
+
+_record_buffer = bytearray(RECORD_SIZE)
+
+
+def day_number(year, month, day):
+    """Returns the number of days between 2000-01-01 and the given date."""
+    y = year - 1 if month <= 2 else year
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (month - 3 if month > 2 else month + 9) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 730425
+
+
+def date_from_day_number(number):
+    """Inverse of :func:`day_number`, returns a ``(year, month, day)`` tuple."""
+    z = number + 730425
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    year = yoe + era * 400 + (1 if month <= 2 else 0)
+    return year, month, day
+
+
+def days_in_month(year, month):
+    if month == 12:
+        return 31
+    return day_number(year, month + 1, 1) - day_number(year, month, 1)
+
+
+def parse_minutes(timing):
+    """Converts an Aladhan timing such as ``"05:12 (EDT)"`` to minutes of day."""
+    hour, minute = timing.split(" ")[0].split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def record_from_api_day(day):
+    """Builds a cache record from one day entry of an Aladhan response."""
+    timings = day["timings"]
+    return tuple(parse_minutes(timings[name]) for name in FIELDS)
+
+
+def record_from_calendar_fields(fields):
+    """Builds a cache record from the ``CALENDAR_PATHS`` values of one calendar day."""
+    return tuple(parse_minutes(fields[path]) for path in CALENDAR_PATHS)
+
+
+def _read_header(file):
+    header = file.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        return None
+    magic, first_day, count, method, key = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        return None
+    return first_day, count, method, key.rstrip(b"\x00")
+
+
+def _encode_key(key):
+    return key.encode("utf-8")[:23]
+
+
+def pack_header(first_day, count, method, key):
+    return struct.pack(HEADER_FORMAT, MAGIC, first_day, count, int(method), _encode_key(key))
+
+
+def unpack_records(data):
+    """Returns ``(first_day, method, key, records)`` of the bytes of a whole cache file, or None if they are invalid.
+
+    The schedule hub (``tools/schedule_hub.py``) serves each month in this layout.
+    """
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, first_day, count, method, key = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC or len(data) != HEADER_SIZE + count * RECORD_SIZE:
+        return None
+    records = [struct.unpack_from(RECORD_FORMAT, data, HEADER_SIZE + index * RECORD_SIZE) for index in range(count)]
+    return first_day, method, key.rstrip(b"\x00"), records
+
+
+def read_header(path=CACHE_FILE):
+    """Returns ``(first_day, count, method, key)`` or None if there is no valid cache."""
+    try:
+        with open(path, "rb") as file:
+            return _read_header(file)
+    except OSError:
+        return None
+
+
+def read_day(number, method, key, path=CACHE_FILE):
+    """Returns the record for the given day number, or None on a cache miss.
+
+    A cache built for another calculation method or location is treated as a miss.
+    """
+    try:
+        with open(path, "rb") as file:
+            header = _read_header(file)
+            if header is None:
+                return None
+            first_day, count, cached_method, cached_key = header
+            if cached_method != int(method) or cached_key != _encode_key(key):
+                return None
+            index = number - first_day
+            if index < 0 or index >= count:
+                return None
+            file.seek(HEADER_SIZE + index * RECORD_SIZE)
+            if file.readinto(_record_buffer) != RECORD_SIZE:
+                return None
+            return struct.unpack(RECORD_FORMAT, _record_buffer)
+    except OSError:
+        return None
+
+
+def days_remaining(number, method, key, path=CACHE_FILE):
+    """Returns how many consecutive days, starting at ``number``, are cached."""
+    header = read_header(path)
+    if header is None:
+        return 0
+    first_day, count, cached_method, cached_key = header
+    if cached_method != int(method) or cached_key != _encode_key(key):
+        return 0
+    if number < first_day:
+        return 0
+    return max(0, first_day + count - number)
+
+
+def read_records(number, method, key, path=CACHE_FILE):
+    """Returns every cached record from ``number`` onwards as a list."""
+    records = []
+    remaining = days_remaining(number, method, key, path)
+    if not remaining:
+        return records
+    with open(path, "rb") as file:
+        first_day = _read_header(file)[0]
+        file.seek(HEADER_SIZE + (number - first_day) * RECORD_SIZE)
+        for _ in range(remaining):
+            records.append(struct.unpack(RECORD_FORMAT, file.read(RECORD_SIZE)))
+    return records
+
+
+def write_records(first_day, records, method, key, path=CACHE_FILE):
+    """Replaces the cache with ``records``, the first one being for ``first_day``.
+
+    The file is written next to the cache and renamed over it, so a reset while
+    writing leaves the previous cache intact.
+    """
+    try:
+        os.mkdir(path.rsplit("/", 1)[0])
+    except OSError:
+        pass  # Directory already exists
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(pack_header(first_day, len(records), method, key))
+        for record in records:
+            file.write(struct.pack(RECORD_FORMAT, *record))
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # No previous cache
+    os.rename(tmp_path, path)
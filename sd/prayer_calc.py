@@ -0,0 +1,159 @@
+"""
+On-device prayer-time calculation.
+
+Computes the daily prayer times from the solar position, for the calculation
+methods supported by the Aladhan API (same ``method`` ids) and a latitude /
+longitude, so the device does not need the network to know today's times.
+
+The sun position follows the same formulas as the Aladhan API (PrayTimes).
+CircuitPython floats only carry about 6 significant digits, which is not enough
+for terms that grow with the number of days since J2000, so the mean anomaly
+and mean longitude are reduced in integer units of 1e-8 degree before any
+floating point math. Everything left in floats is a bounded angle.
+
+Results are minutes of day, in the same order as ``prayer_cache.FIELDS``.
+"""
+from math import acos, asin, atan, atan2, cos, sin, sqrt, tan
+
+# Aladhan method id: (Fajr angle, Isha angle, Isha minutes after Maghrib,
+#                     Maghrib angle, Maghrib minutes after sunset)
+# Isha minutes replace the Isha angle when not None, a Maghrib angle of None
+# means Maghrib is at sunset.
+METHODS = {
+    0: (16.0, 14.0, None, 4.0, 0),  # Shia Ithna-Ashari, Leva Institute, Qum
+    1: (18.0, 18.0, None, None, 0),  # University of Islamic Sciences, Karachi
+    2: (15.0, 15.0, None, None, 0),  # Islamic Society of North America
+    3: (18.0, 17.0, None, None, 0),  # Muslim World League
+    4: (18.5, None, 90, None, 0),  # Umm Al-Qura University, Makkah
+    5: (19.5, 17.5, None, None, 0),  # Egyptian General Authority of Survey
+    7: (17.7, 14.0, None, 4.5, 0),  # Institute of Geophysics, University of Tehran
+    8: (19.5, None, 90, None, 0),  # Gulf Region
+    9: (18.0, 17.5, None, None, 0),  # Kuwait
+    10: (18.0, None, 90, None, 0),  # Qatar
+    11: (20.0, 18.0, None, None, 0),  # Majlis Ugama Islam Singapura
+    12: (12.0, 12.0, None, None, 0),  # Union Organization Islamic de France
+    13: (18.0, 17.0, None, None, 0),  # Diyanet Isleri Baskanligi, Turkey
+    14: (16.0, 15.0, None, None, 0),  # Spiritual Administration of Muslims of Russia
+    15: (18.0, 18.0, None, None, 0),  # Moonsighting Committee Worldwide
+    16: (18.2, 18.2, None, None, 0),  # Dubai
+    17: (20.0, 18.0, None, None, 0),  # Jabatan Kemajuan Islam Malaysia
+    18: (18.0, 18.0, None, None, 0),  # Tunisia
+    19: (18.0, 17.0, None, None, 0),  # Algeria
+    20: (20.0, 18.0, None, None, 0),  # Kementerian Agama Republik Indonesia
+    21: (19.0, 17.0, None, None, 0),  # Morocco
+    22: (18.0, None, 77, None, 3),  # Comunidade Islamica de Lisboa
+    23: (18.0, 18.0, None, None, 5),  # Ministry of Awqaf, Jordan
+}
+
+# Asr shadow factor per Aladhan ``school``: 0 Shafi, 1 Hanafi
+ASR_FACTORS = (1, 2)
+
+_DEG = 0.017453292519943295  # Radians per degree
+_FULL_TURN_E8 = 36000000000  # 360 degrees in units of 1e-8 degree
+
+# Mean anomaly and mean longitude of the sun at J2000, and their daily rates,
+# in units of 1e-8 degree
+_ANOMALY_E8 = 35752900000
+_ANOMALY_RATE_E8 = 98560028
+_LONGITUDE_E8 = 28045900000
+_LONGITUDE_RATE_E8 = 98564736
+
+
+def _mean_angle(base_e8, rate_e8, day, fraction):
+    """Returns ``base + rate * (day + fraction)`` in degrees, within [0, 360)."""
+    whole = (base_e8 + rate_e8 * day) % _FULL_TURN_E8
+    return (whole / 100000000 + rate_e8 * fraction / 100000000) % 360
+
+
+def sun_position(day, fraction):
+    """Returns the sun declination (degrees) and the equation of time (hours).
+
+    ``day`` is the integer number of days since 2000-01-01 and ``fraction`` the
+    offset in days from 0h UT of that day (it may be negative).
+    """
+    fraction -= 0.5  # J2000.0 is at noon
+    g = _mean_angle(_ANOMALY_E8, _ANOMALY_RATE_E8, day, fraction) * _DEG
+    q = _mean_angle(_LONGITUDE_E8, _LONGITUDE_RATE_E8, day, fraction)
+    ecliptic_longitude = (q + 1.915 * sin(g) + 0.020 * sin(2 * g)) * _DEG
+    obliquity = (23.439 - 0.00000036 * (day + fraction)) * _DEG
+
+    right_ascension = atan2(cos(obliquity) * sin(ecliptic_longitude), cos(ecliptic_longitude)) / _DEG / 15
+    equation = (q / 15 - right_ascension) % 24
+    if equation > 12:
+        equation -= 24
+    declination = asin(sin(obliquity) * sin(ecliptic_longitude)) / _DEG
+    return declination, equation
+
+
+def _mid_day(day, portion, longitude):
+    equation = sun_position(day, portion - longitude / 360)[1]
+    return 12 - equation
+
+
+def _sun_angle_time(angle, day, portion, latitude, longitude, before_noon):
+    """Returns the local mean solar time (hours) the sun is ``angle`` degrees below the horizon.
+
+    Returns None when the sun never reaches that angle on this day.
+    """
+    declination = sun_position(day, portion - longitude / 360)[0] * _DEG
+    noon = _mid_day(day, portion, longitude)
+    lat = latitude * _DEG
+    ratio = (-sin(angle * _DEG) - sin(declination) * sin(lat)) / (cos(declination) * cos(lat))
+    if ratio < -1 or ratio > 1:
+        return None
+    hours = acos(ratio) / _DEG / 15
+    return noon - hours if before_noon else noon + hours
+
+
+def _asr_time(factor, day, portion, latitude, longitude):
+    declination = sun_position(day, portion - longitude / 360)[0]
+    angle = -atan(1 / (factor + tan(abs(latitude - declination) * _DEG))) / _DEG
+    return _sun_angle_time(angle, day, portion, latitude, longitude, False)
+
+
+def compute_times(day, latitude, longitude, utc_offset_minutes, method=2, school=0, elevation=0):
+    """Computes the prayer times for the day ``day`` (days since 2000-01-01).
+
+    Returns ``(Fajr, Sunrise, Dhuhr, Asr, Maghrib, Isha)`` in minutes of local
+    day, local time being UTC + ``utc_offset_minutes``.
+    """
+    fajr_angle, isha_angle, isha_minutes, maghrib_angle, maghrib_minutes = METHODS[int(method)]
+    rise_set_angle = 0.833 + 0.0347 * sqrt(elevation)
+
+    # First pass on the usual times of day, as PrayTimes does
+    fajr = _sun_angle_time(fajr_angle, day, 5 / 24, latitude, longitude, True)
+    sunrise = _sun_angle_time(rise_set_angle, day, 6 / 24, latitude, longitude, True)
+    dhuhr = _mid_day(day, 12 / 24, longitude)
+    asr = _asr_time(ASR_FACTORS[int(school)], day, 13 / 24, latitude, longitude)
+    sunset = _sun_angle_time(rise_set_angle, day, 18 / 24, latitude, longitude, False)
+    if maghrib_angle is None:
+        maghrib = sunset
+    else:
+        maghrib = _sun_angle_time(maghrib_angle, day, 18 / 24, latitude, longitude, False)
+    if isha_minutes is None:
+        isha = _sun_angle_time(isha_angle, day, 18 / 24, latitude, longitude, False)
+    else:
+        isha = None
+
+    if sunrise is None or sunset is None:
+        raise ValueError(f"No sunrise or sunset at latitude {latitude}")
+
+    # Angle based adjustment of Fajr and Isha for high latitudes (Aladhan default)
+    night = 24 - (sunset - sunrise)
+    portion = fajr_angle / 60 * night
+    if fajr is None or sunrise - fajr > portion:
+        fajr = sunrise - portion
+    if isha_minutes is None:
+        portion = isha_angle / 60 * night
+        if isha is None or isha - sunset > portion:
+            isha = sunset + portion
+
+    maghrib += maghrib_minutes / 60
+    if isha_minutes is not None:
+        isha = maghrib + isha_minutes / 60
+
+    shift = utc_offset_minutes / 60 - longitude / 15
+    return tuple(
+        int((t + shift) % 24 * 60 + 0.5) % 1440
+        for t in (fajr, sunrise, dhuhr, asr, maghrib, isha)
+    )
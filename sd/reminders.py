@@ -0,0 +1,117 @@
+"""
+Reminders around the prayer times: pre-adhan alerts, iqama, Jumu'ah.
+
+Each rule of the reminders file (JSON, see ``sd/reminders.json``) fires at
+an offset in minutes from some of the day's prayer times, or at a fixed
+time, on the days of the week it lists, and runs its actions: a short
+sound, a banner in the footer for some seconds, a log line::
+
+    {"name": "Iqama", "days": ["Fri"], "minutes": {"Fajr": 20, "Asr": 10}, "banner": 300, "log": true}
+    {"name": "Jumu'ah", "days": ["Fri"], "time": "13:15", "sound": "/sd/sounds/beep.wav"}
+
+When a day's schedule is loaded, every event of the day is compiled into
+arrays sorted by seconds from the start of the day, and a cursor points at
+the next one. Each tick only reads the time under the cursor, whatever the
+number of rules, and firing an event moves the cursor by one.
+"""
+import json
+from array import array
+from collections import namedtuple
+
+from schedule import PRAYERS
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")  # In the order of struct_time.tm_wday
+EVERY_DAY = (1 << len(WEEKDAYS)) - 1
+FIXED_TIME = -1  # Prayer index of the events at a fixed time
+
+# days: bitmask of the WEEKDAYS indexes, offsets: (prayer index, minutes) tuples,
+# time: minutes from midnight or None, banner: seconds shown, 0 for none
+Rule = namedtuple("Rule", ("name", "days", "offsets", "time", "sound", "banner", "log"))
+
+
+def weekday(number):
+    """Returns the ``tm_wday`` of the day ``number`` (days since 2000-01-01, a Saturday)."""
+    return (number + 5) % 7
+
+
+def parse_rule(entry):
+    """Returns the Rule of a decoded entry of the reminders file, raises ValueError if it is invalid."""
+    days = EVERY_DAY
+    if "days" in entry:
+        days = 0
+        for day in entry["days"]:
+            days |= 1 << WEEKDAYS.index(day)
+    offsets = tuple((PRAYERS.index(prayer), int(minutes)) for prayer, minutes in entry.get("minutes", {}).items())
+    fixed = None
+    if "time" in entry:
+        hours, minutes = entry["time"].split(":")
+        fixed = int(hours) * 60 + int(minutes)
+    if not offsets and fixed is None:
+        raise ValueError(f"Reminder {entry.get('name')} has neither minutes nor time")
+    return Rule(entry.get("name", ""), days, offsets, fixed, entry.get("sound"), int(entry.get("banner", 0)),
+                bool(entry.get("log", False)))
+
+
+def load_rules(path):
+    """Returns the rules of the reminders file ``path``, raises OSError or ValueError."""
+    with open(path) as file:
+        entries = json.load(file)
+    return [parse_rule(entry) for entry in entries]
+
+
+class ReminderEngine:
+    def __init__(self, rules):
+        self.rules = rules
+        self._times = array("l")  # Seconds from the start of the day, increasing
+        self._rules = array("B")  # Index in ``rules`` of each event
+        self._prayers = array("b")  # Prayer index of each event, FIXED_TIME for a fixed time
+        self._cursor = 0
+
+    def __len__(self):
+        return len(self._times)
+
+    def load_day(self, schedule, day_of_week, seconds):
+        """Compiles the events of the day of ``schedule`` falling on ``day_of_week``, the next one after ``seconds``.
+
+        Events may fall past midnight, e.g. after a late Isha, and stay in
+        this day's events.
+        """
+        events = []
+        for index, rule in enumerate(self.rules):
+            if not rule.days & (1 << day_of_week):
+                continue
+            for prayer, minutes in rule.offsets:
+                events.append(((schedule.prayers[prayer] + minutes) * 60, index, prayer))
+            if rule.time is not None:
+                events.append((rule.time * 60, index, FIXED_TIME))
+        events.sort()
+        self._times = array("l", (event[0] for event in events))
+        self._rules = array("B", (event[1] for event in events))
+        self._prayers = array("b", (event[2] for event in events))
+        self.seek(seconds)
+
+    def seek(self, seconds):
+        """Moves the cursor to the first event after ``seconds``, e.g. after the clock was set."""
+        low = 0
+        high = len(self._times)
+        while low < high:
+            middle = (low + high) // 2
+            if self._times[middle] > seconds:
+                high = middle
+            else:
+                low = middle + 1
+        self._cursor = low
+
+    def next_time(self):
+        """Returns the seconds from the start of the day of the next event, or None when the day has no more."""
+        if self._cursor < len(self._times):
+            return self._times[self._cursor]
+        return None
+
+    def pop(self, seconds):
+        """Returns the next event due by ``seconds`` as ``(time, rule, prayer index)`` and moves past it, or None."""
+        cursor = self._cursor
+        if cursor >= len(self._times) or self._times[cursor] > seconds:
+            return None
+        self._cursor = cursor + 1
+        return self._times[cursor], self.rules[self._rules[cursor]], self._prayers[cursor]
@@ -0,0 +1,62 @@
+"""
+Dirty-tracking render layer over the ``displayio`` labels.
+
+Every label shown on screen is wrapped in a :class:`TextWidget` that remembers
+the last text rendered, so assigning the same value again does not rebuild the
+glyph TileGrids, recompute the bounding box or mark the screen region dirty.
+The display runs with ``auto_refresh`` off and :meth:`Renderer.refresh` pushes
+at most one refresh per frame, only when a widget changed.
+"""
+LEFT = 0
+CENTER = 1
+RIGHT = 2
+
+
+class TextWidget:
+    def __init__(self, renderer, label, x, width, align):
+        self.renderer = renderer
+        self.label = label
+        self.x = x  # Left edge of the area the text is aligned in
+        self.width = width
+        self.align = align
+        self.text = None
+
+    def set(self, text):
+        """Shows ``text``, returns False without touching the label if it is already shown."""
+        if text == self.text:
+            return False
+        self.text = text
+        self.label.text = text
+        if self.align == CENTER:
+            self.label.x = self.x + (self.width - self.label.bounding_box[2]) // 2
+        elif self.align == RIGHT:
+            self.label.x = self.x + self.width - self.label.bounding_box[2]
+        else:
+            self.label.x = self.x
+        self.renderer.dirty = True
+        return True
+
+
+class Renderer:
+    def __init__(self, display):
+        self.display = display
+        self.display.auto_refresh = False
+        self.dirty = True
+        self.refreshes = 0
+
+    def widget(self, label, x=0, width=0, align=LEFT):
+        """Wraps ``label``, already added to the displayed group, in a :class:`TextWidget`."""
+        return TextWidget(self, label, x, width, align)
+
+    def invalidate(self):
+        """Forces the next refresh, after a change made outside of the widgets."""
+        self.dirty = True
+
+    def refresh(self):
+        """Refreshes the display once if anything changed since the last refresh."""
+        if not self.dirty:
+            return False
+        self.display.refresh()
+        self.dirty = False
+        self.refreshes += 1
+        return True
@@ -0,0 +1,70 @@
+"""
+Compiled prayer schedule of one day.
+
+The prayer times of a day are turned once, when the day is loaded, into an
+``array('H')`` of minutes from the start of the day, with the adhan times next
+to them. Looking up the next prayer is then an allocation-free bisect and every
+countdown is a subtraction.
+
+Times are kept in increasing order: a time after midnight (e.g. Isha at high
+latitudes in summer) is stored past 1440, and the last entry is the next day's
+Fajr, so there is always a next prayer before midnight and the wraparound from
+Isha to Fajr needs no special case.
+"""
+from array import array
+
+PRAYERS = ("Fajr", "Dhuhr", "Asr", "Maghrib", "Isha")
+# Index of each prayer in a prayer_cache record
+RECORD_INDEXES = (0, 2, 3, 4, 5)
+MINUTES_PER_DAY = 1440
+
+
+class DaySchedule:
+    def __init__(self, record, next_record, adhan_minutes_before):
+        """Compiles ``record`` and the Fajr of ``next_record`` (the following day)."""
+        self.prayers = array("H")
+        previous = 0
+        for index in RECORD_INDEXES:
+            previous = self._append(record[index], previous)
+        self._append(next_record[RECORD_INDEXES[0]] + MINUTES_PER_DAY, previous)
+        self.adhans = array("H", (max(0, minute - adhan_minutes_before) for minute in self.prayers))
+
+    def _append(self, minute, previous):
+        while minute < previous:
+            minute += MINUTES_PER_DAY
+        self.prayers.append(minute)
+        return minute
+
+    def __len__(self):
+        return len(self.prayers)
+
+    def next_index(self, minute):
+        """Returns the index of the first prayer after ``minute`` (minutes from the start of the day).
+
+        A prayer is passed from its own minute on. Returns ``len(self)`` once the
+        next day's Fajr has passed, which can only happen after midnight.
+        """
+        low = 0
+        high = len(self.prayers)
+        while low < high:
+            middle = (low + high) // 2
+            if self.prayers[middle] > minute:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    @staticmethod
+    def name(index):
+        return PRAYERS[index % len(PRAYERS)]
+
+    def is_next_day(self, index):
+        """Returns True if the prayer at ``index`` is the next day's Fajr."""
+        return index == len(PRAYERS)
+
+    def seconds_until(self, index, seconds):
+        """Returns the seconds from ``seconds`` (since the start of the day) to the prayer at ``index``."""
+        return self.prayers[index] * 60 - seconds
+
+    def seconds_until_adhan(self, index, seconds):
+        return self.adhans[index] * 60 - seconds
@@ -0,0 +1,88 @@
+"""
+Deadline scheduler for the main loop.
+
+Instead of spinning, the main loop registers when each event is next due
+(minute tick, adhan, RTC resync, ...) and sleeps until the earliest one, either
+with ``time.sleep`` or in light sleep through the ``alarm`` module.
+
+Deadlines are RTC seconds, as returned by ``time.time()``. With a watchdog
+running, long sleeps are cut into steps of ``max_sleep`` seconds, and ``feed``
+is called after each one. Input without interrupts, such as the
+touchscreen, is read by ``poll`` every ``poll_interval`` seconds of a sleep;
+it runs the actions of the input itself, and returning True ends the sleep
+of ``wait`` early so that the display is refreshed right away.
+"""
+import time
+
+try:
+    import alarm
+except ImportError:
+    alarm = None
+
+
+class Scheduler:
+    def __init__(self, light_sleep=False, feed=None, max_sleep=None, poll=None, poll_interval=None):
+        self._deadlines = {}
+        self.light_sleep = bool(light_sleep) and alarm is not None
+        self.feed = feed  # Called after every sleep, e.g. to feed the watchdog
+        self.max_sleep = max_sleep  # Seconds slept at most at a time
+        self.poll = poll  # Called every poll_interval seconds while sleeping, returns True on new input
+        self.poll_interval = poll_interval
+
+    def at(self, name, deadline):
+        """Schedules the event ``name`` at ``deadline``, replacing any previous deadline."""
+        self._deadlines[name] = deadline
+
+    def cancel(self, name):
+        self._deadlines.pop(name, None)
+
+    def deadline(self, name):
+        return self._deadlines.get(name)
+
+    def next_deadline(self):
+        """Returns the earliest deadline, or None if nothing is scheduled."""
+        earliest = None
+        for deadline in self._deadlines.values():
+            if earliest is None or deadline < earliest:
+                earliest = deadline
+        return earliest
+
+    def wait(self):
+        """Sleeps until the earliest deadline and returns the names of the events due.
+
+        Due events are removed, repeating events are scheduled again by their handler.
+        The list may be empty if the clock was stepped back while sleeping, or
+        if ``poll`` ended the sleep early.
+        """
+        earliest = self.next_deadline()
+        if earliest is None:
+            raise RuntimeError("Nothing is scheduled")
+        delay = earliest - time.time()
+        if delay > 0:
+            self.sleep(delay, wake=True)
+        elif self.feed is not None:
+            self.feed()
+
+        now = time.time()
+        due = [name for name, deadline in self._deadlines.items() if deadline <= now]
+        for name in due:
+            del self._deadlines[name]
+        return due
+
+    def sleep(self, delay, wake=False):
+        """Sleeps for ``delay`` seconds, polling the input meanwhile; with ``wake``, new input ends the sleep."""
+        while True:
+            step = delay if self.max_sleep is None else min(delay, self.max_sleep)
+            if self.poll is not None:
+                step = min(step, self.poll_interval)
+            if self.light_sleep:
+                alarm.light_sleep_until_alarms(alarm.time.TimeAlarm(monotonic_time=time.monotonic() + step))
+            else:
+                time.sleep(step)
+            if self.feed is not None:
+                self.feed()
+            delay -= step
+            if self.poll is not None and self.poll() and wake:
+                return
+            if delay <= 0:
+                return
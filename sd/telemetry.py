@@ -0,0 +1,166 @@
+"""
+Memory and timing telemetry of named phases (wifi_connect, rtc_sync, font_load ...).
+
+A phase is measured with a context manager or a decorator::
+
+    with telemetry.phase("font_load", collect=True):
+        ...
+
+    @telemetry.timed("prayer_fetch")
+    def fetch_prayer_calendar(...):
+        ...
+
+Each run records its duration, ``mem_free`` before and after, and the duration
+of the garbage collection run at its end when ``collect`` is set. Entries go to
+a fixed ring buffer preallocated as an ``array``, and ticks come from
+``supervisor.ticks_ms``, which stays a small int, so recording a phase does not
+allocate. The buffer is dumped to the log or appended to a CSV file on demand,
+to compare runs across firmware updates. Between two reports, each phase also
+keeps its count, total, shortest and longest duration and lowest free memory,
+which ``summary`` logs as one line per phase, however many entries the ring
+buffer overwrote, mostly display refreshes.
+"""
+import gc
+import time
+from array import array
+
+TICKS_MAX = (1 << 29) - 1  # supervisor.ticks_ms wraps around at 2**29
+
+try:
+    from supervisor import ticks_ms
+except ImportError:  # CPython, e.g. the host tools
+    def ticks_ms():
+        return time.monotonic_ns() // 1000000 & TICKS_MAX
+try:
+    from gc import mem_free
+except ImportError:  # CPython has no fixed heap
+    def mem_free():
+        return 0
+
+FIELDS = ("name", "start_ms", "duration_ms", "mem_before", "mem_after", "gc_ms")
+_FIELD_COUNT = len(FIELDS)
+_TOTAL_COUNT = 5  # Runs, total, shortest and longest duration, lowest mem_after
+
+
+def _ticks_diff(end, start):
+    return (end - start) & TICKS_MAX
+
+
+class Phase:
+    def __init__(self, telemetry, index, collect):
+        self._telemetry = telemetry
+        self._index = index
+        self._collect = collect
+        self._start = 0
+        self._mem = 0
+
+    def __enter__(self):
+        self._mem = mem_free()
+        self._start = ticks_ms()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = ticks_ms()
+        gc_ms = 0
+        if self._collect:
+            gc.collect()
+            gc_ms = _ticks_diff(ticks_ms(), end)
+        self._telemetry.record(self._index, self._start, _ticks_diff(end, self._start), self._mem,
+                               mem_free(), gc_ms)
+        return False
+
+
+class Telemetry:
+    def __init__(self, size=64):
+        self.size = size  # Entries kept, the oldest ones are overwritten
+        self.names = []
+        self.count = 0  # Entries recorded since the start, including overwritten ones
+        self._entries = array("l", [0] * (_FIELD_COUNT * size))
+        self._totals = array("l")  # _TOTAL_COUNT values per name since the last report
+        self._phases = ({}, {})  # Without and with collection, by name
+
+    def phase(self, name, collect=False):
+        """Returns the context manager measuring the phase ``name``.
+
+        With ``collect``, the garbage is collected at the end of the phase and
+        ``mem_after`` is measured after the collection. The context manager is
+        created on the first call and reused afterwards.
+        """
+        phases = self._phases[1 if collect else 0]
+        phase = phases.get(name)
+        if phase is None:
+            if name not in self.names:
+                self.names.append(name)
+                self._totals.extend([0] * _TOTAL_COUNT)
+            phase = phases[name] = Phase(self, self.names.index(name), collect)
+        return phase
+
+    def timed(self, name, collect=False):
+        """Decorator measuring every call of the decorated function as the phase ``name``."""
+        phase = self.phase(name, collect)
+
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                with phase:
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def collect(self, name="gc"):
+        """Collects the garbage as a phase of its own."""
+        with self.phase(name, collect=True):
+            pass
+
+    def record(self, index, start_ms, duration_ms, mem_before, mem_after, gc_ms):
+        offset = self.count % self.size * _FIELD_COUNT
+        entries = self._entries
+        entries[offset] = index
+        entries[offset + 1] = start_ms
+        entries[offset + 2] = duration_ms
+        entries[offset + 3] = mem_before
+        entries[offset + 4] = mem_after
+        entries[offset + 5] = gc_ms
+        self.count += 1
+        offset = index * _TOTAL_COUNT
+        totals = self._totals
+        if not totals[offset] or duration_ms < totals[offset + 2]:
+            totals[offset + 2] = duration_ms
+        if duration_ms > totals[offset + 3]:
+            totals[offset + 3] = duration_ms
+        if not totals[offset] or mem_after < totals[offset + 4]:
+            totals[offset + 4] = mem_after
+        totals[offset] += 1
+        totals[offset + 1] += duration_ms
+
+    def entries(self):
+        """Yields the entries kept, oldest first, as tuples in the order of FIELDS."""
+        for i in range(max(0, self.count - self.size), self.count):
+            offset = i % self.size * _FIELD_COUNT
+            entry = self._entries[offset:offset + _FIELD_COUNT]
+            yield (self.names[entry[0]],) + tuple(entry[1:])
+
+    def dump(self, logger):
+        """Logs every entry kept, then the totals of each phase since the last report, e.g. after boot."""
+        for name, _, duration_ms, mem_before, mem_after, gc_ms in self.entries():
+            logger.info(f"{name}: {duration_ms} ms, free memory {mem_before} -> {mem_after}, gc {gc_ms} ms ")
+        self.summary(logger)
+
+    def summary(self, logger):
+        """Logs the totals of each phase run since the last report, one line per phase, and starts new ones."""
+        totals = self._totals
+        for index, name in enumerate(self.names):
+            offset = index * _TOTAL_COUNT
+            count = totals[offset]
+            if count:
+                logger.info(f"{name}: {count} runs, average {totals[offset + 1] // count} ms, "
+                            f"min {totals[offset + 2]} ms, max {totals[offset + 3]} ms, "
+                            f"lowest free {totals[offset + 4]} ")
+            for i in range(offset, offset + _TOTAL_COUNT):
+                totals[i] = 0
+
+    def write(self, path, label=""):
+        """Appends every entry kept to the CSV file ``path``, after a comment line holding ``label``."""
+        with open(path, "a") as file:
+            file.write(f"# {label}\n")
+            for entry in self.entries():
+                file.write(",".join(str(value) for value in entry) + "\n")
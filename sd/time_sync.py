@@ -0,0 +1,96 @@
+"""
+Clock synchronisation over NTP, with the HTTP ``Date`` header as a fallback.
+
+A single 48 byte UDP exchange with an NTP server replaces a TLS handshake and
+a JSON parse. Each sync also measures how far the RTC drifted since the
+previous one, and :class:`ClockSync` stretches the interval between syncs
+from hourly toward daily while the drift stays small.
+
+Times are UTC milliseconds since 1970-01-01. Timestamps are kept in integers,
+which stay exact where the device floats would not.
+"""
+import struct
+import time
+
+import timezone
+
+NTP_PORT = 123
+# Seconds between 1900-01-01, where NTP timestamps start, and 1970-01-01
+NTP_DELTA = 2208988800
+NTP_PACKET_SIZE = 48
+
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def _ntp_ms(packet, offset):
+    seconds, fraction = struct.unpack_from("!II", packet, offset)
+    return (seconds - NTP_DELTA) * 1000 + (fraction * 1000 >> 32)
+
+
+def ntp_time(pool, server, port=NTP_PORT, timeout=10):
+    """Returns the UTC time in milliseconds from one NTP query to ``server``.
+
+    ``pool`` is a socket pool, the one of the ESP32 on the device or the
+    ``socket`` module on a computer. Half of the network round trip is added
+    to the server transmit time.
+    """
+    packet = bytearray(NTP_PACKET_SIZE)
+    packet[0] = 0x23  # Leap indicator 0, version 4, client mode
+    with pool.socket(pool.AF_INET, pool.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        start = time.monotonic_ns()
+        sock.sendto(packet, (server, port))
+        size = sock.recv_into(packet)
+        round_trip = (time.monotonic_ns() - start) // 1000000
+    if size < NTP_PACKET_SIZE or packet[0] & 0x07 != 4:
+        raise ValueError(f"Invalid NTP response from {server}")
+    if packet[1] == 0:
+        raise ValueError(f"NTP server {server} refused the query")
+    received = _ntp_ms(packet, 32)
+    transmitted = _ntp_ms(packet, 40)
+    return transmitted + max(0, round_trip - (transmitted - received)) // 2
+
+
+def parse_http_date(text):
+    """Returns the UTC time in milliseconds of an HTTP date, e.g. ``Fri, 16 Oct 2026 12:34:56 GMT``.
+
+    The header only has a one second resolution, the middle of the second is returned.
+    """
+    _, day, month, year, clock, _ = text.split()
+    hours, minutes, seconds = clock.split(":")
+    return timezone.utc_seconds(int(year), _MONTHS.index(month) + 1, int(day),
+                                int(hours), int(minutes), int(seconds)) * 1000 + 500
+
+
+class ClockSync:
+    def __init__(self, min_interval=3600, max_interval=86400, tolerance=2):
+        self.min_interval = min_interval  # Seconds between syncs while the drift is unknown or large
+        self.max_interval = max_interval
+        self.tolerance = tolerance  # Seconds the RTC may drift between two syncs
+        self.interval = min_interval
+        self.last_sync = None  # UTC seconds of the last successful sync
+        self.drift_ppm = None  # RTC drift in parts per million, positive when it runs slow
+
+    def record(self, utc, error):
+        """Records a sync at ``utc`` where the RTC was ``error`` seconds behind, returns the next interval.
+
+        The interval is at most doubled at each sync, and shortened as soon as
+        the drift would exceed the tolerance. An error of one second is within
+        the RTC resolution: it only stretches the interval and leaves the drift
+        estimate as it was, a whole-second RTC showing 277 ppm after an hour
+        that never drifted.
+        """
+        if self.last_sync is not None and utc > self.last_sync:
+            elapsed = utc - self.last_sync
+            if abs(error) <= 1:
+                interval = self.interval * 2
+            else:
+                self.drift_ppm = error * 1000000 // elapsed
+                interval = elapsed * self.tolerance // abs(error)
+            self.interval = max(self.min_interval, min(self.max_interval, self.interval * 2, interval))
+        self.last_sync = utc
+        return self.interval
+
+    def failed(self):
+        """Returns the delay before retrying a failed sync, the learned interval is kept."""
+        return min(self.interval, self.min_interval)
@@ -0,0 +1,144 @@
+"""
+UTC offset and daylight saving time of the device location.
+
+The standard offset comes from the ``UTC_OFFSET_MINUTES`` setting (or from the
+public IP address) and daylight saving time from ``DST_RULE``. The rule is a
+preset (``US``, ``EU``) or the two transitions in the POSIX ``TZ`` form, for
+example ``M3.2.0/2,M11.1.0/2``. Each transition gives the month, the week of
+the month (5 is the last one), the weekday (0 is Sunday) and the local hour,
+which is in standard time for the start and in daylight time for the end.
+
+Times are UTC seconds since 1970-01-01, like ``time.time()`` on the device.
+"""
+import prayer_cache
+
+# Days between 1970-01-01 and 2000-01-01, where prayer_cache day numbers start
+EPOCH_2000_DAYS = 10957
+SECONDS_PER_DAY = 86400
+
+PRESETS = {
+    # US and Canada: second Sunday of March to first Sunday of November, at 02:00 local time
+    "US": "M3.2.0/2,M11.1.0/2",
+    # European Union: last Sunday of March to last Sunday of October, at 01:00 UTC
+    "EU": None,
+}
+
+
+def utc_seconds(year, month, day, hours=0, minutes=0, seconds=0):
+    """Returns the seconds since 1970-01-01 of a UTC date and time."""
+    days = EPOCH_2000_DAYS + prayer_cache.day_number(year, month, day)
+    return days * SECONDS_PER_DAY + hours * 3600 + minutes * 60 + seconds
+
+
+def utc_year(utc):
+    return prayer_cache.date_from_day_number(utc // SECONDS_PER_DAY - EPOCH_2000_DAYS)[0]
+
+
+def _parse_transition(text):
+    """Parses ``Mm.w.d[/h[:mm]]`` into ``(month, week, weekday, minutes after local midnight)``."""
+    if not text.startswith("M"):
+        raise ValueError(f"Unsupported DST transition {text}")
+    date, _, at = text[1:].partition("/")
+    month, week, weekday = date.split(".")
+    minutes = 120
+    if at:
+        hours, _, mins = at.partition(":")
+        minutes = int(hours) * 60 + (int(mins) if mins else 0)
+    return int(month), int(week), int(weekday), minutes
+
+
+def transition_day(year, month, week, weekday):
+    """Returns the day number of the ``week``-th ``weekday`` of the month, the last one for week 5."""
+    first = prayer_cache.day_number(year, month, 1)
+    # 2000-01-01 was a Saturday
+    day = (weekday - (first + 6) % 7) % 7 + 1 + (week - 1) * 7
+    if day > prayer_cache.days_in_month(year, month):
+        day -= 7
+    return first + day - 1
+
+
+def _checksum(text):
+    value = 0
+    for c in text:
+        value = (value * 31 + ord(c)) & 0xFFFF
+    return value
+
+
+class TimeZone:
+    def __init__(self, offset, rule="", dst_minutes=60):
+        if rule.upper() in PRESETS:
+            rule = rule.upper()
+        self.offset = offset  # Standard UTC offset in minutes
+        self.rule = rule
+        self.dst_minutes = dst_minutes
+        self.start = self.end = None
+        if rule == "EU":
+            self.start = (3, 5, 0, 60 + offset)
+            self.end = (10, 5, 0, 60 + offset + dst_minutes)
+        elif rule:
+            start, end = PRESETS.get(rule, rule).split(",")
+            self.start = _parse_transition(start)
+            self.end = _parse_transition(end)
+        self._year = None
+        self._transitions = None
+
+    @property
+    def key(self):
+        """Short text identifying the offsets, for cache keys."""
+        if self.start is None:
+            return str(self.offset)
+        checksum = _checksum(self.rule + "/" + str(self.dst_minutes))
+        return f"{self.offset}d{checksum:04x}"
+
+    def transitions(self, year):
+        """Returns the UTC seconds when daylight saving time starts and ends in ``year``."""
+        if self._year != year:
+            start = ((EPOCH_2000_DAYS + transition_day(year, *self.start[:3])) * SECONDS_PER_DAY
+                     + (self.start[3] - self.offset) * 60)
+            end = ((EPOCH_2000_DAYS + transition_day(year, *self.end[:3])) * SECONDS_PER_DAY
+                   + (self.end[3] - self.offset - self.dst_minutes) * 60)
+            self._year = year
+            self._transitions = (start, end)
+        return self._transitions
+
+    def is_dst(self, utc):
+        if self.start is None:
+            return False
+        start, end = self.transitions(utc_year(utc))
+        if start < end:
+            return start <= utc < end
+        # Southern hemisphere, daylight saving time spans the new year
+        return not end <= utc < start
+
+    def utc_offset(self, utc):
+        """Returns the UTC offset in minutes at ``utc``."""
+        return self.offset + self.dst_minutes if self.is_dst(utc) else self.offset
+
+    def day_offset(self, number):
+        """Returns the UTC offset in minutes at noon of the day ``number``, see prayer_cache.day_number."""
+        return self.utc_offset((EPOCH_2000_DAYS + number) * SECONDS_PER_DAY + (720 - self.offset) * 60)
+
+    def next_transition(self, utc):
+        """Returns the UTC seconds of the first offset change after ``utc``, or None without DST."""
+        if self.start is None:
+            return None
+        year = utc_year(utc)
+        for transition_year in (year, year + 1):
+            start, end = self.transitions(transition_year)
+            for transition in (min(start, end), max(start, end)):
+                if transition > utc:
+                    return transition
+        return None
+
+
+def from_current_offset(offset, utc, rule="", dst_minutes=60):
+    """Returns the TimeZone whose UTC offset at ``utc`` is ``offset``.
+
+    ``offset`` includes daylight saving time when it is in effect, as the one
+    of the public IP address does.
+    """
+    if rule:
+        zone = TimeZone(offset - dst_minutes, rule, dst_minutes)
+        if zone.is_dst(utc):
+            return zone
+    return TimeZone(offset, rule, dst_minutes)
@@ -0,0 +1,39 @@
+"""
+Touchscreen taps, polled at a fixed rate from wherever the firmware waits.
+
+The resistive touchscreen raises no interrupt, so it has to be read often
+enough for a tap to be answered within about 100 ms. ``poll`` is called from
+the sleeps of the scheduler and from the callbacks of the blocking work
+(streamed HTTP responses, prayer times computation), and only reads the
+screen once ``interval`` has passed since the previous read, so calling it
+more often costs nothing::
+
+    touch = TouchInput(touchscreen, interval=0.05)
+    tap = touch.poll()  # (x, y) once per press, or None
+"""
+import time
+
+
+class TouchInput:
+    def __init__(self, touchscreen, interval=0.05):
+        self.touchscreen = touchscreen  # adafruit_touchscreen.Touchscreen
+        self.interval_ns = int(interval * 1000000000)  # Nanoseconds between two reads of the screen
+        self.taps = 0
+        self._next_read = 0
+        self._pressed = False  # Held since the last tap, which must be released before the next one
+
+    def poll(self):
+        """Returns the ``(x, y)`` of a new press, once per press, or None."""
+        now = time.monotonic_ns()
+        if now < self._next_read:
+            return None
+        self._next_read = now + self.interval_ns
+        point = self.touchscreen.touch_point
+        if point is None:
+            self._pressed = False
+            return None
+        if self._pressed:
+            return None
+        self._pressed = True
+        self.taps += 1
+        return point[0], point[1]
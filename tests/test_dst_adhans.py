@@ -0,0 +1,78 @@
+"""
+Runs the firmware in the simulator of ``tools/simulator`` across the end of
+daylight saving time in Montreal, 2026-11-01 06:00 UTC, and checks that every
+adhan plays at the prayer time computed for the standard time offset:
+
+    python -m unittest discover tests
+
+With an empty DST_RULE the change is only seen in the UTC offset of the public
+IP address, which the location job checks every LOCATION_IP_CHECK_INTERVAL.
+"""
+import calendar
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "sd"))
+
+try:
+    from simulator import Simulator  # noqa: E402
+except ImportError as e:  # Blinka and the CircuitPython libraries of requirements.txt
+    Simulator = None
+    SKIP_REASON = f"Simulator unavailable: {e}"
+else:
+    SKIP_REASON = ""
+
+import prayer_cache  # noqa: E402
+import prayer_calc  # noqa: E402
+
+START = calendar.timegm((2026, 11, 1, 4, 30, 0))  # 00:30 EDT, the schedule of the day is loaded in EDT
+STANDARD_OFFSET = -300  # EST, in minutes
+TOLERANCE = 90  # Seconds, the tick and the adhan priming run on whole minutes
+
+
+@unittest.skipIf(Simulator is None, SKIP_REASON)
+class DaylightSavingAdhanTest(unittest.TestCase):
+    def run_day(self, dst_rule):
+        with tempfile.TemporaryDirectory(prefix="prayer-portal-test-") as work_dir:
+            simulator = Simulator(work_dir, START, days=1, latency=0,
+                                  overrides={"DST_RULE": dst_rule, "LOCATION_IP_CHECK_INTERVAL": 3600})
+            with simulator:
+                main = simulator.load()
+                simulator.run()
+                files = {os.path.basename(adhan["file"]): prayer for prayer, adhan in main.ADHANS.items()}
+                played = {}
+                for utc, source, message in simulator.events:
+                    if source == "audio" and message.startswith("play "):
+                        prayer = files.get(os.path.basename(message[5:].rsplit(" (", 1)[0]))
+                        if prayer is not None:
+                            played[prayer] = utc
+                position = (main.latitude, main.longitude, main.CALCULATION_METHOD, main.ASR_SCHOOL,
+                            main.ADHAN_MINUTES_BEFORE_PRAYER)
+        return played, position
+
+    def expected(self, latitude, longitude, method, school, minutes_before):
+        number = prayer_cache.day_number(2026, 11, 1)
+        fajr, _, dhuhr, asr, maghrib, isha = prayer_calc.compute_times(number, latitude, longitude, STANDARD_OFFSET,
+                                                                       method=method, school=school)
+        midnight = calendar.timegm((2026, 11, 1, 0, 0, 0)) - STANDARD_OFFSET * 60
+        return {prayer: midnight + (minute - minutes_before) * 60
+                for prayer, minute in zip(("Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"),
+                                          (fajr, dhuhr, asr, maghrib, isha))}
+
+    def test_adhans_follow_the_offset(self):
+        for dst_rule in ("", "US"):
+            with self.subTest(dst_rule=dst_rule):
+                played, position = self.run_day(dst_rule)
+                expected = self.expected(*position)
+                self.assertEqual(sorted(played), sorted(expected))
+                for prayer, utc in expected.items():
+                    late = played[prayer] - utc
+                    self.assertLess(abs(late), TOLERANCE, f"{prayer} played {late:.0f} s late")
+
+
+if __name__ == "__main__":
+    unittest.main()
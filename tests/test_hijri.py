@@ -0,0 +1,64 @@
+"""
+Tests of the Gregorian and Hijri dates of ``sd/hijri.py``.
+
+The reference dates are those of the arithmetic calendar, which the published
+conversions agree with on these days:
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sd"))
+
+import hijri  # noqa: E402
+import prayer_cache  # noqa: E402
+
+# Gregorian date: Hijri date
+REFERENCES = {
+    (622, 7, 19): (1, 1, 1),  # The epoch, 16 July 622 in the Julian calendar
+    (1979, 11, 21): (1400, 1, 1),
+    (2000, 1, 1): (1420, 9, 24),
+    (2023, 3, 23): (1444, 9, 1),
+    (2024, 3, 11): (1445, 9, 1),
+    (2025, 3, 1): (1446, 9, 1),
+}
+LEAP_YEARS = (2, 5, 7, 10, 13, 16, 18, 21, 24, 26, 29)  # Of each 30 year cycle
+
+
+class HijriTest(unittest.TestCase):
+    def test_references(self):
+        for date, expected in REFERENCES.items():
+            with self.subTest(date=date):
+                number = prayer_cache.day_number(*date)
+                self.assertEqual(hijri.hijri_from_day_number(number), expected)
+                self.assertEqual(hijri.hijri_day_number(*expected), number)
+
+    def test_round_trip_at_month_and_year_ends(self):
+        for year in range(1440, 1471):  # A whole cycle
+            for month in range(1, 13):
+                length = 30 if month % 2 or (month == 12 and year % 30 in LEAP_YEARS) else 29
+                first = hijri.hijri_day_number(year, month, 1)
+                with self.subTest(year=year, month=month):
+                    self.assertEqual(hijri.hijri_from_day_number(first), (year, month, 1))
+                    self.assertEqual(hijri.hijri_from_day_number(first + length - 1), (year, month, length))
+                    next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+                    self.assertEqual(hijri.hijri_from_day_number(first + length), next_month + (1,))
+
+    def test_cycle(self):
+        self.assertEqual(hijri.hijri_day_number(1471, 1, 1) - hijri.hijri_day_number(1441, 1, 1), hijri.CYCLE_DAYS)
+
+    def test_adjustment(self):
+        number = prayer_cache.day_number(2023, 3, 23)
+        self.assertEqual(hijri.hijri_from_day_number(number, adjustment=-1), (1444, 8, 29))
+        self.assertEqual(hijri.hijri_from_day_number(number, adjustment=1), (1444, 9, 2))
+
+    def test_format(self):
+        number = prayer_cache.day_number(2023, 3, 23)
+        self.assertEqual(hijri.format_gregorian(number), "23 March 2023")
+        self.assertEqual(hijri.format_hijri(number), "01 Ramadan 1444")
+
+
+if __name__ == "__main__":
+    unittest.main()
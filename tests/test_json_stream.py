@@ -0,0 +1,119 @@
+"""
+Tests of the streaming JSON field extractor of ``sd/json_stream.py``.
+
+The documents are fed split at every position, so that each string, escape
+and literal is cut across two chunks, and must give the values ``json`` does:
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sd"))
+
+import json_stream  # noqa: E402
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "payloads")
+
+# The items come first: the values found before an item are handed to it with its own
+DOCUMENT = (b'{"list": [{"v": 1, "w": [3]}, {"v": "two"}, {}],'
+            b' "a": {"b": "x\\"y\\\\z\\u00e9\\n", "skip": {"s": "}]\\"{", "l": [1, 2, {"q": "]"}]},'
+            b' "n": -12.5e1, "i": 42, "t": true, "f": false, "z": null}, "last": 12345678}')
+PATHS = ("a.b", "a.n", "a.i", "a.t", "a.f", "a.z", "last")
+ITEM_PATH = "list[]"
+ITEM_PATHS = ("list[].v",)
+CALENDAR_PATHS = ("data[].timings.Fajr", "data[].timings.Isha")
+
+
+def expected_values():
+    document = json.loads(DOCUMENT)
+    values = {path: document["a"][path[2:]] for path in PATHS if path.startswith("a.")}
+    values["last"] = document["last"]
+    items = [{"list[].v": item["v"]} if "v" in item else {} for item in document["list"]]
+    return values, items
+
+
+def feed(chunks, paths=PATHS + ITEM_PATHS, item_path=ITEM_PATH):
+    extractor = json_stream.FieldExtractor(paths, item_path=item_path)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor
+
+
+class FieldExtractorTest(unittest.TestCase):
+    def test_whole_document(self):
+        extractor = feed([DOCUMENT])
+        extractor.finish()
+        self.assertEqual((extractor.values, extractor.items), expected_values())
+        self.assertEqual(extractor.size, len(DOCUMENT))
+
+    def test_split_at_every_position(self):
+        expected = expected_values()
+        for split in range(1, len(DOCUMENT)):
+            with self.subTest(split=split, at=DOCUMENT[split - 1:split + 1]):
+                extractor = feed([DOCUMENT[:split], DOCUMENT[split:]])
+                extractor.finish()
+                self.assertEqual((extractor.values, extractor.items), expected)
+
+    def test_one_byte_chunks(self):
+        extractor = feed([DOCUMENT[i:i + 1] for i in range(len(DOCUMENT))])
+        extractor.finish()
+        self.assertEqual((extractor.values, extractor.items), expected_values())
+
+    def test_reused_buffer_with_length(self):
+        buffer = bytearray(7)
+        extractor = json_stream.FieldExtractor(PATHS + ITEM_PATHS, item_path=ITEM_PATH,
+                                               buffer=bytearray(json_stream.STRING_MAX))
+        for i in range(0, len(DOCUMENT), len(buffer)):
+            chunk = DOCUMENT[i:i + len(buffer)]
+            buffer[:len(chunk)] = chunk
+            extractor.feed(buffer, len(chunk))
+        extractor.finish()
+        self.assertEqual((extractor.values, extractor.items), expected_values())
+
+    def test_truncated_document(self):
+        for end in range(len(DOCUMENT)):
+            with self.subTest(end=end):
+                extractor = feed([DOCUMENT[:end]])
+                with self.assertRaises(ValueError):
+                    extractor.finish()
+
+    def test_truncated_calendar(self):
+        with open(os.path.join(PAYLOADS, "aladhan_calendar_2026_10.json"), "rb") as file:
+            payload = file.read()
+        extractor = json_stream.extract([payload], CALENDAR_PATHS, item_path="data[]")
+        self.assertEqual(len(extractor.items), 31)
+        with self.assertRaises(ValueError):
+            json_stream.extract([payload[:len(payload) // 2]], CALENDAR_PATHS, item_path="data[]")
+
+    def test_trailing_bytes(self):
+        for trailing in (b",", b"x", b"{}", b"]", b'"s"'):
+            for split in (0, 1, len(DOCUMENT)):
+                with self.subTest(trailing=trailing, split=split):
+                    document = DOCUMENT + trailing
+                    extractor = feed([document[:split], document[split:]])
+                    with self.assertRaises(ValueError):
+                        extractor.finish()
+        extractor = feed([b" \r\n", DOCUMENT, b" \n"])
+        extractor.finish()
+        self.assertEqual((extractor.values, extractor.items), expected_values())
+
+    def test_not_a_document(self):
+        for body in (b"<html>err</html>", b"Internal Server Error", b'"list"', b"12", b"null", b"]", b"}", b","):
+            with self.subTest(body=body):
+                extractor = feed([body[:3], body[3:], DOCUMENT])
+                with self.assertRaises(ValueError):
+                    extractor.finish()
+                self.assertEqual(extractor.size, len(body) + len(DOCUMENT))
+
+    def test_long_string_truncated(self):
+        value = "x" * (json_stream.STRING_MAX + 10)
+        extractor = feed([json.dumps({"a": {"b": value}}).encode()], paths=("a.b",), item_path=None)
+        extractor.finish()
+        self.assertEqual(extractor.values, {"a.b": value[:json_stream.STRING_MAX]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Tests of the prayer times computed on the device by ``sd/prayer_calc.py``.
+
+Each time is checked against the definition of its method with an independent
+solar model, the NOAA one after Meeus in double precision: the sun is at the
+method's angle below the horizon at Fajr and Isha, crosses the meridian at
+Dhuhr, and casts the shadow of its school at Asr. The times are rounded to the
+minute, and the two models agree to a few seconds, so they must match within a
+minute:
+
+    python -m unittest discover tests
+"""
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sd"))
+
+import prayer_cache  # noqa: E402
+import prayer_calc  # noqa: E402
+
+# Name: latitude, longitude, UTC offset in minutes on the days of DAYS
+PLACES = {
+    "Montreal": (45.5017, -73.5673, -300),
+    "Mecca": (21.4225, 39.8262, 180),
+    "Jakarta": (-6.2088, 106.8456, 420),
+    "London": (51.5074, -0.1278, 0),
+}
+# Equinox, mid October and solstice, away from the high latitude adjustment
+DAYS = ((2026, 3, 20), (2026, 10, 16), (2026, 12, 21))
+RISE_SET_ANGLE = 0.833
+TOLERANCE = 1  # Minutes
+
+
+def sun(utc_minutes, day):
+    """Returns the declination and the equation of time (minutes) at ``utc_minutes`` of the day number ``day``."""
+    t = (day + utc_minutes / 1440 - 0.5) / 36525  # Julian centuries since J2000.0
+    mean_longitude = math.radians((280.46646 + t * (36000.76983 + t * 0.0003032)) % 360)
+    anomaly = math.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    center = (math.sin(anomaly) * (1.914602 - t * (0.004817 + 0.000014 * t))
+              + math.sin(2 * anomaly) * (0.019993 - 0.000101 * t) + math.sin(3 * anomaly) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * t)
+    longitude = math.radians(math.degrees(mean_longitude) + center - 0.00569 - 0.00478 * math.sin(omega))
+    obliquity = math.radians(23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+                             + 0.00256 * math.cos(omega))
+    declination = math.asin(math.sin(obliquity) * math.sin(longitude))
+    y = math.tan(obliquity / 2) ** 2
+    equation = 4 * math.degrees(
+        y * math.sin(2 * mean_longitude) - 2 * eccentricity * math.sin(anomaly)
+        + 4 * eccentricity * y * math.sin(anomaly) * math.cos(2 * mean_longitude)
+        - 0.5 * y * y * math.sin(4 * mean_longitude) - 1.25 * eccentricity ** 2 * math.sin(2 * anomaly))
+    return declination, equation
+
+
+def hour_angle(utc_minutes, day, longitude):
+    """Returns the hour angle of the sun in degrees, negative in the morning."""
+    return (utc_minutes + sun(utc_minutes, day)[1] + 4 * longitude) / 4 % 360 - 180
+
+
+def altitude(utc_minutes, day, latitude, longitude):
+    declination = sun(utc_minutes, day)[0]
+    lat = math.radians(latitude)
+    return math.degrees(math.asin(math.sin(lat) * math.sin(declination) + math.cos(lat) * math.cos(declination)
+                                  * math.cos(math.radians(hour_angle(utc_minutes, day, longitude)))))
+
+
+def solve(function, target, start, end):
+    """Returns the minute between ``start`` and ``end`` where the monotonic ``function`` reaches ``target``."""
+    rising = function(end) > function(start)
+    for _ in range(50):
+        middle = (start + end) / 2
+        if (function(middle) < target) == rising:
+            start = middle
+        else:
+            end = middle
+    return (start + end) / 2
+
+
+class PrayerCalcTest(unittest.TestCase):
+    def check_day(self, method, school, place, date):
+        latitude, longitude, offset = PLACES[place]
+        day = prayer_cache.day_number(*date)
+        fajr_angle, isha_angle, isha_minutes, maghrib_angle, maghrib_minutes = prayer_calc.METHODS[method]
+        times = prayer_calc.compute_times(day, latitude, longitude, offset, method=method, school=school)
+        fajr, sunrise, dhuhr, asr, maghrib, isha = (minute - offset for minute in times)
+
+        def height(minutes):
+            return altitude(minutes, day, latitude, longitude)
+
+        noon = solve(lambda minutes: hour_angle(minutes, day, longitude), 0, dhuhr - 60, dhuhr + 60)
+        declination = math.degrees(sun(noon, day)[0])
+        asr_altitude = math.degrees(math.atan(1 / (prayer_calc.ASR_FACTORS[school]
+                                                   + math.tan(math.radians(abs(latitude - declination))))))
+        sunset = solve(height, -RISE_SET_ANGLE, noon, noon + 720)
+        expected = {
+            "Fajr": solve(height, -fajr_angle, noon - 720, noon),
+            "Sunrise": solve(height, -RISE_SET_ANGLE, noon - 720, noon),
+            "Dhuhr": noon,
+            "Asr": solve(height, asr_altitude, noon, noon + 720),
+            "Maghrib": (sunset if maghrib_angle is None else solve(height, -maghrib_angle, noon, noon + 720))
+            + maghrib_minutes,
+        }
+        if isha_minutes is None:
+            expected["Isha"] = solve(height, -isha_angle, noon, noon + 720)
+        else:
+            expected["Isha"] = expected["Maghrib"] + isha_minutes
+        computed = dict(zip(("Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"),
+                            (fajr, sunrise, dhuhr, asr, maghrib, isha)))
+        for name, minutes in expected.items():
+            difference = (computed[name] - minutes + 720) % 1440 - 720
+            self.assertLessEqual(abs(difference), TOLERANCE, f"{name} off by {difference:.2f} min")
+
+    def test_methods(self):
+        for method in prayer_calc.METHODS:
+            for place in PLACES:
+                for date in DAYS:
+                    with self.subTest(method=method, place=place, date=date):
+                        self.check_day(method, 0, place, date)
+
+    def test_hanafi_asr(self):
+        for place in PLACES:
+            for date in DAYS:
+                with self.subTest(place=place, date=date):
+                    self.check_day(2, 1, place, date)
+                    latitude, longitude, offset = PLACES[place]
+                    day = prayer_cache.day_number(*date)
+                    shafi = prayer_calc.compute_times(day, latitude, longitude, offset, school=0)[3]
+                    hanafi = prayer_calc.compute_times(day, latitude, longitude, offset, school=1)[3]
+                    self.assertGreater(hanafi, shafi)
+
+    def test_high_latitude(self):
+        # At 59.9 degrees north in June, the sun does not get 17 degrees below the horizon
+        latitude, longitude, offset = 59.9139, 10.7522, 120
+        day = prayer_cache.day_number(2026, 6, 21)
+        fajr, sunrise, _, _, maghrib, isha = prayer_calc.compute_times(day, latitude, longitude, offset, method=3)
+        night = 1440 - (maghrib - sunrise)
+        # Isha is after midnight
+        self.assertAlmostEqual((isha - maghrib) % 1440, 17 / 60 * night, delta=TOLERANCE)
+        self.assertAlmostEqual(sunrise - fajr, 18 / 60 * night, delta=TOLERANCE)
+
+    def test_no_sunrise(self):
+        with self.assertRaises(ValueError):
+            prayer_calc.compute_times(prayer_cache.day_number(2026, 12, 21), 78.2, 15.6, 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
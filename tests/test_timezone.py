@@ -0,0 +1,86 @@
+"""
+Tests of the daylight saving time transitions of ``sd/timezone.py``, against
+the published instants of the US, EU and Australian rules:
+
+    python -m unittest discover tests
+"""
+import calendar
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sd"))
+
+import prayer_cache  # noqa: E402
+import timezone  # noqa: E402
+
+
+def utc(year, month, day, hours, minutes=0):
+    return calendar.timegm((year, month, day, hours, minutes, 0))
+
+
+# (standard offset, rule): {year: (start, end)} in UTC
+TRANSITIONS = {
+    (-300, "US"): {  # New York, 02:00 local time
+        2026: (utc(2026, 3, 8, 7), utc(2026, 11, 1, 6)),
+        2027: (utc(2027, 3, 14, 7), utc(2027, 11, 7, 6)),
+    },
+    (-480, "M3.2.0/2,M11.1.0/2"): {  # Los Angeles, the US rule in POSIX form
+        2026: (utc(2026, 3, 8, 10), utc(2026, 11, 1, 9)),
+    },
+    (60, "EU"): {  # Paris, 01:00 UTC
+        2026: (utc(2026, 3, 29, 1), utc(2026, 10, 25, 1)),
+        2027: (utc(2027, 3, 28, 1), utc(2027, 10, 31, 1)),
+    },
+    (0, "EU"): {  # London
+        2026: (utc(2026, 3, 29, 1), utc(2026, 10, 25, 1)),
+    },
+    (600, "M10.1.0/2,M4.1.0/3"): {  # Sydney, daylight saving time spans the new year
+        2026: (utc(2026, 10, 3, 16), utc(2026, 4, 4, 16)),
+    },
+}
+
+
+class TimeZoneTest(unittest.TestCase):
+    def test_transitions(self):
+        for (offset, rule), years in TRANSITIONS.items():
+            zone = timezone.TimeZone(offset, rule)
+            for year, (start, end) in years.items():
+                with self.subTest(rule=rule, offset=offset, year=year):
+                    self.assertEqual(zone.transitions(year), (start, end))
+                    for instant, dst in ((start - 1, False), (start, True), (end - 1, True), (end, False)):
+                        self.assertEqual(zone.utc_offset(instant), offset + 60 if dst else offset)
+
+    def test_next_transition(self):
+        zone = timezone.TimeZone(-300, "US")
+        self.assertEqual(zone.next_transition(utc(2026, 10, 16, 12)), utc(2026, 11, 1, 6))
+        self.assertEqual(zone.next_transition(utc(2026, 11, 1, 6)), utc(2027, 3, 14, 7))
+        self.assertIsNone(timezone.TimeZone(-300).next_transition(utc(2026, 10, 16, 12)))
+
+    def test_day_offset(self):
+        zone = timezone.TimeZone(-300, "US")
+        self.assertEqual(zone.day_offset(prayer_cache.day_number(2026, 10, 31)), -240)
+        # The change is at 02:00, the day is in standard time at noon
+        self.assertEqual(zone.day_offset(prayer_cache.day_number(2026, 11, 1)), -300)
+        self.assertEqual(zone.day_offset(prayer_cache.day_number(2026, 3, 8)), -240)
+
+    def test_from_current_offset(self):
+        summer, winter = utc(2026, 7, 1, 12), utc(2026, 12, 1, 12)
+        self.assertEqual(timezone.from_current_offset(-240, summer, "US").offset, -300)
+        self.assertEqual(timezone.from_current_offset(-300, winter, "US").offset, -300)
+        self.assertEqual(timezone.from_current_offset(-240, summer).offset, -240)
+
+    def test_key(self):
+        self.assertEqual(timezone.TimeZone(-300).key, "-300")
+        self.assertNotEqual(timezone.TimeZone(-300, "US").key, timezone.TimeZone(-300, "EU").key)
+        self.assertEqual(timezone.TimeZone(-300, "us").key, timezone.TimeZone(-300, "US").key)
+
+    def test_unsupported_rule(self):
+        for rule in ("J60/2,J300/2", "bogus", "M3.2"):
+            with self.subTest(rule=rule):
+                with self.assertRaises(ValueError):
+                    timezone.TimeZone(0, rule)
+
+
+if __name__ == "__main__":
+    unittest.main()
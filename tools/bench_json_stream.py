@@ -0,0 +1,82 @@
+"""
+Compares ``sd/json_stream.py`` with a whole-document JSON decode on captured
+API payloads, the way ``response.json()`` decodes them on the device.
+
+Reports the peak allocation (tracemalloc) and the parse time for each payload:
+
+    python tools/bench_json_stream.py
+    python tools/bench_json_stream.py --chunk-size 256 tools/payloads/aladhan_calendar_2026_10.json
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "sd"))
+
+import json_stream  # noqa: E402
+import prayer_cache  # noqa: E402
+
+# Fields the firmware reads from each kind of payload, by file name prefix
+TIMINGS_PATHS = tuple("data.timings." + name for name in prayer_cache.FIELDS) + (
+    "data.date.hijri.day", "data.date.hijri.month.number", "data.date.hijri.year")
+PAYLOAD_FIELDS = {
+    "aladhan_calendar": dict(paths=prayer_cache.CALENDAR_PATHS, item_path=prayer_cache.CALENDAR_ITEM,
+                             convert=prayer_cache.record_from_calendar_fields),
+    "aladhan_timings": dict(paths=TIMINGS_PATHS),
+    "ip_api": dict(paths=("country", "city", "lat", "lon", "offset")),
+    "coindesk": dict(paths=("time.updatedISO",)),
+}
+
+
+def chunks(payload, size):
+    for i in range(0, len(payload), size):
+        yield payload[i:i + size]
+
+
+def measure(function, repeat):
+    """Returns the peak allocation (bytes) of one call and the best time (ms) over ``repeat`` calls."""
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return peak, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("payloads", nargs="*", help="Payload files (default: tools/payloads/*.json)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="Bytes fed at a time (default: 512)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per parser (default: 20)")
+    args = parser.parse_args()
+
+    paths = args.payloads or sorted(glob.glob(os.path.join(ROOT, "tools", "payloads", "*.json")))
+    print(f"{'payload':<34} {'bytes':>7} {'json peak':>10} {'stream peak':>12} {'json ms':>8} {'stream ms':>10}")
+    for path in paths:
+        name = os.path.basename(path)
+        fields = next((f for prefix, f in PAYLOAD_FIELDS.items() if name.startswith(prefix)), None)
+        if fields is None:
+            continue
+        with open(path, "rb") as file:
+            payload = file.read()
+
+        json_peak, json_ms = measure(lambda: json.load(io.BytesIO(payload)), args.repeat)
+        stream_peak, stream_ms = measure(
+            lambda: json_stream.extract(chunks(payload, args.chunk_size), **fields), args.repeat)
+        print(f"{name:<34} {len(payload):>7} {json_peak:>10} {stream_peak:>12} {json_ms:>8.2f} {stream_ms:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+Benchmarks the phases of ``sd/main.py`` in the simulator of ``tools/simulator``.
+
+Each phase runs in isolation on a freshly imported firmware, against the
+sample API payloads and the real fonts and images of ``sd``, with no network
+latency. The wall time is the median of the repeats, and the memory is measured
+with tracemalloc in a separate run: peak is the high-water mark above the
+memory in use when the phase starts, retained what is still allocated at its
+end. The garbage collections of the firmware (``memory.py``) are counted in
+the timed runs, where the heap reads as empty: those forced before large
+allocations. These are CPython numbers, to compare firmware versions with each
+other, not to predict the times on the device.
+
+Results are saved as a JSON baseline, with the git revision measured, and
+compared against one to flag regressions (exit status 1). A commit changing a
+measured phase records the baseline again, so its numbers can be checked:
+
+    python tools/benchmark.py --save tools/benchmarks/baseline.json
+    python tools/benchmark.py --baseline tools/benchmarks/baseline.json font_load_16 loop_step
+"""
+import argparse
+import calendar
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from simulator import SimulationEnd, Simulator
+
+START = calendar.timegm((2026, 10, 16, 14, 0, 0))  # In the month of the sample Aladhan calendar
+LOOP_STEPS = 60
+TIME_TOLERANCE = 0.25  # Slowdown flagged as a regression
+MEMORY_TOLERANCE = 0.10
+MEMORY_SLACK = 1024  # Bytes of peak memory growth never flagged, allocator noise
+
+BENCHMARKS = {}
+
+
+def benchmark(name, iterations=1, warm=False):
+    """Registers ``setup(simulator, main)``, which prepares the phase ``name`` and returns the function to measure.
+
+    ``iterations`` is the number of times the function runs the phase, the
+    results are per iteration. With ``warm``, the work directory holds the
+    files of a previous boot (prayer times cache, log).
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, iterations, warm)
+        return setup
+    return decorator
+
+
+def boot_to_first_frame(simulator, main, ready=None):
+    """Runs the firmware until its first display refresh, or the first one once ``ready()`` is true."""
+    def stop(display):
+        if ready is None or ready():
+            raise SimulationEnd()
+
+    simulator.display.on_refresh = stop
+    simulator.run()
+    simulator.display.on_refresh = None
+
+
+def booted(simulator, main):
+    """Boots the firmware until the prayer times are shown, after the network boot."""
+    boot_to_first_frame(simulator, main, ready=lambda: main.schedule is not None)
+    gc.collect()
+
+
+@benchmark("cold_boot")
+def cold_boot(simulator, main):
+    return lambda: boot_to_first_frame(simulator, main)
+
+
+@benchmark("warm_boot", warm=True)
+def warm_boot(simulator, main):
+    return lambda: boot_to_first_frame(simulator, main)
+
+
+@benchmark("boot_ready", warm=True)
+def boot_ready(simulator, main):
+    """Boots until the prayer times are shown, the network boot included."""
+    return lambda: booted(simulator, main)
+
+
+def font_benchmarks(size):
+    @benchmark(f"font_load_{size}")
+    def load(simulator, main):
+        return lambda: main.load_font(size)
+
+    @benchmark(f"font_glyphs_{size}")
+    def glyphs(simulator, main):
+        """Opens the font and reads every glyph the labels use, which the atlas otherwise does on first use."""
+        return lambda: main.load_font(size).load_glyphs(main.FONT_FILES[size][1])
+
+
+for _size in (16, 24, 48):
+    font_benchmarks(_size)
+
+
+@benchmark("location_fetch")
+def location_fetch(simulator, main):
+    main.setup_hardware()
+    main.connect_to_wifi()
+    main.net = main.NetClient(main.esp, policy=main.RETRY_POLICY)
+    return lambda: main.fetch_location(START)
+
+
+@benchmark("prayer_fetch", warm=True)
+def prayer_fetch(simulator, main):
+    booted(simulator, main)
+    main.net_window.session().__enter__()  # The radio is powered down after boot, connect untimed
+    return lambda: main.fetch_prayer_calendar(year=2026, month=10)
+
+
+@benchmark("prayer_compute", warm=True)
+def prayer_compute(simulator, main):
+    booted(simulator, main)
+    return lambda: main.compute_prayer_calendar(2026, 10)
+
+
+@benchmark("schedule_load", warm=True)
+def schedule_load(simulator, main):
+    booted(simulator, main)
+    return lambda: main.load_schedule(main.schedule_day + 1)
+
+
+@benchmark("build_display", warm=True)
+def build_display(simulator, main):
+    main.setup_hardware()
+    main.boot()
+    main.load_fonts()
+    gc.collect()
+    return main.build_display
+
+
+@benchmark("tick", iterations=LOOP_STEPS, warm=True)
+def tick(simulator, main):
+    booted(simulator, main)
+
+    def run():
+        for _ in range(LOOP_STEPS):
+            main.on_tick()
+            main.renderer.invalidate()
+    return run
+
+
+@benchmark("loop_step", iterations=LOOP_STEPS, warm=True)
+def loop_step(simulator, main):
+    booted(simulator, main)
+
+    def run():
+        for _ in range(LOOP_STEPS):
+            main.step()
+    return run
+
+
+@benchmark("frame_render", warm=True)
+def frame_render(simulator, main):
+    booted(simulator, main)
+    return simulator.display.render
+
+
+def run_once(name, work_dir, trace):
+    """Runs the benchmark ``name`` once, returns its wall time in ns, the garbage collections of the firmware,
+    and its peak and retained bytes when traced."""
+    setup, _, _ = BENCHMARKS[name]
+    with Simulator(work_dir, START, latency=0) as simulator, contextlib.redirect_stdout(io.StringIO()):
+        main = simulator.load()
+        function = setup(simulator, main)
+        gc.collect()
+        collections = main.memory.collections
+        if trace:
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter_ns()
+        function()
+        wall_ns = time.perf_counter_ns() - start
+        collections = main.memory.collections - collections
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return wall_ns, collections, peak - before, current - before
+        return wall_ns, collections, 0, 0
+
+
+def run_benchmark(name, repeats, root):
+    _, iterations, warm = BENCHMARKS[name]
+    work_dir = os.path.join(root, name)
+    if warm:  # Boot once to leave the cache and log of a previous boot
+        with Simulator(work_dir, START, latency=0) as simulator, contextlib.redirect_stdout(io.StringIO()):
+            booted(simulator, simulator.load())
+    times = []
+    for i in range(repeats):
+        if not warm:
+            work_dir = os.path.join(root, f"{name}-{i}")
+        wall_ns, collections, _, _ = run_once(name, work_dir, trace=False)
+        times.append(wall_ns)
+    if not warm:
+        work_dir = os.path.join(root, f"{name}-traced")
+    _, _, peak, retained = run_once(name, work_dir, trace=True)
+    times.sort()
+    return {
+        "iterations": iterations,
+        "repeats": repeats,
+        "wall_ms": round(times[len(times) // 2] / iterations / 1e6, 3),
+        "min_ms": round(times[0] / iterations / 1e6, 3),
+        "max_ms": round(times[-1] / iterations / 1e6, 3),
+        "peak_bytes": peak // iterations,
+        "retained_bytes": retained // iterations,
+        "collections": round(collections / iterations, 2),
+    }
+
+
+def revision():
+    """Returns the git revision of the firmware measured, "+" marking uncommitted changes, or None outside git."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--", "sd", "tools"], cwd=root,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + "+" if changes else commit
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """Returns the regressions of ``results`` against ``baseline`` as messages, and the benchmarks it lacks."""
+    regressions = []
+    missing = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            missing.append(name)
+            continue
+        if result["wall_ms"] > reference["wall_ms"] * (1 + time_tolerance):
+            regressions.append(f"{name}: {result['wall_ms']} ms, was {reference['wall_ms']} ms")
+        if result["peak_bytes"] > reference["peak_bytes"] * (1 + memory_tolerance) + MEMORY_SLACK:
+            regressions.append(f"{name}: peak {result['peak_bytes']} bytes, was {reference['peak_bytes']} bytes")
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs of each benchmark (default: 5)")
+    parser.add_argument("--save", metavar="FILE", help="Save the results as a JSON baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with a JSON baseline")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE,
+                        help=f"Slowdown flagged as a regression (default: {TIME_TOLERANCE})")
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE,
+                        help=f"Peak memory growth flagged as a regression (default: {MEMORY_TOLERANCE})")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    results = {}
+    print(f"{'benchmark':16} {'wall ms':>10} {'min ms':>10} {'max ms':>10} {'peak bytes':>12} {'retained':>10} "
+          f"{'gc runs':>8}")
+    with tempfile.TemporaryDirectory(prefix="prayer-portal-bench-") as root:
+        for name in names:
+            result = results[name] = run_benchmark(name, args.repeats, root)
+            print(f"{name:16} {result['wall_ms']:>10} {result['min_ms']:>10} {result['max_ms']:>10} "
+                  f"{result['peak_bytes']:>12} {result['retained_bytes']:>10} {result['collections']:>8}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as file:
+            json.dump({
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "revision": revision(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, file, indent=2)
+            file.write("\n")
+        print(f"Saved {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print(f"Compared with {args.baseline}, revision {baseline.get('revision') or 'unknown'} "
+              f"of {baseline.get('date')}, measured at revision {revision() or 'unknown'}")
+        regressions, missing = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if missing:
+            # Not compared, the baseline is older than these benchmarks: record it again
+            print(f"NOT IN BASELINE {', '.join(missing)}")
+        if regressions:
+            return 1
+        print(f"No regression against {args.baseline}" + (f", {len(missing)} not compared" if missing else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
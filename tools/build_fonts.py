@@ -0,0 +1,104 @@
+"""
+Converts the BDF fonts of the firmware to glyph atlases (``sd/glyph_atlas.py``).
+
+Only the characters the labels use are kept, as listed by ``FONT_FILES`` in
+``sd/main.py``, which is read through the simulator. Each ``<name>.bdf`` of
+``sd/fonts`` is written next to it as ``<name>.atlas``, which the firmware
+loads instead of the BDF file when present. Other fonts and character sets
+can be converted one at a time:
+
+    python tools/build_fonts.py
+    python tools/build_fonts.py sd/fonts/Helvetica-16.bdf --glyphs "0123456789:" --output /tmp/clock.atlas
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from simulator import SD, Simulator
+
+sys.path.insert(0, SD)
+
+import glyph_atlas  # noqa: E402
+
+
+def read_bdf(path, code_points=None):
+    """Returns the bounding box, ascent, descent and glyphs of a BDF file, as ``glyph_atlas.write_atlas`` takes them.
+
+    Only the glyphs of ``code_points`` are returned, all of them when None.
+    """
+    bounding_box = None
+    ascent = descent = 0
+    glyphs = []
+    glyph = None
+    rows = None
+    with open(path, "rb") as file:
+        for line in file:
+            words = line.split()
+            if not words:
+                continue
+            keyword = words[0]
+            if rows is not None:
+                if keyword == b"ENDCHAR":
+                    if glyph is not None and (code_points is None or glyph["code"] in code_points):
+                        width, height, dx, dy = glyph["bounds"]
+                        glyphs.append((glyph["code"], width, height, dx, dy, glyph["shift"][0], glyph["shift"][1],
+                                       bytes(rows)))
+                    glyph = rows = None
+                else:
+                    rows += bytes.fromhex(words[0].decode())
+            elif keyword == b"FONTBOUNDINGBOX":
+                bounding_box = tuple(int(word) for word in words[1:5])
+            elif keyword == b"FONT_ASCENT":
+                ascent = int(words[1])
+            elif keyword == b"FONT_DESCENT":
+                descent = int(words[1])
+            elif keyword == b"STARTCHAR":
+                glyph = {}
+            elif keyword == b"ENCODING":
+                glyph["code"] = int(words[1])
+            elif keyword == b"DWIDTH":
+                glyph["shift"] = (int(words[1]), int(words[2]))
+            elif keyword == b"BBX":
+                glyph["bounds"] = tuple(int(word) for word in words[1:5])
+            elif keyword == b"BITMAP":
+                rows = bytearray()
+    if bounding_box is None:
+        raise ValueError(f"{path} has no FONTBOUNDINGBOX")
+    return bounding_box, ascent, descent, glyphs
+
+
+def build(source, output, code_points):
+    bounding_box, ascent, descent, glyphs = read_bdf(source, code_points)
+    with open(output, "wb") as file:
+        glyph_atlas.write_atlas(file, bounding_box, ascent, descent, glyphs)
+    missing = sorted(set(code_points or ()) - {glyph[0] for glyph in glyphs})
+    print(f"{output}: {len(glyphs)} glyphs, {os.path.getsize(output)} bytes (BDF {os.path.getsize(source)} bytes)"
+          + (f", missing {''.join(chr(code) for code in missing)!r}" if missing else ""))
+
+
+def firmware_fonts():
+    """Returns the ``(path, glyphs)`` of ``FONT_FILES`` in ``sd/main.py``, as host paths without extension."""
+    with tempfile.TemporaryDirectory() as work_dir, Simulator(work_dir, 0) as simulator:
+        fonts = simulator.load().FONT_FILES.values()
+        return [(os.path.join(SD, path[len("/sd/"):]), glyphs) for path, glyphs in fonts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("bdf", nargs="?", help="BDF file to convert (default: the fonts of the firmware)")
+    parser.add_argument("--glyphs", help="Characters to keep (default: all of them)")
+    parser.add_argument("--output", help="Atlas file (default: the BDF file with the .atlas extension)")
+    args = parser.parse_args()
+
+    if args.bdf:
+        code_points = {ord(character) for character in args.glyphs} if args.glyphs else None
+        build(args.bdf, args.output or os.path.splitext(args.bdf)[0] + ".atlas", code_points)
+        return 0
+    for path, glyphs in firmware_fonts():
+        build(path + ".bdf", path + ".atlas", set(glyphs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
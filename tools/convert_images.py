@@ -0,0 +1,239 @@
+"""
+Converts the screen images to palette BMP files the device can hold in RAM.
+
+The images of ``sd/images`` are 32 bit BMP files: shown as an
+``OnDiskBitmap``, every region the display redraws is read back from the SD
+card, on the SPI bus shared with the ESP32, and converted pixel by pixel. Each
+image is reduced to the 16 bit colors of the display, quantized to a palette
+of ``2 ** --bits`` colors with median cut (and Floyd-Steinberg dithering) and
+written to ``sd/images/indexed`` as a 4 or 8 bit palette BMP. A 480x320
+image takes 77 KB at 4 bits, which ``sd/image_layer.py`` loads into a
+``displayio.Bitmap`` when memory allows, and reads from the SD card with an
+eighth of the bytes otherwise:
+
+    python tools/convert_images.py
+    python tools/convert_images.py sd/images/bg3.bmp --bits 8 --no-dither
+
+Pure black pixels, which the firmware shows as transparent, keep the palette
+index 0. Only the standard library is used, an image takes a few seconds.
+"""
+import argparse
+import os
+import struct
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+IMAGES = os.path.join(ROOT, "sd", "images")
+INDEXED = os.path.join(IMAGES, "indexed")
+DEFAULT_IMAGES = ("bg1", "bg2", "bg3", "bg4", "bg5", "template")
+TRANSPARENT = 0  # Palette index of the pure black pixels
+BI_RGB = 0
+BI_BITFIELDS = 3
+DITHER_STRENGTH = 0.75  # Share of the quantization error diffused, lower keeps the flat dark areas quiet
+
+
+def _mask_shift(mask):
+    """Returns the shift and the width in bits of a BMP channel mask."""
+    shift = 0
+    while mask and not mask & 1:
+        mask >>= 1
+        shift += 1
+    width = 0
+    while mask & 1:
+        mask >>= 1
+        width += 1
+    return shift, width
+
+
+def read_bmp(path):
+    """Returns the width, height and rows (top first) of ``(red, green, blue)`` tuples of a 16, 24 or 32 bit BMP."""
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:2] != b"BM":
+        raise ValueError(f"{path} is not a BMP file")
+    offset = struct.unpack_from("<I", data, 10)[0]
+    header_size, width, height, _, bits, compression = struct.unpack_from("<IiiHHI", data, 14)
+    if bits == 24 or compression not in (BI_RGB, BI_BITFIELDS):
+        masks = (0xFF0000, 0xFF00, 0xFF) if bits != 16 else (0x7C00, 0x3E0, 0x1F)
+    elif bits in (16, 32):
+        masks = struct.unpack_from("<III", data, 14 + 40)
+    else:
+        raise ValueError(f"{path}: {bits} bit BMP files are not supported")
+    if compression == BI_RGB and bits == 16:
+        masks = (0x7C00, 0x3E0, 0x1F)
+    channels = [_mask_shift(mask) for mask in masks]
+    stride = (width * bits + 31) // 32 * 4
+    pixel_format = {16: "<H", 32: "<I"}.get(bits)
+    rows = []
+    for y in range(abs(height)):
+        start = offset + y * stride
+        row = []
+        for x in range(width):
+            if bits == 24:
+                blue, green, red = data[start + 3 * x:start + 3 * x + 3]
+                row.append((red, green, blue))
+                continue
+            value = struct.unpack_from(pixel_format, data, start + x * bits // 8)[0]
+            row.append(tuple((value >> shift & (1 << size) - 1) * 255 // ((1 << size) - 1)
+                             for shift, size in channels))
+        rows.append(row)
+    if height > 0:
+        rows.reverse()  # Bottom-up
+    return width, abs(height), rows
+
+
+def to_display(color):
+    """Returns ``color`` as the display shows it, in RGB565, expanded back to 8 bit channels."""
+    red, green, blue = color
+    return (red >> 3) * 255 // 31, (green >> 2) * 255 // 63, (blue >> 3) * 255 // 31
+
+
+def median_cut(histogram, count):
+    """Returns up to ``count`` colors standing for the ``{color: pixels}`` histogram."""
+    boxes = [list(histogram.items())]
+    while len(boxes) < count:
+        # Split the box with the widest channel range, weighted by its pixels
+        best = None
+        for index, box in enumerate(boxes):
+            if len(box) < 2:
+                continue
+            pixels = sum(weight for _, weight in box)
+            for channel in range(3):
+                values = [color[channel] for color, _ in box]
+                score = (max(values) - min(values)) * pixels
+                if best is None or score > best[0]:
+                    best = (score, index, channel)
+        if best is None or best[0] == 0:
+            break
+        _, index, channel = best
+        box = sorted(boxes.pop(index), key=lambda item: item[0][channel])
+        half = sum(weight for _, weight in box) / 2
+        total = 0
+        for split, (_, weight) in enumerate(box):
+            total += weight
+            if total >= half:
+                break
+        split = min(max(split, 1), len(box) - 1)
+        boxes.append(box[:split])
+        boxes.append(box[split:])
+    palette = []
+    for box in boxes:
+        pixels = sum(weight for _, weight in box)
+        palette.append(tuple(round(sum(color[channel] * weight for color, weight in box) / pixels)
+                             for channel in range(3)))
+    return palette
+
+
+class Nearest:
+    """Finds the nearest palette color of a color, cached by display color."""
+
+    def __init__(self, palette, first=0):
+        self.palette = palette
+        self.first = first  # Palette indexes below it are never returned
+        self._cache = {}
+
+    def __call__(self, color):
+        key = to_display(color)
+        index = self._cache.get(key)
+        if index is None:
+            red, green, blue = key
+            best = None
+            for candidate in range(self.first, len(self.palette)):
+                r, g, b = self.palette[candidate]
+                distance = 2 * (red - r) ** 2 + 4 * (green - g) ** 2 + 3 * (blue - b) ** 2
+                if best is None or distance < best:
+                    best = distance
+                    index = candidate
+            self._cache[key] = index
+        return index
+
+
+def quantize(width, height, rows, bits, dither):
+    """Returns the palette and the rows of palette indexes of the image."""
+    histogram = {}
+    for row in rows:
+        for color in row:
+            if color != (0, 0, 0):
+                color = to_display(color)
+                histogram[color] = histogram.get(color, 0) + 1
+    # Index 0 is kept for pure black, made transparent by the firmware, even in images without any
+    palette = [(0, 0, 0)] + median_cut(histogram, (1 << bits) - 1)
+    nearest = Nearest(palette, TRANSPARENT + 1)
+    indexes = []
+    errors = [[0.0, 0.0, 0.0] for _ in range(width + 2)]
+    for row in rows:
+        next_errors = [[0.0, 0.0, 0.0] for _ in range(width + 2)]
+        line = bytearray(width)
+        for x, color in enumerate(row):
+            if color == (0, 0, 0):
+                line[x] = TRANSPARENT
+                continue
+            if dither:
+                error = errors[x + 1]
+                color = tuple(min(255, max(0, round(color[c] + error[c]))) for c in range(3))
+            index = nearest(color)
+            line[x] = index
+            if dither:
+                chosen = palette[index]
+                for c in range(3):
+                    difference = (color[c] - chosen[c]) * DITHER_STRENGTH
+                    errors[x + 2][c] += difference * 7 / 16
+                    next_errors[x][c] += difference * 3 / 16
+                    next_errors[x + 1][c] += difference * 5 / 16
+                    next_errors[x + 2][c] += difference / 16
+        errors = next_errors
+        indexes.append(line)
+    return palette, indexes
+
+
+def write_bmp(path, width, height, bits, palette, indexes):
+    """Writes a bottom-up 4 or 8 bit palette BMP file, with a BITMAPINFOHEADER."""
+    colors = 1 << bits
+    stride = (width * bits + 31) // 32 * 4
+    offset = 14 + 40 + colors * 4
+    size = offset + stride * height
+    with open(path, "wb") as file:
+        file.write(struct.pack("<2sIHHI", b"BM", size, 0, 0, offset))
+        file.write(struct.pack("<IiiHHIIiiII", 40, width, height, 1, bits, BI_RGB, stride * height, 2835, 2835,
+                               colors, 0))
+        for index in range(colors):
+            red, green, blue = palette[index] if index < len(palette) else (0, 0, 0)
+            file.write(bytes((blue, green, red, 0)))
+        for line in reversed(indexes):
+            if bits == 4:
+                row = bytearray((line[x] << 4 | (line[x + 1] if x + 1 < width else 0)) for x in range(0, width, 2))
+            else:
+                row = bytearray(line)
+            file.write(row + bytes(stride - len(row)))
+
+
+def convert(source, output, bits, dither):
+    width, height, rows = read_bmp(source)
+    palette, indexes = quantize(width, height, rows, bits, dither)
+    write_bmp(output, width, height, bits, palette, indexes)
+    return width, height, len(palette)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("sources", nargs="*",
+                        help="BMP files to convert (default: the backgrounds and the template)")
+    parser.add_argument("--output", default=INDEXED, help="Directory of the converted files (default: sd/images/indexed)")
+    parser.add_argument("--bits", type=int, choices=(4, 8), default=4,
+                        help="Bits per pixel, 16 or 256 colors (default: 4, 77 KB in RAM for the whole screen)")
+    parser.add_argument("--dither", action=argparse.BooleanOptionalAction, default=True,
+                        help="Diffuse the quantization error (default: on)")
+    args = parser.parse_args()
+
+    sources = args.sources or [os.path.join(IMAGES, name + ".bmp") for name in DEFAULT_IMAGES]
+    os.makedirs(args.output, exist_ok=True)
+    for source in sources:
+        output = os.path.join(args.output, os.path.basename(source))
+        width, height, colors = convert(source, output, args.bits, args.dither)
+        print(f"{os.path.basename(source)}: {width}x{height}, {colors} colors, {os.path.getsize(output)} bytes "
+              f"({os.path.getsize(source)} bytes before)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
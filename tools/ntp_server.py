@@ -0,0 +1,100 @@
+"""
+Local NTP stand-in to test the device clock sync.
+
+Answers NTP queries with the computer clock, optionally shifted and drifting,
+so that the drift estimation and the sync interval of ``sd/time_sync.py`` can
+be exercised without waiting for a real RTC to drift. Point the device at it
+with ``NTP_SERVER`` (and ``NTP_PORT``) in settings.toml:
+
+    python tools/ntp_server.py --port 12300 --offset 5 --drift-ppm 500
+    python tools/ntp_server.py --query 127.0.0.1 --port 12300
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "sd"))
+
+import time_sync  # noqa: E402
+
+
+def ntp_timestamp(seconds):
+    """Returns the 64 bit NTP timestamp of ``seconds`` since 1970."""
+    seconds += time_sync.NTP_DELTA
+    whole = int(seconds)
+    return struct.pack("!II", whole, int((seconds - whole) * (1 << 32)) & 0xFFFFFFFF)
+
+
+class Clock:
+    def __init__(self, offset, drift_ppm):
+        self.offset = offset
+        self.drift_ppm = drift_ppm
+        self.start = time.time()
+
+    def now(self):
+        now = time.time()
+        return now + self.offset + (now - self.start) * self.drift_ppm / 1000000
+
+
+def reply(request, clock, received):
+    version = (request[0] >> 3) & 0x07 or 4
+    packet = bytearray(time_sync.NTP_PACKET_SIZE)
+    packet[0] = version << 3 | 4  # Leap indicator 0, server mode
+    packet[1] = 2  # Stratum
+    packet[2] = request[2]  # Poll
+    packet[3] = 0xEC  # Precision, 2^-20 s
+    packet[12:16] = b"LOCL"
+    packet[16:24] = ntp_timestamp(received)  # Reference
+    packet[24:32] = request[40:48]  # Originate, the transmit timestamp of the request
+    packet[32:40] = ntp_timestamp(received)
+    packet[40:48] = ntp_timestamp(clock.now())
+    return packet
+
+
+def serve(host, port, clock):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind((host, port))
+        print(f"Serving NTP on {host}:{port}, offset {clock.offset} s, drift {clock.drift_ppm} ppm")
+        while True:
+            request, address = sock.recvfrom(1024)
+            received = clock.now()
+            if len(request) < time_sync.NTP_PACKET_SIZE:
+                continue
+            sock.sendto(reply(request, clock, received), address)
+            print(f"{time.strftime('%H:%M:%S')} {address[0]}:{address[1]} "
+                  f"served {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(received))} UTC")
+
+
+def query(host, port):
+    utc_ms = time_sync.ntp_time(socket, host, port=port)
+    local_ms = int(time.time() * 1000)
+    print(f"{host}:{port} {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(utc_ms // 1000))}.{utc_ms % 1000:03} UTC, "
+          f"{utc_ms - local_ms:+} ms from this computer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=time_sync.NTP_PORT,
+                        help="UDP port (default: 123, which needs root)")
+    parser.add_argument("--offset", type=float, default=0, help="Seconds added to the computer clock")
+    parser.add_argument("--drift-ppm", type=float, default=0, help="Drift of the served clock, in parts per million")
+    parser.add_argument("--query", metavar="HOST", help="Query an NTP server with the device code instead of serving")
+    args = parser.parse_args()
+
+    if args.query:
+        query(args.query, args.port)
+        return 0
+    try:
+        serve(args.host, args.port, Clock(args.offset, args.drift_ppm))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Host-side batch mode for the on-device prayer-time calculator.
+
+Computes a full year of prayer times with ``sd/prayer_calc.py`` and prints it as
+CSV, or compares it against Aladhan ``calendar`` responses captured from the
+API (one JSON file per month) and reports the deviation per prayer. The
+Aladhan payloads of ``tools/payloads`` were computed with this calculator, so
+they are refused: the comparison would prove nothing.
+
+    python tools/prayer_times_batch.py --latitude 45.5017 --longitude -73.5673 \\
+        --timezone America/Toronto --year 2026 > montreal-2026.csv
+
+    python tools/prayer_times_batch.py --latitude 45.5017 --longitude -73.5673 \\
+        --timezone America/Toronto --compare recordings/calendar-2026-*.json
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sd"))
+
+import prayer_cache  # noqa: E402
+import prayer_calc  # noqa: E402
+
+# Sample payloads computed with prayer_calc, see tools/payloads/README.md
+SYNTHETIC_PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+
+def utc_offset_minutes(date, timezone, fixed_offset):
+    """Returns the UTC offset at local noon of ``date``, in minutes."""
+    if timezone is None:
+        return fixed_offset
+    from zoneinfo import ZoneInfo
+
+    noon = datetime.datetime(date.year, date.month, date.day, 12, tzinfo=ZoneInfo(timezone))
+    return int(noon.utcoffset().total_seconds() // 60)
+
+
+def compute_day(date, args):
+    number = prayer_cache.day_number(date.year, date.month, date.day)
+    offset = utc_offset_minutes(date, args.timezone, args.utc_offset)
+    return prayer_calc.compute_times(number, args.latitude, args.longitude, offset,
+                                     method=args.method, school=args.school, elevation=args.elevation)
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02}:{minutes % 60:02}"
+
+
+def write_year(args):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(("date",) + prayer_cache.FIELDS)
+    date = datetime.date(args.year, 1, 1)
+    while date.year == args.year:
+        writer.writerow([date.isoformat()] + [format_minutes(m) for m in compute_day(date, args)])
+        date += datetime.timedelta(days=1)
+
+
+def compare(args):
+    """Compares computed times with Aladhan calendar responses captured from the API."""
+    worst = {name: (0, None) for name in prayer_cache.FIELDS}
+    total = {name: 0 for name in prayer_cache.FIELDS}
+    days = 0
+    for path in args.compare:
+        with open(path) as file:
+            response = json.load(file)
+        for day in response["data"]:
+            gregorian = day["date"]["gregorian"]
+            date = datetime.date(int(gregorian["year"]), int(gregorian["month"]["number"]), int(gregorian["day"]))
+            computed = compute_day(date, args)
+            expected = prayer_cache.record_from_api_day(day)
+            for i, name in enumerate(prayer_cache.FIELDS):
+                diff = abs(computed[i] - expected[i])
+                diff = min(diff, 1440 - diff)
+                total[name] += diff
+                if diff > worst[name][0]:
+                    worst[name] = (diff, date)
+            days += 1
+
+    if not days:
+        print("No days found in the Aladhan responses", file=sys.stderr)
+        return 1
+    print(f"{days} days compared")
+    print(f"{'prayer':<8} {'mean':>6} {'max':>4}  worst day")
+    failed = False
+    for name in prayer_cache.FIELDS:
+        diff, date = worst[name]
+        print(f"{name:<8} {total[name] / days:6.2f} {diff:4}  {date or '-'}")
+        failed = failed or diff > args.tolerance
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--latitude", type=float, required=True)
+    parser.add_argument("--longitude", type=float, required=True)
+    parser.add_argument("--method", type=int, default=2, choices=sorted(prayer_calc.METHODS),
+                        help="Aladhan calculation method id (default: 2)")
+    parser.add_argument("--school", type=int, default=0, choices=(0, 1), help="Asr school, 0 Shafi, 1 Hanafi")
+    parser.add_argument("--elevation", type=float, default=0, help="Elevation in meters")
+    parser.add_argument("--timezone", help="IANA timezone, takes DST into account")
+    parser.add_argument("--utc-offset", type=int, default=0, help="Fixed UTC offset in minutes, without --timezone")
+    parser.add_argument("--year", type=int, default=datetime.date.today().year)
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="Aladhan calendar responses captured from the API to compare against")
+    parser.add_argument("--tolerance", type=int, default=2,
+                        help="Maximum deviation in minutes before --compare fails (default: 2)")
+    args = parser.parse_args()
+
+    if args.compare:
+        synthetic = [path for path in args.compare
+                     if os.path.dirname(os.path.realpath(path)) == os.path.realpath(SYNTHETIC_PAYLOADS)]
+        if synthetic:
+            parser.error(f"{', '.join(synthetic)} were computed with this calculator, not captured from Aladhan, "
+                         f"see tools/payloads/README.md")
+        return compare(args)
+    write_year(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
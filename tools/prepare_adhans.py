@@ -0,0 +1,168 @@
+"""
+Prepares adhan recordings for the device: mono, resampled, trimmed and normalized PCM WAV files.
+
+The firmware streams the adhans from the SD card with ``audiocore.WaveFile``,
+so a 44.1 kHz stereo recording costs four times the SD card reads of a 22 kHz
+mono one for no audible gain on the PyPortal speaker. Each input WAV file
+(PCM, 8 to 32 bits, any rate and channel count) is mixed down to mono,
+stripped of the silence at both ends, normalized to ``--peak`` dBFS and
+resampled to ``--rate`` with ``--bits`` per sample, then written to
+``--output`` with a ``manifest.json`` listing the duration and format of
+every file:
+
+    python tools/prepare_adhans.py ~/adhans/*.wav
+    python tools/prepare_adhans.py ~/adhans/Fajr.wav --rate 16000 --bits 8 --output /tmp/adhans
+
+Only the standard library is used, a three minute recording takes under a
+minute. Compressed recordings are converted to WAV first, e.g. with
+``ffmpeg -i adhan.mp3 adhan.wav``.
+"""
+import argparse
+import array
+import json
+import math
+import os
+import sys
+import wave
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+ADHANS = os.path.join(ROOT, "sd", "adhans")
+MANIFEST = "manifest.json"
+RATES = (16000, 22050)
+FULL_SCALE = 32767
+
+
+def read_wav(path):
+    """Returns the sample rate and the samples of ``path`` mixed down to mono, as 16 bit integers."""
+    with wave.open(path, "rb") as file:
+        channels = file.getnchannels()
+        width = file.getsampwidth()
+        rate = file.getframerate()
+        data = file.readframes(file.getnframes())
+    if width == 1:
+        samples = array.array("h", ((value - 128) << 8 for value in data))
+    elif width == 2:
+        samples = array.array("h", data)
+    elif width == 3:
+        # The two most significant bytes of each sample
+        top = bytearray(len(data) // 3 * 2)
+        top[0::2] = data[1::3]
+        top[1::2] = data[2::3]
+        samples = array.array("h", top)
+    elif width == 4:
+        samples = array.array("h", (value >> 16 for value in array.array("i", data)))
+    else:
+        raise ValueError(f"{path}: {width * 8} bit samples are not supported")
+    if width > 1 and sys.byteorder == "big":
+        samples.byteswap()
+    if channels > 1:
+        samples = array.array("h", (sum(frame) // channels for frame in
+                                    zip(*(samples[channel::channels] for channel in range(channels)))))
+    return rate, samples
+
+
+def trim(samples, threshold, pad):
+    """Returns ``samples`` without the leading and trailing samples below ``threshold``, keeping ``pad`` of them."""
+    start = 0
+    while start < len(samples) and abs(samples[start]) < threshold:
+        start += 1
+    end = len(samples)
+    while end > start and abs(samples[end - 1]) < threshold:
+        end -= 1
+    return samples[max(0, start - pad):min(len(samples), end + pad)], start, len(samples) - end
+
+
+def resample(samples, rate, new_rate):
+    """Resamples to ``new_rate``: area averaging when downsampling, which filters what would alias, else linear."""
+    if rate == new_rate:
+        return samples
+    step = rate / new_rate
+    count = int(len(samples) / step)
+    if step > 1:
+        result = array.array("h", bytes(2 * count))
+        for index in range(count):
+            start = int(index * step)
+            end = max(start + 1, int((index + 1) * step))
+            window = samples[start:end]
+            result[index] = sum(window) // len(window)
+        return result
+    last = len(samples) - 1
+    result = array.array("h", bytes(2 * count))
+    for index in range(count):
+        position = index * step
+        before = int(position)
+        after = min(before + 1, last)
+        result[index] = int(samples[before] + (samples[after] - samples[before]) * (position - before))
+    return result
+
+
+def encode(samples, gain, bits):
+    """Returns the frames of ``samples`` scaled by ``gain``, as unsigned 8 bit or signed 16 bit little endian PCM."""
+    if bits == 8:
+        return bytes(min(255, max(0, round(value * gain / 256) + 128)) for value in samples)
+    scaled = array.array("h", (min(FULL_SCALE, max(-FULL_SCALE, round(value * gain))) for value in samples))
+    if sys.byteorder == "big":
+        scaled.byteswap()
+    return scaled.tobytes()
+
+
+def prepare(source, output, rate, bits, peak_db, threshold_db, pad):
+    """Writes the prepared ``source`` to ``output`` and returns its manifest entry."""
+    source_rate, samples = read_wav(source)
+    threshold = FULL_SCALE * 10 ** (threshold_db / 20)
+    samples, leading, trailing = trim(samples, threshold, int(pad * source_rate))
+    if not samples:
+        raise ValueError(f"{source} is silent below {threshold_db} dBFS")
+    samples = resample(samples, source_rate, rate)
+    peak = max(max(samples), -min(samples), 1)
+    gain = FULL_SCALE * 10 ** (peak_db / 20) / peak
+    with wave.open(output, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(bits // 8)
+        file.setframerate(rate)
+        file.writeframes(encode(samples, gain, bits))
+    return {
+        "duration": round(len(samples) / rate, 2),
+        "sample_rate": rate,
+        "bits": bits,
+        "bytes": os.path.getsize(output),
+        "gain_db": round(20 * math.log10(gain), 1),
+        "trimmed": [round(leading / source_rate, 2), round(trailing / source_rate, 2)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("sources", nargs="+", help="WAV files to prepare, written under the same names")
+    parser.add_argument("--output", default=ADHANS, help="Directory of the prepared files (default: sd/adhans)")
+    parser.add_argument("--rate", type=int, choices=RATES, default=22050, help="Sample rate in Hz (default: 22050)")
+    parser.add_argument("--bits", type=int, choices=(8, 16), default=16, help="Bits per sample (default: 16)")
+    parser.add_argument("--peak", type=float, default=-1.0, help="Peak level in dBFS after normalizing (default: -1)")
+    parser.add_argument("--threshold", type=float, default=-45.0,
+                        help="Level in dBFS below which the ends are trimmed as silence (default: -45)")
+    parser.add_argument("--pad", type=float, default=0.2, help="Seconds of silence kept at both ends (default: 0.2)")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, MANIFEST)
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    for source in args.sources:
+        name = os.path.splitext(os.path.basename(source))[0] + ".wav"
+        entry = prepare(source, os.path.join(args.output, name), args.rate, args.bits, args.peak, args.threshold,
+                        args.pad)
+        manifest[name] = entry
+        print(f"{name}: {entry['duration']} s, {entry['sample_rate']} Hz {entry['bits']} bit, {entry['bytes']} bytes, "
+              f"{entry['gain_db']:+} dB, trimmed {entry['trimmed'][0]} s + {entry['trimmed'][1]} s "
+              f"({os.path.getsize(source)} bytes before)")
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Schedule hub serving the time, the location and the prayer times to the devices of a LAN.
+
+Every device otherwise looks its location up on ip-api.com, fetches (or
+cross-checks) its prayer times on Aladhan over TLS and syncs its clock on the
+internet. With ``HUB_URL`` set to the address of the hub in settings.toml, the
+devices ask the hub first, over plain HTTP, and only fall back to the public
+APIs when it does not answer:
+
+- ``/time``: the UTC time in milliseconds, as text
+- ``/location``: the location of the hub, as JSON with the ip-api.com fields
+- ``/prayers/<year>/<month>?latitude=...``: a month of prayer times in the
+  binary layout of ``sd/prayer_cache.py``, about 400 bytes, computed with the
+  on-device calculator or fetched from Aladhan with ``source=api``
+
+Each location lookup and month is fetched or computed once and kept in memory,
+however many devices ask for it:
+
+    python tools/schedule_hub.py --port 8080
+    python tools/schedule_hub.py --latitude 45.5017 --longitude -73.5673 --timezone America/Toronto \\
+        --city Montreal --country Canada
+    python tools/schedule_hub.py --check http://127.0.0.1:8080
+"""
+import argparse
+import datetime
+import functools
+import json
+import os
+import struct
+import sys
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sd"))
+
+import prayer_cache  # noqa: E402
+import prayer_calc  # noqa: E402
+import timezone  # noqa: E402
+
+IP_API_URL = "http://ip-api.com/json/?fields=status,message,query,country,city,lat,lon,offset,timezone"
+ALADHAN_URL = "https://api.aladhan.com/v1/calendar/{year}/{month}?latitude={latitude}&longitude={longitude}" \
+              "&method={method}&school={school}"
+CONTENT_TYPES = {bytes: "application/octet-stream", str: "text/plain", dict: "application/json"}
+
+
+class HubError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def fetch_json(url, timeout=30):
+    """Returns the decoded JSON body of ``url``."""
+    request = urllib.request.Request(url, headers={"User-Agent": "PrayerPortal schedule hub"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def current_offset(name, utc):
+    """Returns the UTC offset in seconds of the IANA time zone ``name`` at ``utc``."""
+    from zoneinfo import ZoneInfo
+
+    moment = datetime.datetime.fromtimestamp(utc, tz=ZoneInfo(name))
+    return int(moment.utcoffset().total_seconds())
+
+
+class Hub:
+    def __init__(self, location=None, location_ttl=86400, fetch=fetch_json, clock=time.time):
+        self.fixed_location = location  # ip-api.com fields, or None to look the location up
+        self.location_ttl = location_ttl  # Seconds before the location is looked up again
+        self.fetch = fetch  # Returns the decoded JSON of a URL, see fetch_json
+        self.clock = clock  # Returns the UTC seconds
+        self._location = None
+        self._location_fetched = None
+
+    def location(self):
+        """Returns the location served, looked up again once it is ``location_ttl`` seconds old."""
+        now = self.clock()
+        if self.fixed_location is not None:
+            location = dict(self.fixed_location)
+            if location.get("timezone"):
+                location["offset"] = current_offset(location["timezone"], now)
+            return location
+        if self._location is None or now - self._location_fetched >= self.location_ttl:
+            try:
+                location = self.fetch(IP_API_URL)
+            except Exception as e:
+                if self._location is None:
+                    raise HubError(502, f"Location lookup failed: {e}")
+                return self._location  # Served stale until the lookup works again
+            if location.get("status") != "success":
+                raise HubError(502, f"Location lookup failed: {location.get('message')}")
+            self._location = location
+            self._location_fetched = now
+            print(f"Location: {location['city']}, {location['country']} ({location['lat']}, {location['lon']})")
+        return self._location
+
+    @functools.lru_cache(maxsize=256)
+    def prayers(self, year, month, latitude, longitude, method, school, offset, dst, dst_minutes, source, zone_name):
+        """Returns a month of prayer times as the bytes of a prayer_cache file, computed or fetched once."""
+        if not 1 <= month <= 12 or not 2000 <= year < 2100:
+            raise HubError(400, f"No prayer times for {year}-{month:02}")
+        first_day = prayer_cache.day_number(year, month, 1)
+        zone = timezone.TimeZone(offset, dst, dst_minutes)
+        if source == "api":
+            url = ALADHAN_URL.format(year=year, month=month, latitude=latitude, longitude=longitude, method=method,
+                                     school=school)
+            if zone_name:
+                url += f"&timezonestring={urllib.parse.quote(zone_name)}"
+            try:
+                records = [prayer_cache.record_from_api_day(day) for day in self.fetch(url)["data"]]
+            except Exception as e:
+                raise HubError(502, f"Aladhan request failed: {e}")
+        else:
+            records = [prayer_calc.compute_times(number, latitude, longitude, zone.day_offset(number),
+                                                 method=method, school=school)
+                       for number in range(first_day, first_day + prayer_cache.days_in_month(year, month))]
+        # The key the device caches the records under, see get_prayer_cache_key in sd/main.py
+        key = f"{school},{zone.key},{latitude:.3f},{longitude:.3f}"
+        return prayer_cache.pack_header(first_day, len(records), method, key) + b"".join(
+            struct.pack(prayer_cache.RECORD_FORMAT, *record) for record in records)
+
+    def handle(self, path):
+        """Returns the status and body of the GET request of ``path``: bytes, text or a dict sent as JSON."""
+        url = urllib.parse.urlsplit(path)
+        route = url.path.strip("/").split("/")
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        try:
+            if route == ["time"]:
+                return 200, str(int(self.clock() * 1000))
+            if route == ["location"]:
+                return 200, self.location()
+            if len(route) == 3 and route[0] == "prayers":
+                return 200, self.prayers(int(route[1]), int(route[2]), float(query["latitude"]),
+                                         float(query["longitude"]), int(query.get("method", 2)),
+                                         int(query.get("school", 0)), int(query.get("offset", 0)),
+                                         query.get("dst", ""), int(query.get("dst_minutes", 60)),
+                                         query.get("source", "local"), query.get("timezone", ""))
+            return 404, {"status": "fail", "message": f"No such resource {url.path}"}
+        except HubError as e:
+            return e.status, {"status": "fail", "message": str(e)}
+        except (KeyError, ValueError) as e:
+            return 400, {"status": "fail", "message": f"Invalid request: {e}"}
+
+
+def encode(body):
+    """Returns the content type and bytes of a body returned by ``Hub.handle``."""
+    content_type = CONTENT_TYPES[type(body)]
+    if isinstance(body, dict):
+        body = json.dumps(body, separators=(",", ":"))
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return content_type, body
+
+
+def handler(hub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keeps the connection alive between the requests of a device
+
+        def do_GET(self):  # noqa: N802
+            status, body = hub.handle(self.path)
+            content_type, body = encode(body)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            print(f"{time.strftime('%H:%M:%S')} {self.client_address[0]} {format % args}")
+
+    return Handler
+
+
+def serve(host, port, hub):
+    with ThreadingHTTPServer((host, port), handler(hub)) as server:
+        print(f"Serving the schedule hub on http://{host}:{port}")
+        server.serve_forever()
+
+
+def check(url):
+    """Queries a hub like a device would and prints what it serves."""
+    url = url.rstrip("/")
+    with urllib.request.urlopen(url + "/time", timeout=10) as response:
+        utc_ms = int(response.read())
+    print(f"Time: {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(utc_ms // 1000))} UTC, "
+          f"{utc_ms - int(time.time() * 1000):+} ms from this computer")
+    location = fetch_json(url + "/location", timeout=10)
+    print(f"Location: {location['city']}, {location['country']} ({location['lat']}, {location['lon']}), "
+          f"{location['timezone']} UTC{location['offset'] // 60:+} min, public IP {location['query']}")
+    today = datetime.date.today()
+    query = urllib.parse.urlencode({"latitude": location["lat"], "longitude": location["lon"],
+                                    "offset": location["offset"] // 60, "timezone": location["timezone"]})
+    with urllib.request.urlopen(f"{url}/prayers/{today.year}/{today.month}?{query}", timeout=30) as response:
+        data = response.read()
+    first_day, method, key, records = prayer_cache.unpack_records(data)
+    index = prayer_cache.day_number(today.year, today.month, today.day) - first_day
+    times = " ".join(f"{name} {minutes // 60:02}:{minutes % 60:02}"
+                     for name, minutes in zip(prayer_cache.FIELDS, records[index]))
+    print(f"Prayer times: {len(records)} days in {len(data)} bytes, method {method}, key {key.decode()}, "
+          f"today {times}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8080, help="TCP port (default: 8080)")
+    parser.add_argument("--latitude", type=float, help="Latitude served instead of the one of the public IP address")
+    parser.add_argument("--longitude", type=float)
+    parser.add_argument("--timezone", help="IANA time zone of --latitude and --longitude, e.g. America/Toronto")
+    parser.add_argument("--city", default="")
+    parser.add_argument("--country", default="")
+    parser.add_argument("--location-ttl", type=int, default=86400,
+                        help="Seconds before the location of the public IP address is looked up again")
+    parser.add_argument("--check", metavar="URL", help="Query a hub like a device would instead of serving")
+    args = parser.parse_args()
+
+    if args.check:
+        check(args.check)
+        return 0
+    location = None
+    if args.latitude is not None or args.longitude is not None:
+        if args.latitude is None or args.longitude is None or not args.timezone:
+            parser.error("--latitude needs --longitude and --timezone")
+        location = {"status": "success", "query": "", "country": args.country, "city": args.city,
+                    "lat": args.latitude, "lon": args.longitude, "timezone": args.timezone}
+    try:
+        serve(args.host, args.port, Hub(location, location_ttl=args.location_ttl))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Runs the firmware on this computer, in the simulator of ``tools/simulator``.
+
+The firmware boots against sample API responses, then runs its main loop in
+virtual time until the end of the simulation, which takes seconds for a day.
+The screen is saved as a PNG at the end, and optionally after every N display
+refreshes. The device files (log, prayer times cache, telemetry) are written to
+the work directory:
+
+    python tools/simulate.py --days 2 --work-dir /tmp/portal
+    python tools/simulate.py --start 2026-10-16T09:30:00 --days 0.1 --set PRAYER_SOURCE=api --snapshot-every 10
+    python tools/simulate.py --days 1 --hub
+    python tools/simulate.py --start 2026-10-16T09:45:00 --days 0.01 --tap 2026-10-16T09:46:10@240,160
+
+With ``--warm``, the run restarts where the previous one in the work directory
+stopped, as after a crash or a watchdog reset: the RTC kept running and the
+NVM holds the checkpoint of the firmware.
+"""
+import argparse
+import calendar
+import os
+import sys
+import tempfile
+import time
+import tomllib
+
+from simulator import SETTINGS, Simulator, restart_clocks
+from simulator.clock import RTC_UNSET
+from simulator.hardware import ResetReason
+
+HUB_HOST = "hub.lan"
+
+
+def parse_start(text):
+    """Returns the UTC seconds of an ISO date and time, such as 2026-10-16T09:30:00."""
+    return calendar.timegm(time.strptime(text, "%Y-%m-%dT%H:%M:%S"))
+
+
+def parse_tap(text):
+    """Returns the (UTC seconds, x, y) of TIME@X,Y, such as 2026-10-16T09:47:00@240,100."""
+    at, _, point = text.partition("@")
+    x, y = point.split(",")
+    return parse_start(at), int(x), int(y)
+
+
+def parse_setting(text):
+    """Returns the (key, value) of KEY=VALUE, VALUE being a TOML value or else a string."""
+    key, _, value = text.partition("=")
+    try:
+        return key, tomllib.loads(f"value = {value}")["value"]
+    except tomllib.TOMLDecodeError:
+        return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--start", type=parse_start,
+                        help="True UTC time at power on, e.g. 2026-10-16T09:30:00 (default: now, or the end of the "
+                             "previous run with --warm)")
+    parser.add_argument("--days", type=float, default=1, help="Days to simulate (default: 1)")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="Virtual seconds per real second, to watch the screen (default: 0, as fast as possible)")
+    parser.add_argument("--drift-ppm", type=float, default=0, help="RTC drift, in parts per million")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per network exchange (default: 0.05)")
+    parser.add_argument("--offline", action="store_true", help="Run without network")
+    parser.add_argument("--tap", type=parse_tap, action="append", default=[], metavar="TIME@X,Y",
+                        help="Tap the touchscreen at TIME, such as 2026-10-16T09:47:00@240,100")
+    parser.add_argument("--hub", action="store_true",
+                        help="Add a schedule hub on the LAN (tools/schedule_hub.py) and point HUB_URL at it")
+    parser.add_argument("--settings", default=SETTINGS, help="settings.toml to read (default: CIRCUITPY/settings.toml)")
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], metavar="KEY=VALUE",
+                        help="Setting overriding settings.toml, may be repeated")
+    parser.add_argument("--work-dir", help="Directory holding the device files (default: a new temporary directory)")
+    parser.add_argument("--cold", action="store_true", help="Remove the cache and logs of a previous run first")
+    parser.add_argument("--warm", action="store_true",
+                        help="Restart after the previous run in the work directory, with the RTC still running")
+    parser.add_argument("--trace-memory", action="store_true", help="Report mem_free from tracemalloc, slower")
+    parser.add_argument("--snapshot-every", type=int, default=0, metavar="N",
+                        help="Save the screen every N display refreshes")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="prayer-portal-")
+    start, rtc_start, reset_reason = args.start, RTC_UNSET, ResetReason.POWER_ON
+    if args.warm:
+        clocks = restart_clocks(work_dir, start)
+        if clocks is None:
+            parser.error(f"No previous run in {work_dir} to restart after")
+        start, rtc_start = clocks
+        reset_reason = ResetReason.WATCHDOG
+    if start is None:
+        start = int(time.time())
+    if args.hub:
+        args.set.append(("HUB_URL", f"http://{HUB_HOST}:8080"))
+    simulator = Simulator(work_dir, start, days=args.days, speed=args.speed, drift_ppm=args.drift_ppm,
+                          settings=args.settings, overrides=dict(args.set), latency=args.latency,
+                          rtc_start=rtc_start, trace_memory=args.trace_memory, reset_reason=reset_reason,
+                          taps=args.tap)
+    if args.cold:
+        simulator.filesystem.clear()
+    simulator.internet.down = args.offline
+    if args.hub:
+        simulator.internet.add_hub(HUB_HOST)
+
+    started = time.perf_counter()
+    with simulator:
+        if args.snapshot_every:
+            def snapshot(display):
+                if display.refreshes % args.snapshot_every == 0:
+                    display.save_png(os.path.join(work_dir, f"screen-{display.refreshes:05}.png"))
+            simulator.display.on_refresh = snapshot
+        try:
+            simulator.run()
+        finally:
+            elapsed = time.perf_counter() - started
+            screen = os.path.join(work_dir, "screen.png")
+            simulator.display.save_png(screen)
+            print(f"Simulated {simulator.clock.monotonic() / 3600:.1f} h in {elapsed:.1f} s, "
+                  f"{simulator.display.refreshes} refreshes, {simulator.clock.sleeps} sleeps, "
+                  f"{simulator.light_sleeps} light sleeps")
+            if simulator.radio is not None:
+                radio = simulator.radio
+                print(f"Radio: {radio.connects} connections, {radio.associated_seconds:.1f} s connected, "
+                      f"{radio.resets} resets")
+            if simulator.watchdog.mode is not None:
+                print(f"Watchdog: {simulator.watchdog.timeout} s, longest interval between feeds "
+                      f"{simulator.watchdog.longest:.1f} s, {simulator.watchdog.late} late feeds")
+            for host, path, status in simulator.internet.requests:
+                print(f"HTTP {status} {host}{path}")
+            for utc, source, message in simulator.events:
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(utc))} UTC {source}: {message}")
+            print(f"Screen: {screen}")
+            print(f"Logs: {os.path.join(work_dir, 'sd', 'logs')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
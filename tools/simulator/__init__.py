@@ -0,0 +1,192 @@
+"""
+Host-side simulator of the PyPortal Titano, to run the firmware on a computer.
+
+The firmware modules of ``sd`` run unmodified on CPython, with the CircuitPython
+hardware modules replaced by stand-ins (see ``hardware.py`` and
+``network.py``), a virtual clock (``clock.py``), the device file system mapped
+into a work directory (``filesystem.py``) and a framebuffer display rendering
+to PNG (``display.py``). The Adafruit libraries are the CPython builds
+installed with pip (``adafruit-blinka-displayio`` for ``displayio``)::
+
+    with Simulator("/tmp/portal", start=time.time(), days=2) as simulator:
+        simulator.run()
+        simulator.display.save_png("/tmp/portal/screen.png")
+
+``os.getenv`` reads ``settings.toml`` (with ``overrides`` on top), as on the
+device. The firmware modules are imported fresh for each simulator, so runs
+do not share state, except through the work directory: the SD card, the NVM
+(``nvm.bin``) and the clocks at the end of the run (``device.json``), from
+which ``restart_clocks`` continues as after a reset that kept the RTC running.
+"""
+import gc
+import json
+import os
+import sys
+import tomllib
+
+from . import hardware, network
+from .clock import RTC_UNSET, SimulationEnd, VirtualClock
+from .filesystem import DeviceFilesystem
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+SD = os.path.join(ROOT, "sd")
+SETTINGS = os.path.join(ROOT, "CIRCUITPY", "settings.toml")
+HEAP_SIZE = 192 * 1024  # Heap of CircuitPython on the SAMD51J20 of the PyPortal Titano
+NVM_SIZE = 8192
+ADHAN_SECONDS = 180  # Length of the silent adhans created for the files missing from the repository
+
+
+def read_settings(path):
+    with open(path, "rb") as file:
+        return tomllib.load(file)
+
+
+def restart_clocks(work_dir, start=None):
+    """Returns the ``(start, rtc_start)`` of a restart after the run saved in ``work_dir``, the RTC still running.
+
+    ``start`` is the true UTC time of the restart, by default the end of the
+    saved run. Returns None if no run was saved.
+    """
+    try:
+        with open(os.path.join(work_dir, "device.json")) as file:
+            saved = json.load(file)
+    except OSError:
+        return None
+    if start is None:
+        start = int(saved["utc"])
+    return start, saved["rtc"] + start - int(saved["utc"])
+
+
+class Simulator:
+    def __init__(self, work_dir, start, days=None, speed=0, drift_ppm=0, settings=SETTINGS, overrides=None,
+                 latency=0.05, rtc_start=RTC_UNSET, trace_memory=False, reset_reason=hardware.ResetReason.POWER_ON,
+                 taps=()):
+        self.work_dir = work_dir
+        self.clock = VirtualClock(start, None if days is None else start + int(days * 86400), speed=speed,
+                                  drift_ppm=drift_ppm, rtc_start=rtc_start)
+        self.internet = network.Internet(self.clock, latency=latency, log=self.log)
+        self.filesystem = DeviceFilesystem(work_dir, SD)
+        self.settings = read_settings(settings) if settings else {}
+        self.settings.update(overrides or {})
+        self.taps = list(taps)  # (true UTC seconds, x, y) of the touchscreen presses
+        self.trace_memory = trace_memory  # Measure mem_free with tracemalloc, slower
+        self.reset_reason = reset_reason
+        self.nvm = bytearray(NVM_SIZE)
+        self.watchdog = hardware.WatchDogTimer(self)
+        self.display = None
+        self.events = []  # (true UTC seconds, source, message) of the hardware events
+        self.light_sleeps = 0
+        self.main = None
+        self._saved_modules = {}
+        self._patched = {}
+
+    @property
+    def radio(self):
+        """The ESP_SPIcontrol stand-in created by the firmware, or None."""
+        return getattr(self.main, "esp", None)
+
+    def log(self, source, message):
+        self.events.append((self.clock.now(), source, message))
+
+    def getenv(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def mem_free(self):
+        if self.trace_memory:
+            import tracemalloc
+            return max(0, HEAP_SIZE - tracemalloc.get_traced_memory()[0])
+        return HEAP_SIZE
+
+    def mem_alloc(self):
+        return HEAP_SIZE - self.mem_free()
+
+    def __enter__(self):
+        try:
+            with open(os.path.join(self.work_dir, "nvm.bin"), "rb") as file:
+                file.readinto(self.nvm)
+        except OSError:
+            pass  # Blank NVM
+        modules = hardware.install(self)
+        modules.update(network.modules(self.internet))
+        for name, module in modules.items():
+            self._saved_modules[name] = sys.modules.get(name)
+            sys.modules[name] = module
+        from .display import FramebufferDisplay
+        self.display = FramebufferDisplay()
+        modules["board"].DISPLAY = self.display
+
+        self._patch(os, "getenv", self.getenv)
+        self._patch(gc, "mem_free", self.mem_free)
+        self._patch(gc, "mem_alloc", self.mem_alloc)
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+        self.clock.patch()
+        self.filesystem.patch()
+        sys.path.insert(0, SD)
+        self._firmware_modules = set(sys.modules)
+        return self
+
+    def __exit__(self, *args):
+        # Handlers write what they buffered to the device files
+        from adafruit_logging import getLogger
+        logger = getLogger("PrayerPortal")
+        for handler in list(logger._handlers):
+            handler.close()
+            logger.removeHandler(handler)
+        self.filesystem.restore()
+        os.makedirs(self.work_dir, exist_ok=True)
+        with open(os.path.join(self.work_dir, "nvm.bin"), "wb") as file:
+            file.write(self.nvm)
+        with open(os.path.join(self.work_dir, "device.json"), "w") as file:
+            json.dump({"utc": self.clock.now(), "rtc": self.clock.rtc_time()}, file)
+        self.clock.restore()
+        for (module, name), value in self._patched.items():
+            if value is None:
+                delattr(module, name)
+            else:
+                setattr(module, name, value)
+        self._patched = {}
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.stop()
+        sys.path.remove(SD)
+        # Forget the firmware and the state the libraries keep across imports
+        for name in set(sys.modules) - self._firmware_modules:
+            if getattr(sys.modules[name], "__file__", None) and os.path.abspath(sys.modules[name].__file__).startswith(
+                    os.path.abspath(SD)):
+                del sys.modules[name]
+        for name, module in self._saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        self._saved_modules = {}
+        import adafruit_connection_manager
+        for pool in list(adafruit_connection_manager._global_connection_managers):
+            adafruit_connection_manager.connection_manager_close_all(pool, release_references=True)
+        return False
+
+    def _patch(self, module, name, value):
+        self._patched[(module, name)] = getattr(module, name, None)
+        setattr(module, name, value)
+
+    def load(self):
+        """Imports the firmware and creates the adhan files it plays, returns the ``main`` module."""
+        if self.main is None:
+            import main
+            self.main = main
+            for adhan in main.ADHANS.values():
+                self.filesystem.add_silent_wav(adhan["file"], ADHAN_SECONDS)
+        return self.main
+
+    def run(self):
+        """Runs the firmware until the end of the simulation, errors of the firmware are raised."""
+        main = self.load()
+        try:
+            main.run()
+        except SimulationEnd:
+            pass
+
+
+__all__ = ["Simulator", "SimulationEnd", "VirtualClock", "read_settings", "restart_clocks"]
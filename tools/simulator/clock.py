@@ -0,0 +1,111 @@
+"""
+Virtual time of the simulated device.
+
+The simulation keeps two clocks: the true UTC time, served by the fake NTP and
+HTTP servers, and the device RTC, which starts unset (2000-01-01, like after a
+power loss), can drift, and is only corrected when the firmware sets it.
+Time only advances when the firmware sleeps, so a simulated week runs as fast
+as the code between sleeps, and every run is reproducible. With ``speed``, the
+sleeps also take ``delay / speed`` seconds of real time.
+
+``patch()`` points the functions of the ``time`` module at the virtual clock,
+with CircuitPython semantics: ``time.time()`` returns whole RTC seconds and
+``time.localtime()`` has no time zone.
+"""
+import calendar
+import time
+
+NS_PER_SECOND = 1000000000
+RTC_UNSET = 946684800  # 2000-01-01T00:00:00, what the RTC reads after a power loss
+
+_real_sleep = time.sleep
+
+
+class SimulationEnd(BaseException):
+    """Raised from a sleep that would go past the end of the simulation.
+
+    It derives from BaseException so that the ``except Exception`` blocks of
+    the firmware do not catch it.
+    """
+
+
+class VirtualClock:
+    def __init__(self, start, end=None, speed=0, drift_ppm=0, rtc_start=RTC_UNSET):
+        self.start = start  # True UTC seconds at the start of the simulation
+        self.end = end  # True UTC seconds where the simulation stops, None to run forever
+        self.speed = speed  # Virtual seconds per real second while sleeping, 0 to not wait at all
+        self.drift_ppm = drift_ppm  # RTC drift, positive when the RTC runs fast
+        self.elapsed_ns = 0
+        self.sleeps = 0
+        self._rtc_base_ns = rtc_start * NS_PER_SECOND
+        self._patched = {}
+
+    # True time
+    def now(self):
+        """Returns the true UTC time in seconds, as a float."""
+        return self.start + self.elapsed_ns / NS_PER_SECOND
+
+    def monotonic_ns(self):
+        return self.elapsed_ns
+
+    def monotonic(self):
+        return self.elapsed_ns / NS_PER_SECOND
+
+    def ticks_ms(self):
+        """``supervisor.ticks_ms``, which wraps around at 2**29."""
+        return self.elapsed_ns // 1000000 & ((1 << 29) - 1)
+
+    def sleep(self, seconds):
+        if seconds < 0:
+            raise ValueError("sleep length must be non-negative")
+        delay_ns = int(seconds * NS_PER_SECOND)
+        if self.end is not None and self.start * NS_PER_SECOND + self.elapsed_ns + delay_ns > self.end * NS_PER_SECOND:
+            self.elapsed_ns = (self.end - self.start) * NS_PER_SECOND
+            raise SimulationEnd()
+        if self.speed:
+            _real_sleep(seconds / self.speed)
+        self.elapsed_ns += delay_ns
+        self.sleeps += 1
+
+    def advance(self, seconds):
+        """Moves time forward without going through the firmware, e.g. to skip to an event."""
+        self.sleep(seconds)
+
+    # Device RTC
+    def rtc_ns(self):
+        return self._rtc_base_ns + self.elapsed_ns + int(self.elapsed_ns * self.drift_ppm) // 1000000
+
+    def rtc_time(self):
+        """``time.time()`` on the device: whole RTC seconds."""
+        return self.rtc_ns() // NS_PER_SECOND
+
+    def set_rtc(self, seconds):
+        """Sets the RTC, as ``rtc.RTC().datetime = ...`` does, ``seconds`` being a struct_time or seconds."""
+        if isinstance(seconds, (tuple, time.struct_time)):
+            seconds = calendar.timegm(seconds)
+        self._rtc_base_ns += seconds * NS_PER_SECOND - self.rtc_ns()
+
+    def localtime(self, seconds=None):
+        return time.gmtime(self.rtc_time() if seconds is None else seconds)
+
+    def mktime(self, struct):
+        return calendar.timegm(struct)
+
+    def patch(self):
+        """Replaces the functions of the ``time`` module, until ``restore()``."""
+        replacements = {
+            "time": self.rtc_time,
+            "localtime": self.localtime,
+            "mktime": self.mktime,
+            "sleep": self.sleep,
+            "monotonic": self.monotonic,
+            "monotonic_ns": self.monotonic_ns,
+        }
+        for name, function in replacements.items():
+            self._patched[name] = getattr(time, name)
+            setattr(time, name, function)
+
+    def restore(self):
+        for name, function in self._patched.items():
+            setattr(time, name, function)
+        self._patched = {}
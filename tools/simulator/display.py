@@ -0,0 +1,89 @@
+"""
+Framebuffer display of the simulator, standing in for ``board.DISPLAY``.
+
+The groups, tile grids and bitmaps are the ones of the CPython ``displayio``
+(Adafruit Blinka displayio), so labels and fonts go through the same library
+code as on the device. The display keeps the root group and counts refreshes,
+and renders the screen to a PNG file on demand, through the same display core
+the Blinka bus displays use.
+"""
+import struct
+import zlib
+
+import busdisplay  # noqa: F401, imported before displayio._displaycore, which it imports back
+import displayio
+from displayio._area import Area
+from displayio._displaycore import _DisplayCore
+
+# The Blinka thread refreshing the bus displays spins on time.sleep(0), which is the virtual clock here
+displayio._stop_background()
+
+
+def write_png(path, width, height, rgb):
+    """Writes 8 bit RGB pixels (``width * height * 3`` bytes, row by row) to a PNG file."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    stride = width * 3
+    rows = b"".join(b"\x00" + rgb[y * stride:(y + 1) * stride] for y in range(height))
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(rows, 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+class FramebufferDisplay:
+    def __init__(self, width=480, height=320):
+        self.width = width
+        self.height = height
+        self.auto_refresh = True
+        self.brightness = 1.0
+        self.refreshes = 0
+        self.on_refresh = None  # Called with the display after each refresh
+        # 16 bit color, as on the PyPortal Titano display
+        self._core = _DisplayCore(None, width, height, width, height, 0, 0, 0, 16, False, False, 1, False, False,
+                                  0, 0, 0, 0, False, False, False, False)
+
+    @property
+    def root_group(self):
+        return self._core.current_group
+
+    @root_group.setter
+    def root_group(self, group):
+        if not self._core.set_root_group(group):
+            raise ValueError("Group already used")
+
+    @property
+    def rotation(self):
+        return self._core.rotation
+
+    @rotation.setter
+    def rotation(self, rotation):
+        self._core.set_rotation(rotation)
+
+    def refresh(self, *, target_frames_per_second=None, minimum_frames_per_second=0):
+        self.refreshes += 1
+        if self.on_refresh is not None:
+            self.on_refresh(self)
+        return True
+
+    def render(self):
+        """Returns the screen as 8 bit RGB bytes, row by row."""
+        width, height = self.width, self.height
+        pixels = width * height
+        buffer = memoryview(bytearray(pixels * 2)).cast("I")
+        mask = memoryview(bytearray((pixels // 32 + 1) * 4)).cast("I")
+        self._core.fill_area(Area(0, 0, width, height), mask, buffer)
+        rgb565 = buffer.cast("B").cast("H")
+        rgb = bytearray(pixels * 3)
+        for i in range(pixels):
+            pixel = rgb565[i]
+            if pixel:
+                rgb[i * 3] = (pixel >> 8) & 0xF8
+                rgb[i * 3 + 1] = (pixel >> 3) & 0xFC
+                rgb[i * 3 + 2] = (pixel << 3) & 0xF8
+        return bytes(rgb)
+
+    def save_png(self, path):
+        write_png(path, self.width, self.height, self.render())
@@ -0,0 +1,94 @@
+"""
+Device file system of the simulator.
+
+The firmware uses absolute device paths: ``/sd/...`` on the SD card and files
+such as ``/settings.toml`` at the root of CIRCUITPY. They are mapped into a
+work directory, whose ``sd`` directory links to the files of the repository
+``sd`` directory, so the fonts and images are read in place while everything
+the firmware writes (cache, logs, telemetry) stays in the work directory.
+"""
+import builtins
+import os
+import shutil
+import struct
+
+# os functions taking a device path as their first argument(s)
+_PATH_FUNCTIONS = ("stat", "remove", "mkdir", "rmdir", "listdir")
+
+
+def write_silent_wav(path, seconds, sample_rate=22050):
+    """Writes a silent 16 bit mono WAV file of ``seconds``, sparse on the disk."""
+    data_size = int(seconds * sample_rate) * 2
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, 1,
+                         sample_rate, sample_rate * 2, 2, 16, b"data", data_size)
+    with open(path, "wb") as file:
+        file.write(header)
+        file.truncate(len(header) + data_size)
+
+
+class DeviceFilesystem:
+    def __init__(self, root, sd_source):
+        self.root = root  # Host directory holding the CIRCUITPY root
+        self.sd = os.path.join(root, "sd")
+        os.makedirs(self.sd, exist_ok=True)
+        for name in os.listdir(sd_source):
+            target = os.path.join(self.sd, name)
+            if name in ("cache", "logs", "__pycache__") or os.path.lexists(target):
+                continue
+            os.symlink(os.path.abspath(os.path.join(sd_source, name)), target)
+        self._patched = {}
+
+    def path(self, path):
+        """Returns the host path of a device path, other paths are returned unchanged."""
+        if not isinstance(path, str) or not path.startswith("/"):
+            return path
+        if path == "/sd" or path.startswith("/sd/"):
+            return os.path.join(self.sd, path[4:])
+        if path.count("/") == 1 and "." in path:  # A file at the root of CIRCUITPY, e.g. /settings.toml
+            return os.path.join(self.root, path[1:])
+        return path
+
+    def add_silent_wav(self, path, seconds):
+        """Creates the WAV file ``path`` (a device path) if it is missing, e.g. adhans not in the repository."""
+        host_path = self.path(path)
+        if not os.path.exists(host_path):
+            os.makedirs(os.path.dirname(host_path), exist_ok=True)
+            write_silent_wav(host_path, seconds)
+
+    def clear(self):
+        """Removes what the firmware wrote, for a cold start."""
+        for name in ("cache", "logs"):
+            shutil.rmtree(os.path.join(self.sd, name), ignore_errors=True)
+
+    def patch(self):
+        """Maps the device paths of ``open`` and the ``os`` file functions, until ``restore()``."""
+        real_open = builtins.open
+
+        def device_open(file, *args, **kwargs):
+            return real_open(self.path(file), *args, **kwargs)
+
+        self._patched[(builtins, "open")] = real_open
+        builtins.open = device_open
+        for name in _PATH_FUNCTIONS:
+            self._patch_os(name, self._mapped)
+        self._patch_os("rename", self._mapped_rename)
+
+    def _mapped(self, function):
+        def wrapper(path=".", *args, **kwargs):
+            return function(self.path(path), *args, **kwargs)
+        return wrapper
+
+    def _mapped_rename(self, function):
+        def wrapper(source, target):
+            return function(self.path(source), self.path(target))
+        return wrapper
+
+    def _patch_os(self, name, wrap):
+        function = getattr(os, name)
+        self._patched[(os, name)] = function
+        setattr(os, name, wrap(function))
+
+    def restore(self):
+        for (module, name), function in self._patched.items():
+            setattr(module, name, function)
+        self._patched = {}
@@ -0,0 +1,335 @@
+"""
+Stand-ins for the CircuitPython hardware modules.
+
+Each ``*_module`` function builds the module the firmware imports, bound to
+the simulated device: its clock, display and event log. Only what the
+firmware uses is implemented.
+"""
+import struct
+import types
+
+from .clock import SimulationEnd
+
+PINS = ("ESP_CS", "ESP_BUSY", "ESP_RESET", "ESP_GPIO0", "SD_CS", "SD_CARD_DETECT", "SPEAKER", "SPEAKER_ENABLE",
+        "LIGHT", "NEOPIXEL", "TOUCH_XL", "TOUCH_XR", "TOUCH_YD", "TOUCH_YU", "TFT_BACKLIGHT", "SCK", "MOSI", "MISO")
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"board.{self.name}"
+
+
+def module(name, **attributes):
+    result = types.ModuleType(name)
+    result.__dict__.update(attributes)
+    return result
+
+
+def board_module(device):
+    attributes = {name: Pin(name) for name in PINS}
+    # DISPLAY is set by the simulator once displayio can be imported, which needs this module
+    return module("board", DISPLAY=None, SPI=lambda: "SPI", I2C=lambda: "I2C", board_id="pyportal_titano",
+                  **attributes)
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.value = False
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        self.direction = Direction.OUTPUT
+        self.value = value
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
+
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class DriveMode:
+    PUSH_PULL = "PUSH_PULL"
+    OPEN_DRAIN = "OPEN_DRAIN"
+
+
+def digitalio_module(device):
+    return module("digitalio", DigitalInOut=DigitalInOut, Direction=Direction, Pull=Pull, DriveMode=DriveMode)
+
+
+def storage_module(device):
+    def remount(mount_path, readonly=False, *, disable_concurrent_write_protection=False):
+        device.log("storage", f"remount {mount_path} readonly={readonly}")
+
+    def mount(filesystem, mount_path, *, readonly=False):
+        device.log("storage", f"mount {mount_path}")
+
+    return module("storage", remount=remount, mount=mount, umount=lambda mount_path: None,
+                  VfsFat=lambda block_device: block_device, getmount=lambda mount_path: None)
+
+
+def rtc_module(device):
+    clock = device.clock
+
+    class RTC:
+        calibration = 0
+
+        @property
+        def datetime(self):
+            return clock.localtime()
+
+        @datetime.setter
+        def datetime(self, value):
+            clock.set_rtc(value)
+            device.log("rtc", f"set to {clock.localtime()[:6]}")
+
+    return module("rtc", RTC=RTC, set_time_source=lambda source: None)
+
+
+class WaveFile:
+    def __init__(self, file, buffer=None):
+        self.file = file
+        header = file.read(44)
+        _, _, _, _, _, _, self.channel_count, self.sample_rate, _, _, self.bits_per_sample, _, self.data_size = (
+            struct.unpack("<4sI4s4sIHHIIHH4sI", header))
+
+    @property
+    def duration(self):
+        return self.data_size / (self.sample_rate * self.channel_count * self.bits_per_sample // 8)
+
+    def deinit(self):
+        pass
+
+
+def audiocore_module(device):
+    return module("audiocore", WaveFile=WaveFile)
+
+
+def audioio_module(device):
+    clock = device.clock
+
+    class AudioOut:
+        """Null audio sink, a sample plays for its duration in virtual time."""
+
+        def __init__(self, left_channel, *, right_channel=None, quiescent_value=0x8000):
+            self._end = 0
+            self.paused = False
+
+        @property
+        def playing(self):
+            return clock.monotonic() < self._end
+
+        def play(self, sample, *, loop=False):
+            self._end = float("inf") if loop else clock.monotonic() + sample.duration
+            device.log("audio", f"play {getattr(sample.file, 'name', sample)} ({sample.duration:.0f} s)")
+
+        def stop(self):
+            if self.playing:
+                device.log("audio", "stop")
+            self._end = 0
+
+        def pause(self):
+            self.paused = True
+
+        def resume(self):
+            self.paused = False
+
+        def deinit(self):
+            self.stop()
+
+    return module("audioio", AudioOut=AudioOut)
+
+
+def alarm_module(device):
+    clock = device.clock
+
+    class TimeAlarm:
+        def __init__(self, *, monotonic_time=None, epoch_time=None):
+            if monotonic_time is None:
+                monotonic_time = clock.monotonic() + epoch_time - clock.rtc_time()
+            self.monotonic_time = monotonic_time
+
+    def light_sleep_until_alarms(*alarms):
+        earliest = min(alarms, key=lambda alarm: alarm.monotonic_time)
+        clock.sleep(max(0, earliest.monotonic_time - clock.monotonic()))
+        device.light_sleeps += 1
+        return earliest
+
+    def exit_and_deep_sleep_until_alarms(*alarms, preserve_dios=()):
+        device.log("alarm", "deep sleep")
+        raise SimulationEnd()
+
+    result = module("alarm", light_sleep_until_alarms=light_sleep_until_alarms,
+                    exit_and_deep_sleep_until_alarms=exit_and_deep_sleep_until_alarms,
+                    sleep_memory=bytearray(4096), wake_alarm=None)
+    result.time = module("alarm.time", TimeAlarm=TimeAlarm)
+    return result
+
+
+def supervisor_module(device):
+    runtime = types.SimpleNamespace(serial_connected=True, usb_connected=True, autoreload=False)
+
+    def reload():
+        device.log("supervisor", "reload")
+        raise SimulationEnd()
+
+    return module("supervisor", ticks_ms=device.clock.ticks_ms, runtime=runtime, reload=reload)
+
+
+class ResetReason:
+    POWER_ON = "ResetReason.POWER_ON"
+    SOFTWARE = "ResetReason.SOFTWARE"
+    WATCHDOG = "ResetReason.WATCHDOG"
+    RESET_PIN = "ResetReason.RESET_PIN"
+    UNKNOWN = "ResetReason.UNKNOWN"
+
+
+class WatchDogMode:
+    RAISE = "WatchDogMode.RAISE"
+    RESET = "WatchDogMode.RESET"
+
+
+class WatchDogTimeout(Exception):
+    pass
+
+
+class WatchDogTimer:
+    """``microcontroller.watchdog``, which logs the feeds coming too late instead of resetting the device."""
+
+    MAX_TIMEOUT = 16  # Seconds, the SAMD51 limit
+
+    def __init__(self, device):
+        self._device = device
+        self._timeout = None
+        self._mode = None
+        self._fed = None  # Virtual monotonic seconds of the last feed
+        self.longest = 0  # Longest interval between two feeds, in seconds
+        self.late = 0  # Feeds that came after the timeout
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        if not 0 < value <= self.MAX_TIMEOUT:
+            raise ValueError(f"timeout must be <= {self.MAX_TIMEOUT}")
+        self._timeout = value
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        if self._timeout is None:
+            raise ValueError("WatchDogTimer.timeout must be greater than 0")
+        self._mode = value
+        self._fed = self._device.clock.monotonic()
+        self._device.log("watchdog", f"started, {self._timeout} s {value}")
+
+    def feed(self):
+        if self._mode is None:
+            raise ValueError("WatchDogTimer is not currently running")
+        now = self._device.clock.monotonic()
+        gap = now - self._fed
+        self.longest = max(self.longest, gap)
+        if gap > self._timeout:
+            self.late += 1
+            self._device.log("watchdog", f"fed after {gap:.1f} s, the device would have reset")
+        self._fed = now
+
+    def deinit(self):
+        if self._mode == WatchDogMode.RESET:
+            raise NotImplementedError("WatchDogTimer cannot be deinitialized once mode is set to RESET")
+        self._mode = None
+
+
+def microcontroller_module(device):
+    cpu = types.SimpleNamespace(reset_reason=device.reset_reason, frequency=120000000, temperature=30.0)
+
+    def reset():
+        device.log("microcontroller", "reset")
+        raise SimulationEnd()
+
+    # Pin is also used in the annotations of the Blinka display buses
+    return module("microcontroller", cpu=cpu, nvm=device.nvm, watchdog=device.watchdog, reset=reset,
+                  ResetReason=ResetReason, Pin=Pin)
+
+
+def watchdog_module(device):
+    return module("watchdog", WatchDogMode=WatchDogMode, WatchDogTimeout=WatchDogTimeout)
+
+
+TAP_SECONDS = 0.2  # How long a scripted tap presses the touchscreen
+
+
+def touchscreen_module(device):
+    """``adafruit_touchscreen``, pressed at the scripted ``device.taps``."""
+    class Touchscreen:
+        def __init__(self, x1_pin, x2_pin, y1_pin, y2_pin, *, calibration=None, size=None, **kwargs):
+            self._logged = set()
+
+        @property
+        def touch_point(self):
+            now = device.clock.now()
+            for tap in device.taps:
+                at, x, y = tap
+                if at <= now < at + TAP_SECONDS:
+                    if tap not in self._logged:
+                        self._logged.add(tap)
+                        device.log("touch", f"tap at {x}, {y}, read {(now - at) * 1000:.0f} ms later")
+                    return x, y, 30000
+            return None
+
+    return module("adafruit_touchscreen", Touchscreen=Touchscreen)
+
+
+def micropython_module(device):
+    def identity(function):
+        return function
+
+    return module("micropython", const=lambda value: value, native=identity, viper=identity)
+
+
+def install(device):
+    """Returns the stand-in modules by name, to put in ``sys.modules``."""
+    alarm = alarm_module(device)
+    return {
+        "board": board_module(device),
+        "digitalio": digitalio_module(device),
+        "storage": storage_module(device),
+        "rtc": rtc_module(device),
+        "audiocore": audiocore_module(device),
+        "audioio": audioio_module(device),
+        "alarm": alarm,
+        "alarm.time": alarm.time,
+        "supervisor": supervisor_module(device),
+        "microcontroller": microcontroller_module(device),
+        "watchdog": watchdog_module(device),
+        "micropython": micropython_module(device),
+        "adafruit_touchscreen": touchscreen_module(device),
+    }
+
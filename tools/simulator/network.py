@@ -0,0 +1,274 @@
+"""
+Fake ESP32 co-processor and the internet behind it.
+
+``ESP_SPIcontrol`` stands in for the ``adafruit_esp32spi`` driver, and its
+socket pool connects to ``Internet``, which answers from the sample API
+responses of ``tools/payloads`` instead of the network:
+
+- ``ip-api.com``: ``ip_api.json``, with the UTC offset of its time zone at the
+  true time, as ip-api.com answers across daylight saving time changes
+- ``api.aladhan.com``: ``aladhan_calendar_<year>_<month>.json`` for the
+  ``calendar`` and ``calendarByCity`` requests, 404 for the other months
+- ``api.coindesk.com``: ``coindesk_currentprice.json``
+- UDP port 123: NTP replies with the true time of the virtual clock
+- the hosts added with ``add_hub``: a ``tools/schedule_hub.py`` hub, which
+  reaches the public APIs through this internet
+
+Every HTTP response carries a ``Date`` header with the true time, and every
+exchange takes ``latency`` seconds of virtual time.
+"""
+import json
+import os
+import sys
+import time
+import types
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ntp_server  # noqa: E402
+import schedule_hub  # noqa: E402
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "payloads")
+
+AF_INET = 2
+SOCK_STREAM = 1
+SOCK_DGRAM = 2
+TCP_MODE = 0
+UDP_MODE = 1
+TLS_MODE = 2
+
+REASONS = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}
+
+
+class Internet:
+    def __init__(self, clock, payloads=PAYLOADS, latency=0.05, log=None):
+        self.clock = clock
+        self.log = log or (lambda source, message: None)  # Records the events of the radio
+        self.payloads = payloads
+        self.latency = latency  # Seconds of virtual time per exchange
+        self.down = False  # Set to make every connection fail
+        self.requests = []  # (host, path, status) of every HTTP request
+        self.hubs = {}  # Host: schedule_hub.Hub, see add_hub
+
+    def add_hub(self, host):
+        """Answers the HTTP requests to ``host`` with a schedule hub."""
+        self.hubs[host] = schedule_hub.Hub(fetch=self.fetch_json, clock=self.now)
+
+    def fetch_json(self, url):
+        """Returns the decoded JSON body of ``url``, for the hubs."""
+        parts = urllib.parse.urlsplit(url)
+        status, body = self.http(parts.hostname, f"{parts.path}?{parts.query}")
+        if status != 200:
+            raise OSError(f"HTTP {status} from {parts.hostname}")
+        return json.loads(body)
+
+    def now(self):
+        return self.clock.now()
+
+    def exchange(self):
+        if self.latency:
+            self.clock.sleep(self.latency)
+
+    def http(self, host, path):
+        """Returns the status and body of the GET request of ``path`` on ``host``."""
+        status, body = 404, b'{"code":404,"status":"Not Found"}'
+        route = path.split("?")[0].strip("/").split("/")
+        name = None
+        if host == "ip-api.com" and route[0] == "json":
+            name = "ip_api.json"
+        elif host == "api.aladhan.com" and len(route) >= 4 and route[1] in ("calendar", "calendarByCity",
+                                                                             "calendarByAddress"):
+            name = f"aladhan_calendar_{int(route[2])}_{int(route[3]):02}.json"
+        elif host == "api.coindesk.com":
+            name = "coindesk_currentprice.json"
+        elif host in self.hubs:
+            status, body = self.hubs[host].handle(path)
+            body = schedule_hub.encode(body)[1]
+        if name is not None and os.path.exists(os.path.join(self.payloads, name)):
+            with open(os.path.join(self.payloads, name), "rb") as file:
+                status, body = 200, file.read()
+            if name == "ip_api.json":
+                location = json.loads(body)
+                location["offset"] = schedule_hub.current_offset(location["timezone"], self.now())
+                body = json.dumps(location, separators=(",", ":")).encode()
+        self.requests.append((host, path, status))
+        return status, body
+
+    def http_response(self, request):
+        request_line = request.split(b"\r\n", 1)[0].decode()
+        headers = dict(line.split(": ", 1) for line in request.decode().split("\r\n")[1:] if ": " in line)
+        _, path, _ = request_line.split(" ")
+        status, body = self.http(headers.get("Host", "").split(":")[0], path)
+        date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(int(self.now())))
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nDate: {date}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n")
+        return head.encode() + body
+
+    def udp_response(self, address, packet):
+        if address[1] != 123 or len(packet) < 48:
+            return None
+        return bytes(ntp_server.reply(bytes(packet), self, self.now()))
+
+
+class Socket:
+    def __init__(self, pool, family, kind):
+        self._pool = pool
+        self._internet = pool.internet
+        self._kind = kind
+        self._address = None
+        self._request = b""
+        self._response = b""
+        self._timeout = None
+
+    def settimeout(self, value):
+        self._timeout = value
+
+    def connect(self, address, conntype=None):
+        if self._internet.down or not self._pool.radio.connected:
+            raise ConnectionError(f"Failed to connect to {address[0]}")
+        self._address = address
+        self._internet.exchange()
+
+    def send(self, data):
+        if self._response:  # A new request on a kept-alive connection
+            self._response = b""
+        self._request += bytes(data)
+        if b"\r\n\r\n" in self._request:
+            self._internet.exchange()
+            self._response = self._internet.http_response(self._request)
+            self._request = b""
+        return len(data)
+
+    def sendto(self, data, address):
+        if self._internet.down or not self._pool.radio.connected:
+            raise OSError(f"Failed to send to {address[0]}")
+        self._internet.exchange()
+        self._response = self._internet.udp_response(address, data) or b""
+        return len(data)
+
+    def recv_into(self, buffer, nbytes=0):
+        nbytes = nbytes or len(buffer)
+        if not self._response:
+            if self._kind == SOCK_DGRAM:
+                self._internet.clock.sleep(self._timeout or 0)
+                raise OSError(110, "ETIMEDOUT")
+            return 0
+        chunk = self._response[:nbytes]
+        self._response = self._response[len(chunk):]
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def recv(self, bufsize):
+        buffer = bytearray(bufsize)
+        return bytes(buffer[:self.recv_into(buffer, bufsize)])
+
+    def close(self):
+        self._response = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SocketPool:
+    AF_INET = AF_INET
+    SOCK_STREAM = SOCK_STREAM
+    SOCK_DGRAM = SOCK_DGRAM
+
+    def __init__(self, radio):
+        self.radio = radio
+        self.internet = radio.internet
+
+    def getaddrinfo(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        # The host name is kept as the address, the fake internet routes on it
+        return [(AF_INET, socktype or SOCK_STREAM, proto, "", (host, port))]
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM, proto=0):
+        return Socket(self, family, type)
+
+
+class ESP_SPIcontrol:  # noqa: N801, the class name selects the socket pool in adafruit_connection_manager
+    """ESP32 co-processor, held in reset (powered down) while its reset pin is low."""
+    TCP_MODE = TCP_MODE
+    UDP_MODE = UDP_MODE
+    TLS_MODE = TLS_MODE
+
+    internet = None  # Set by the simulator before the firmware creates the radio
+
+    def __init__(self, spi, cs_pin, ready_pin, reset_pin, gpio0_pin=None, *, debug=False):
+        self._reset_pin = reset_pin
+        self._associated = False
+        self._associated_at = 0
+        self.ssid = None
+        self.connects = 0
+        self.resets = 0
+        self.associated_seconds = 0  # Virtual seconds spent connected to the access point
+        self.ipv4_address = "192.168.1.42"
+        reset_pin.switch_to_output(True)
+        self.reset()
+
+    @property
+    def powered(self):
+        return bool(self._reset_pin.value)
+
+    @property
+    def connected(self):
+        return self._associated and self.powered
+
+    def _leave(self):
+        if self._associated:
+            self.associated_seconds += self.internet.clock.monotonic() - self._associated_at
+        self._associated = False
+
+    def connect_AP(self, ssid, password, timeout_s=10):  # noqa: N802
+        if not self.powered:
+            raise TimeoutError("ESP32 not responding")
+        self.internet.exchange()
+        if self.internet.down:
+            raise OSError(f"No such ssid {ssid}")
+        self._associated = True
+        self._associated_at = self.internet.clock.monotonic()
+        self.ssid = ssid
+        self.connects += 1
+        self.internet.log("radio", f"connected to {ssid}")
+        return 3  # WL_CONNECTED
+
+    def disconnect(self):
+        self._leave()
+        self.internet.log("radio", "disconnected")
+
+    @property
+    def ap_info(self):
+        return types.SimpleNamespace(ssid=self.ssid, rssi=-55, bssid=b"\x02\x00\x00\x00\x00\x01", channel=6)
+
+    @property
+    def status(self):
+        return 3 if self.connected else 6
+
+    def reset(self):
+        """Resets the ESP32, which takes it out of power down, as the driver does."""
+        self._leave()
+        self._reset_pin.value = True
+        self.resets += 1
+        self.internet.clock.sleep(0.76)  # The driver waits for the ESP32 to boot
+
+
+def modules(internet):
+    """Returns the stand-ins of the ``adafruit_esp32spi`` package by module name."""
+    radio_class = type("ESP_SPIcontrol", (ESP_SPIcontrol,), {"internet": internet})
+    driver = types.ModuleType("adafruit_esp32spi.adafruit_esp32spi")
+    driver.ESP_SPIcontrol = radio_class
+    socketpool = types.ModuleType("adafruit_esp32spi.adafruit_esp32spi_socketpool")
+    socketpool.SocketPool = SocketPool
+    package = types.ModuleType("adafruit_esp32spi")
+    package.__path__ = []
+    package.adafruit_esp32spi = driver
+    package.adafruit_esp32spi_socketpool = socketpool
+    return {
+        "adafruit_esp32spi": package,
+        "adafruit_esp32spi.adafruit_esp32spi": driver,
+        "adafruit_esp32spi.adafruit_esp32spi_socketpool": socketpool,
+    }